@@ -0,0 +1,237 @@
+"""
+Async implementations of the API endpoints that mostly wait on I/O.
+
+They are used instead of the views in ``apis.views`` when the ``ASYNC_VIEWS`` setting is on and the project is served
+with ``ayaka.asgi``. The login waits on the government CVV service with an async HTTP client, so one worker can hold
+many logins in flight, and the other endpoints use the async ORM for their queries.
+"""
+import asyncio
+import base64
+import logging
+import weakref
+from functools import wraps
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import login
+from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_logged_in
+from django.http import JsonResponse, HttpResponseNotAllowed
+from django.utils import timezone
+from knox.auth import TokenAuthentication
+from knox.models import AuthToken
+from knox.settings import knox_settings
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.fields import DateTimeField
+
+from apps.models import NewArea, NewCandidate, NewElection, NewParty, VoteCheck, VoteResultCandidate, VoteResultParty
+from apps.utils import check_election_status, get_election_party_result
+from users.models import NewProfile
+from . import serializers
+
+logger = logging.getLogger(__name__)
+
+# An AsyncClient is bound to the event loop it was first used in, so keep one per loop.
+_http_clients = weakref.WeakKeyDictionary()
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Return the HTTP client shared by the requests running in the current event loop.
+    """
+    loop = asyncio.get_running_loop()
+    client = _http_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(timeout=settings.CVV_SERVICE_TIMEOUT,
+                                   limits=httpx.Limits(max_connections=None, max_keepalive_connections=100))
+        _http_clients[loop] = client
+    return client
+
+
+async def get_api_user(request):
+    """
+    Return the user authenticated by a knox token or by the session, or None for anonymous requests.
+    """
+    try:
+        authenticated = await sync_to_async(TokenAuthentication().authenticate)(request)
+    except AuthenticationFailed:
+        authenticated = None
+    if authenticated is not None:
+        return authenticated[0]
+    return await sync_to_async(lambda: request.user if request.user.is_authenticated else None)()
+
+
+async def can_see_result(request, election: NewElection) -> bool:
+    """
+    Return True if the result of the election can be shown, staff can see it before the election finishes.
+    """
+    if check_election_status(election) == 'Finished':
+        return True
+    user = await get_api_user(request)
+    return user is not None and (user.is_staff or user.is_superuser)
+
+
+def require_method(method: str):
+    """
+    Only allow one HTTP method on an async view.
+
+    The decorators in ``django.views.decorators.http`` turn an async view into a sync one on this Django version.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            if request.method != method:
+                return HttpResponseNotAllowed([method])
+            return await view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def error_response(detail: str, error: str, status_code: int) -> JsonResponse:
+    return JsonResponse({'detail': detail, 'errors': {'detail': error}}, status=status_code)
+
+
+@require_method('POST')
+async def login_view(request):
+    """
+    Login with Thai national ID and CVV validation, like ``apis.views.LoginView``.
+    """
+    auth_info = request.META.get("HTTP_AUTHORIZATION", "").split()
+    if not auth_info:
+        return JsonResponse({'error': {'detail': 'No credential provided'}}, status=status.HTTP_400_BAD_REQUEST)
+    if auth_info[0].lower() != 'basic':
+        return JsonResponse({'error': 'login_view_request'})
+    if len(auth_info) != 2:
+        return JsonResponse({'error': {'detail': 'Malformed request'}}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        auth_decoded = base64.b64decode(auth_info[1]).decode('utf-8')
+        username, cvv = auth_decoded.split(":")
+        citizen_id = int(username)
+    except (UnicodeDecodeError, ValueError):
+        return JsonResponse({'error': {'detail': 'Malformed basic auth request'}},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        response = await get_http_client().post(settings.CVV_SERVICE_URL, json={
+            'citizenID': citizen_id,
+            'citizenCVV': str(cvv)
+        })
+    except httpx.HTTPError:
+        logger.exception('Cannot reach the CVV service')
+        return JsonResponse({'error': {'detail': 'The government service is not available'}},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    if response.status_code in [status.HTTP_401_UNAUTHORIZED, status.HTTP_404_NOT_FOUND]:
+        return JsonResponse({'error': {'detail': 'Invalid citizenID or CVV'}}, status=status.HTTP_401_UNAUTHORIZED)
+    data = response.json()
+    # MUST BE A BOOLEAN
+    if data.get('detail') is not True:
+        return JsonResponse({'error': {'detail': 'Wrong payload from the government service', 'payload': data}},
+                            status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    try:
+        user = await User.objects.aget(username=username)
+    except User.DoesNotExist:
+        return JsonResponse({'error': {'detail': 'Invalid citizenID or CVV'}}, status=status.HTTP_401_UNAUTHORIZED)
+
+    token_limit_per_user = knox_settings.TOKEN_LIMIT_PER_USER
+    if token_limit_per_user is not None:
+        if await AuthToken.objects.filter(user=user, expiry__gt=timezone.now()).acount() >= token_limit_per_user:
+            return JsonResponse({'error': 'Maximum amount of tokens allowed per user exceeded.'},
+                                status=status.HTTP_403_FORBIDDEN)
+    await sync_to_async(login)(request, user)
+    instance, token = await sync_to_async(AuthToken.objects.create)(user, knox_settings.TOKEN_TTL)
+    await sync_to_async(user_logged_in.send)(sender=user.__class__, request=request, user=user)
+    return JsonResponse({
+        'expiry': DateTimeField(format=knox_settings.EXPIRY_DATETIME_FORMAT).to_representation(instance.expiry),
+        'token': token
+    })
+
+
+# API clients authenticate with basic auth here and get a token, like the knox login view.
+login_view.csrf_exempt = True
+
+
+@require_method('GET')
+async def profile_view(request):
+    """
+    Get the user profile of current user, like ``apis.views.UserProfileView``.
+    """
+    user = await get_api_user(request)
+    if user is None:
+        return JsonResponse({'detail': 'User is not authenticated.'}, status=status.HTTP_401_UNAUTHORIZED)
+    profile = await NewProfile.objects.select_related('user', 'area').aget(user=user)
+    now = timezone.now()
+    already_vote = await VoteCheck.objects.filter(user=user, election__start_date__lte=now,
+                                                  election__end_date__gte=now).aexists()
+    result = await sync_to_async(lambda: serializers.UserProfileSerializer(profile, context={'request': request}).data)()
+    return JsonResponse({'detail': 'Get current user profile successfully.', 'result': result,
+                         'voted_current_election': already_vote}, status=status.HTTP_200_OK)
+
+
+@require_method('GET')
+async def election_result_by_party_view(request, election_id):
+    """
+    Get a calculated election result by party, like ``apis.views.ElectionResultByPartyView``.
+    """
+    try:
+        election = await NewElection.objects.aget(id=election_id)
+    except NewElection.DoesNotExist:
+        return error_response('Get election result failed', 'Election does not exist.', status.HTTP_404_NOT_FOUND)
+    if not await can_see_result(request, election):
+        return error_response('Get election result failed', 'Election has not finished.', status.HTTP_400_BAD_REQUEST)
+    result = await sync_to_async(get_election_party_result)(election)
+    api_result = [{
+        'party': data['party'],
+        'supposed_to_have_result': data['supposed_to_have'],
+        'real_result': data['real']
+    } for data in result['result']]
+    vote_result = await sync_to_async(lambda: serializers.PartylistElectionResultSerializer(
+        api_result, many=True, context={'request': request}).data)()
+    return JsonResponse({'detail': 'Get election result successfully', 'vote_result': vote_result})
+
+
+@require_method('GET')
+async def raw_election_result_by_party_view(request, election_id):
+    """
+    Get a raw election result by party, like ``apis.views.RawElectionResultByPartyView``.
+    """
+    try:
+        election = await NewElection.objects.aget(id=election_id)
+    except NewElection.DoesNotExist:
+        return error_response('Get election result failed', 'Election does not exist.', status.HTTP_404_NOT_FOUND)
+    if not await can_see_result(request, election):
+        return error_response('Get election result failed', 'Election has not finished.', status.HTTP_400_BAD_REQUEST)
+    api_result = [{'party': result.party, 'vote_count': result.vote} async for result in
+                  VoteResultParty.objects.filter(election=election).select_related('party').order_by('-vote')]
+    voted_party_ids = {row['party'].id for row in api_result}
+    api_result += [{'party': party, 'vote_count': 0} async for party in NewParty.objects.all()
+                   if party.id not in voted_party_ids]
+    vote_result = await sync_to_async(lambda: serializers.VotePartyRawResultSerializer(
+        api_result, many=True, context={'request': request}).data)()
+    return JsonResponse({'detail': 'Get election result successfully', 'vote_result': vote_result})
+
+
+@require_method('GET')
+async def election_result_by_area_view(request, election_id, area_id):
+    """
+    Get an election result by area, like ``apis.views.ElectionResultByAreaView``.
+    """
+    try:
+        election = await NewElection.objects.aget(id=election_id)
+    except NewElection.DoesNotExist:
+        return error_response('Get election result failed', 'Election does not exist.', status.HTTP_404_NOT_FOUND)
+    if not await NewArea.objects.filter(id=area_id).aexists():
+        return error_response('Get election result failed', 'Area does not exist.', status.HTTP_404_NOT_FOUND)
+    if not await can_see_result(request, election):
+        return error_response('Get election result failed', 'Election has not finished.', status.HTTP_400_BAD_REQUEST)
+    api_result = [{'candidate': result.candidate, 'vote_count': result.vote} async for result in
+                  VoteResultCandidate.objects.filter(election=election, candidate__area_id=area_id)
+                  .select_related('candidate__user', 'candidate__area', 'candidate__party').order_by('-vote')]
+    voted_candidate_ids = {row['candidate'].id for row in api_result}
+    api_result += [{'candidate': candidate, 'vote_count': 0} async for candidate in
+                   NewCandidate.objects.filter(area_id=area_id).select_related('user', 'area', 'party').order_by('id')
+                   if candidate.id not in voted_candidate_ids]
+    vote_result = await sync_to_async(lambda: serializers.VoteAreaResultSerializer(
+        api_result, many=True, context={'request': request}).data)()
+    return JsonResponse({'detail': 'Get election result successfully', 'vote_result': vote_result})
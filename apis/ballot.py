@@ -0,0 +1,107 @@
+"""
+Ballot bundles: the election, the candidates of an area and every party, in the one response the voter app needs to
+show the ballot.
+
+A bundle is rendered once per election and area from the reference data (see ``apps.reference``) and kept encoded in
+the process with the ETag of its content, until the reference data or the elections change. The thumbnails are site
+relative URLs, so the same bytes serve every host. A bundle with a thumbnail variant that is still being generated is
+not kept, so the next request gets the URL of the variant.
+"""
+import hashlib
+import threading
+from collections import namedtuple
+
+from rest_framework.renderers import JSONRenderer
+
+from apps.images import variant_pending, variant_url
+from apps.models import NewElection
+from apps.pagecache import get_generations
+from apps.reference import ReferenceData, get_reference_data
+from .serializers import BallotSerializer
+
+THUMBNAIL_VARIANT = 'avatar'
+
+Bundle = namedtuple('Bundle', ['version', 'etag', 'content'])
+
+_bundles = {}
+_bundles_lock = threading.Lock()
+
+
+def _thumbnails(image) -> tuple:
+    """
+    :return: The URL of the thumbnail, of its WebP variant, and whether one of them is still being generated.
+    :rtype: tuple
+    """
+    pending = variant_pending(image, THUMBNAIL_VARIANT) or variant_pending(image, THUMBNAIL_VARIANT, webp=True)
+    return variant_url(image, THUMBNAIL_VARIANT), variant_url(image, THUMBNAIL_VARIANT, webp=True), pending
+
+
+def render_ballot(election: NewElection, area_id: int, reference: ReferenceData) -> tuple:
+    """
+    Encode the ballot bundle of an area.
+
+    :return: The JSON of the bundle, and whether it is final (no thumbnail is being generated).
+    :rtype: tuple
+    """
+    final = True
+    candidates = []
+    for candidate in reference.candidates_in_area(area_id):
+        thumbnail, thumbnail_webp, pending = _thumbnails(candidate.image)
+        final = final and not pending
+        name = f'{candidate.user.first_name} {candidate.user.last_name}'.strip() or candidate.user.username
+        candidates.append({'id': candidate.id, 'name': name, 'description': candidate.description,
+                           'party_id': candidate.party_id, 'thumbnail': thumbnail, 'thumbnail_webp': thumbnail_webp})
+    parties = []
+    for party in reference.parties.values():
+        thumbnail, thumbnail_webp, pending = _thumbnails(party.image)
+        final = final and not pending
+        parties.append({'id': party.id, 'name': party.name, 'thumbnail': thumbnail, 'thumbnail_webp': thumbnail_webp})
+    area = reference.areas[area_id]
+    bundle = {'election': election, 'area': {'id': area.id, 'name': area.name}, 'candidates': candidates,
+              'parties': parties}
+    return JSONRenderer().render(BallotSerializer(bundle).data), final
+
+
+def get_ballot(election: NewElection, area_id: int) -> Bundle | None:
+    """
+    Return the ballot bundle of an area, rendering it if the reference data or the elections changed.
+
+    :return: The bundle, or None if the area does not exist.
+    :rtype: Bundle | None
+    """
+    reference = get_reference_data()
+    if area_id not in reference.areas:
+        return None
+    version = (reference.version, *get_generations(['apps.newelection']))
+    key = (election.id, area_id)
+    bundle = _bundles.get(key)
+    if bundle is not None and bundle.version == version:
+        return bundle
+    content, final = render_ballot(election, area_id, reference)
+    bundle = Bundle(version, f'"{hashlib.sha1(content).hexdigest()[:20]}"', content)
+    # Without a generation (no cache), nothing tells when the bundle changes.
+    if final and reference.version is not None:
+        with _bundles_lock:
+            _bundles[key] = bundle
+    return bundle
+
+
+def prerender_ballots(election: NewElection) -> int:
+    """
+    Render the ballot bundles of every area of an election.
+
+    :return: The number of bundles rendered.
+    :rtype: int
+    """
+    area_ids = list(get_reference_data().areas)
+    for area_id in area_ids:
+        get_ballot(election, area_id)
+    return len(area_ids)
+
+
+def clear_ballots():
+    """
+    Forget the ballot bundles of this process.
+    """
+    with _bundles_lock:
+        _bundles.clear()
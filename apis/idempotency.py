@@ -0,0 +1,121 @@
+import hashlib
+import json
+import zlib
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from apps import metrics
+from apps.models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+
+MAX_KEY_LENGTH = IdempotencyKey._meta.get_field('key').max_length
+
+
+def request_hash(request) -> str:
+    """
+    Hash what makes a request unique: its method, path and body.
+    """
+    digest = hashlib.sha256()
+    digest.update(f'{request.method} {request.path}\n'.encode())
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+def compress_response(data) -> bytes:
+    return zlib.compress(JSONRenderer().render(data))
+
+
+def decompress_response(response: bytes):
+    return json.loads(zlib.decompress(response))
+
+
+def replay(record: IdempotencyKey | None, fingerprint: str) -> Response:
+    """
+    Answer a retry with the stored response of the first request.
+    """
+    if record is not None and record.request_hash != fingerprint:
+        return Response({'detail': 'Request failed',
+                         'errors': {'detail': 'This Idempotency-Key was already used for a different request.'}},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    if record is None or record.status_code is None:
+        return Response({'detail': 'Request failed',
+                         'errors': {'detail': 'A request with this Idempotency-Key is still being processed.'}},
+                        status=status.HTTP_409_CONFLICT)
+    metrics.increment('idempotency.replays')
+    response = Response(decompress_response(bytes(record.response)), status=record.status_code)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view_method):
+    """
+    Make an API view method safe to retry with an ``Idempotency-Key`` header.
+
+    The first request with a key claims it by committing a row for the user and the key, then runs in a transaction
+    together with storing its response (compressed) in that row, and a retry within ``IDEMPOTENCY_KEY_TTL`` seconds
+    gets the stored response without running the view again. A retry sent while the first request is still running
+    sees the claim and gets a 409, and reusing a key for a different request a 422. Requests without the header, and
+    server errors, are not stored: their claim is removed so the client can retry. A claim left without a response for
+    ``IDEMPOTENCY_PENDING_SECONDS`` (its process died, rolling its transaction back) is taken over by the next retry.
+    A first request that was only slow may still commit after that, so a view that must only take effect once also
+    enforces it in the database: a vote is counted once by the unique ``VoteCheck`` of the voter and the election.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.META.get(IDEMPOTENCY_HEADER)
+        if not key or not request.user.is_authenticated:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response({'detail': 'Request failed',
+                             'errors': {'detail': f'Idempotency-Key must be at most {MAX_KEY_LENGTH} characters.'}},
+                            status=status.HTTP_400_BAD_REQUEST)
+        fingerprint = request_hash(request)
+        keys = IdempotencyKey.objects.filter(user=request.user, key=key)
+        now = timezone.now()
+        expired_before = now - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+        record = keys.filter(created_at__gte=expired_before).first()
+        if record is not None and record.status_code is None and \
+                record.created_at < now - timedelta(seconds=settings.IDEMPOTENCY_PENDING_SECONDS):
+            keys.filter(id=record.id, status_code__isnull=True).delete()
+            record = None
+        if record is not None:
+            return replay(record, fingerprint)
+
+        # Claim the key in a transaction of its own, committed before the view runs, so that a retry sent meanwhile
+        # sees it instead of waiting on the unique index for the first request to finish.
+        with transaction.atomic():
+            keys.filter(created_at__lt=expired_before).delete()
+            try:
+                with transaction.atomic():
+                    record = IdempotencyKey.objects.create(user=request.user, key=key, request_hash=fingerprint)
+            except IntegrityError:
+                # Another request with this key got in first.
+                record = None
+        if record is None:
+            return replay(keys.first(), fingerprint)
+
+        try:
+            with transaction.atomic():
+                response = view_method(self, request, *args, **kwargs)
+                if response.status_code >= 500:
+                    transaction.set_rollback(True)
+                else:
+                    record.status_code = response.status_code
+                    record.response = compress_response(response.data)
+                    record.save(update_fields=['status_code', 'response'])
+                    return response
+        except Exception:
+            record.delete()
+            raise
+        # Let the client retry a failure of the server.
+        record.delete()
+        return response
+    return wrapper
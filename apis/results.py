@@ -0,0 +1,72 @@
+"""
+The results matrix: the winner, runner-up, margin and total votes of every area of an election, for the map and the
+dashboards that show every area at once.
+
+The matrix is read from the leaderboard of the election (see ``apps.leaderboard``) in one pass over its areas, instead
+of one vote count per area, and laid out column by column (one list per value, in the order of the areas) so the
+response stays small with many areas. It is kept encoded in the process with the ETag of its content, under the
+version of the tally and the generation of the reference data, so it is only encoded again once a ballot is counted,
+the leaderboard is rebuilt or an area, party or candidate changes.
+"""
+import hashlib
+import threading
+from collections import namedtuple
+
+from rest_framework.renderers import JSONRenderer
+
+from apps.leaderboard import Leaderboard, get_leaderboard
+from apps.models import NewElection
+from apps.reference import ReferenceData, get_reference_data
+
+Matrix = namedtuple('Matrix', ['version', 'etag', 'content'])
+
+_matrices = {}
+_matrices_lock = threading.Lock()
+
+
+def render_results_matrix(leaderboard: Leaderboard, reference: ReferenceData) -> Matrix:
+    """
+    Encode the results matrix of the election of a leaderboard.
+
+    :rtype: Matrix
+    """
+    area_ids = list(reference.areas)
+    tally_version, columns = leaderboard.area_results(area_ids)
+    matrix = {
+        'election_id': leaderboard.election_id,
+        'area_ids': area_ids,
+        'area_names': [area.name for area in reference.areas.values()],
+        **columns,
+        'winner_party_ids': [reference.candidates[candidate_id].party_id
+                             if candidate_id in reference.candidates else None
+                             for candidate_id in columns['winner_ids']],
+    }
+    content = JSONRenderer().render(matrix)
+    return Matrix((reference.version, *tally_version), f'"{hashlib.sha1(content).hexdigest()[:20]}"', content)
+
+
+def get_results_matrix(election: NewElection) -> Matrix:
+    """
+    Return the results matrix of an election, encoding it again if the tally or the reference data changed.
+
+    :rtype: Matrix
+    """
+    reference = get_reference_data()
+    leaderboard = get_leaderboard(election)
+    matrix = _matrices.get(election.id)
+    if matrix is not None and matrix.version == (reference.version, *leaderboard.tally_version):
+        return matrix
+    matrix = render_results_matrix(leaderboard, reference)
+    # Without a generation (no cache), nothing tells when an area changes.
+    if matrix.version[0] is not None:
+        with _matrices_lock:
+            _matrices[election.id] = matrix
+    return matrix
+
+
+def clear_results_matrices():
+    """
+    Forget the results matrices of this process.
+    """
+    with _matrices_lock:
+        _matrices.clear()
@@ -0,0 +1,148 @@
+"""
+The OpenAPI schema of the API, generated once per code version instead of on every request.
+
+drf_yasg introspects every view and serializer to build the schema, which takes hundreds of milliseconds. The schema
+does not depend on the request (it is public), so it is generated into ``API_SCHEMA_ROOT`` by the ``buildapischema``
+command, or by the first process that needs it, under the version of the code, and every process serves the artifact
+of its version from memory with an ETag. Changing the code changes the version, so a stale artifact is never served.
+
+The generator, the codecs (and their validators) and the documentation pages of drf_yasg are only imported when they
+are used, so loading the URLs does not pay for them.
+"""
+import functools
+import hashlib
+import os
+import threading
+from pathlib import Path
+
+import drf_yasg
+from django.conf import settings
+from django.http import HttpResponse
+from django.views.decorators.http import condition
+from drf_yasg import openapi
+
+API_INFO = openapi.Info(
+    title="Sankasaint EC API",
+    default_version='v2',
+    description="API for manage an election to select James Brucker as the next president of the United States of Sankasaint.",
+    terms_of_service="https://youtu.be/eN6jkWxxm2Y?t=24",
+    contact=openapi.Contact(email="me@helloyeew.dev"),
+    license=openapi.License(name="MIT License"),
+)
+
+# The packages whose code makes the schema, hashed into the code version.
+SCHEMA_SOURCE_PACKAGES = ('apis', 'apps', 'users', 'ayaka')
+
+# Format to the content type and the name of the drf_yasg codec.
+FORMATS = {
+    '.json': ('application/json', 'OpenAPICodecJson'),
+    '.yaml': ('application/yaml', 'OpenAPICodecYaml'),
+}
+
+_schemas = {}
+_schemas_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def code_version() -> str:
+    """
+    Return the version of the code that makes the schema.
+
+    It is the ``CODE_VERSION`` setting when the deployment sets it (a commit hash for example), else a hash of the
+    Python files of ``SCHEMA_SOURCE_PACKAGES`` and of the drf_yasg version.
+    """
+    if settings.CODE_VERSION:
+        return settings.CODE_VERSION
+    digest = hashlib.sha256(drf_yasg.__version__.encode())
+    base_dir = Path(settings.BASE_DIR)
+    for package in SCHEMA_SOURCE_PACKAGES:
+        for path in sorted((base_dir / package).rglob('*.py')):
+            digest.update(str(path.relative_to(base_dir)).encode())
+            digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def artifact_path(format: str) -> Path:
+    return Path(settings.API_SCHEMA_ROOT) / f'swagger-{code_version()}{format}'
+
+
+def build_schema() -> dict:
+    """
+    Generate the schema and write it in every format to ``API_SCHEMA_ROOT``.
+
+    :return: A dictionary of format (``.json`` or ``.yaml``) to the encoded schema.
+    :rtype: dict
+    """
+    from drf_yasg import codecs
+    from drf_yasg.generators import OpenAPISchemaGenerator
+
+    schema = OpenAPISchemaGenerator(API_INFO).get_schema(request=None, public=True)
+    encoded = {}
+    os.makedirs(settings.API_SCHEMA_ROOT, exist_ok=True)
+    for format, (_, codec) in FORMATS.items():
+        encoded[format] = getattr(codecs, codec)(validators=[]).encode(schema)
+        path = artifact_path(format)
+        # Write then rename, so another process never reads a partial artifact.
+        temporary_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+        temporary_path.write_bytes(encoded[format])
+        os.replace(temporary_path, path)
+    return encoded
+
+
+def get_schema(format: str = '.json') -> bytes:
+    """
+    Return the encoded schema of the running code, from memory, its artifact, or generated.
+    """
+    schema = _schemas.get(format)
+    if schema is not None:
+        return schema
+    with _schemas_lock:
+        if format not in _schemas:
+            try:
+                _schemas[format] = artifact_path(format).read_bytes()
+            except FileNotFoundError:
+                _schemas.update(build_schema())
+        return _schemas[format]
+
+
+def clear_schemas():
+    """
+    Forget the schemas loaded by this process.
+    """
+    with _schemas_lock:
+        _schemas.clear()
+
+
+def schema_etag(request, format: str) -> str:
+    return f'{code_version()}{format}'
+
+
+@condition(etag_func=schema_etag)
+def schema_view(request, format: str):
+    """
+    Serve the precomputed schema as ``.json`` or ``.yaml``.
+    """
+    response = HttpResponse(get_schema(format), content_type=FORMATS[format][0])
+    # Clients revalidate with the ETag, which only changes with the code.
+    response['Cache-Control'] = 'public, max-age=0, must-revalidate'
+    return response
+
+
+def documentation_view(renderer: str):
+    """
+    Return the view of the ``swagger`` or ``redoc`` documentation page.
+
+    The page is rendered from the template of the drf_yasg UI renderer with only the title and the version of
+    ``API_INFO``, the browser then loads the precomputed schema from ``schema_view``, so the views are never
+    introspected for a page.
+    """
+    def documentation(request, *args, **kwargs):
+        from django.template.loader import render_to_string
+        from drf_yasg.renderers import ReDocRenderer, SwaggerUIRenderer
+
+        page_renderer = {'swagger': SwaggerUIRenderer, 'redoc': ReDocRenderer}[renderer]()
+        context = {'request': request}
+        page_renderer.set_context(context, openapi.Swagger(info=API_INFO, _prefix='/'))
+        return HttpResponse(render_to_string(page_renderer.template, context, request),
+                            content_type='text/html; charset=utf-8')
+    return documentation
@@ -2,11 +2,34 @@ from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
 from rest_framework import serializers
 
+from apps.allocation import ALLOCATION_METHODS, LARGEST_REMAINDER
+from apps.images import variant_url
 from apps.models import NewArea, NewCandidate, NewElection, VoteCheck, \
-    NewParty
+    NewParty, AreaTurnout, VoteRateBucket
+from apps.voterate import GROUP_BY_CHOICES, GROUP_TOTAL
 from users.models import NewProfile
 
 
+class ThumbnailMixin:
+    """
+    Add the URL of the avatar sized image variants (original format and WebP) to a serializer.
+
+    The serializer must define ``thumbnail_field`` and need request context to get the website URL.
+    """
+    thumbnail_field = 'image'
+    thumbnail_variant = 'avatar'
+
+    def get_thumbnail(self, obj):
+        """Add website URL to the resized image path."""
+        return self.context['request'].build_absolute_uri(
+            variant_url(getattr(obj, self.thumbnail_field), self.thumbnail_variant))
+
+    def get_thumbnail_webp(self, obj):
+        """Add website URL to the resized WebP image path."""
+        return self.context['request'].build_absolute_uri(
+            variant_url(getattr(obj, self.thumbnail_field), self.thumbnail_variant, webp=True))
+
+
 class LoginSerializer(serializers.Serializer):
     """
     This serializer defines two fields for authentication:
@@ -68,16 +91,18 @@ class ProfileSerializer(serializers.ModelSerializer):
         fields = ('image', 'area')
 
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserProfileSerializer(ThumbnailMixin, serializers.ModelSerializer):
     """
     This serializer is used to serialize the user profile model.
     """
     user = UserSerializer()
     image = serializers.SerializerMethodField()
+    thumbnail = serializers.SerializerMethodField()
+    thumbnail_webp = serializers.SerializerMethodField()
 
     class Meta:
         model = NewProfile
-        fields = ('user', 'image', 'area')
+        fields = ('user', 'image', 'thumbnail', 'thumbnail_webp', 'area')
         depth = 1
 
     def get_image(self, obj):
@@ -85,15 +110,17 @@ class UserProfileSerializer(serializers.ModelSerializer):
         return self.context['request'].build_absolute_uri(obj.image.url)
 
 
-class PartySerializer(serializers.ModelSerializer):
+class PartySerializer(ThumbnailMixin, serializers.ModelSerializer):
     """
     This serializer is used to serialize the party model.
     """
     image = serializers.SerializerMethodField()
+    thumbnail = serializers.SerializerMethodField()
+    thumbnail_webp = serializers.SerializerMethodField()
 
     class Meta:
         model = NewParty
-        fields = ('id', 'name', 'description', 'quote', 'image')
+        fields = ('id', 'name', 'description', 'quote', 'image', 'thumbnail', 'thumbnail_webp')
 
     def get_image(self, obj):
         """Add website URL to image path."""
@@ -125,7 +152,7 @@ class UpdateAreaSerializer(serializers.ModelSerializer):
         fields = ('area_id', 'name', 'population', 'number_of_voters')
 
 
-class GetCandidateSerializer(serializers.ModelSerializer):
+class GetCandidateSerializer(ThumbnailMixin, serializers.ModelSerializer):
     """
     This serializer is used to serialize the candidate model.
     This serializer need request context to get the website URL.
@@ -134,10 +161,12 @@ class GetCandidateSerializer(serializers.ModelSerializer):
     user = UserSerializer()
     party = PartySerializer()
     image = serializers.SerializerMethodField()
+    thumbnail = serializers.SerializerMethodField()
+    thumbnail_webp = serializers.SerializerMethodField()
 
     class Meta:
         model = NewCandidate
-        fields = ('id', 'user', 'description', 'image', 'area', 'party')
+        fields = ('id', 'user', 'description', 'image', 'thumbnail', 'thumbnail_webp', 'area', 'party')
         depth = 1
 
     def get_image(self, obj):
@@ -145,7 +174,7 @@ class GetCandidateSerializer(serializers.ModelSerializer):
         return self.context['request'].build_absolute_uri(obj.image.url)
 
 
-class GetCandidateSerializerWithoutParty(serializers.ModelSerializer):
+class GetCandidateSerializerWithoutParty(ThumbnailMixin, serializers.ModelSerializer):
     """
     This serializer is used to serialize the candidate model.
     This serializer need request context to get the website URL.
@@ -153,10 +182,12 @@ class GetCandidateSerializerWithoutParty(serializers.ModelSerializer):
     area = AreaSerializer()
     user = UserSerializer()
     image = serializers.SerializerMethodField()
+    thumbnail = serializers.SerializerMethodField()
+    thumbnail_webp = serializers.SerializerMethodField()
 
     class Meta:
         model = NewCandidate
-        fields = ('id', 'user', 'description', 'image', 'area')
+        fields = ('id', 'user', 'description', 'image', 'thumbnail', 'thumbnail_webp', 'area')
         depth = 1
 
     def get_image(self, obj):
@@ -194,16 +225,20 @@ class UpdateCandidateSerializer(serializers.ModelSerializer):
         depth = 1
 
 
-class GetElectionSerializer(serializers.ModelSerializer):
+class GetElectionSerializer(ThumbnailMixin, serializers.ModelSerializer):
     """
     This serializer is used to serialize the election model.
     This serializer need request context to get the website URL.
     """
+    thumbnail_field = 'front_image'
+    thumbnail_variant = 'cover'
     front_image = serializers.SerializerMethodField()
+    thumbnail = serializers.SerializerMethodField()
+    thumbnail_webp = serializers.SerializerMethodField()
 
     class Meta:
         model = NewElection
-        fields = ('id', 'name', 'description', 'start_date', 'end_date', 'front_image')
+        fields = ('id', 'name', 'description', 'start_date', 'end_date', 'front_image', 'thumbnail', 'thumbnail_webp')
 
     def get_front_image(self, obj):
         """Add website URL to image path."""
@@ -260,16 +295,18 @@ class VoteCheckSerializer(serializers.ModelSerializer):
         fields = ('user_id', 'election_id')
 
 
-class PartyWithCandidateSerializer(serializers.ModelSerializer):
+class PartyWithCandidateSerializer(ThumbnailMixin, serializers.ModelSerializer):
     """
     This serializer is used to serialize the party model.
     """
     image = serializers.SerializerMethodField()
+    thumbnail = serializers.SerializerMethodField()
+    thumbnail_webp = serializers.SerializerMethodField()
     candidates = serializers.SerializerMethodField()
 
     class Meta:
         model = NewParty
-        fields = ('id', 'name', 'description', 'quote', 'image', 'candidates')
+        fields = ('id', 'name', 'description', 'quote', 'image', 'thumbnail', 'thumbnail_webp', 'candidates')
 
     def get_image(self, obj):
         """Add website URL to image path."""
@@ -304,3 +341,179 @@ class PartylistElectionResultSerializer(serializers.Serializer):
     supposed_to_have_result = serializers.IntegerField()
     real_result = serializers.IntegerField()
 
+
+class SimulationSerializer(serializers.Serializer):
+    """
+    This serializer is used for seat allocation simulation API request.
+    """
+    method = serializers.ChoiceField(choices=ALLOCATION_METHODS, default=LARGEST_REMAINDER)
+    seats = serializers.IntegerField(min_value=1, max_value=10000, required=False)
+    scenarios = serializers.IntegerField(min_value=1, max_value=100000, default=1000)
+    swing = serializers.FloatField(min_value=0, max_value=2, default=0.1)
+    seed = serializers.IntegerField(min_value=0, required=False)
+
+
+class SimulationResultSerializer(serializers.Serializer):
+    """
+    This serializer is used to serialize the seats of a party in the seat allocation simulation.
+    """
+    party = PartySerializer()
+    entitled = serializers.IntegerField()
+    won = serializers.IntegerField()
+    list_seats = serializers.IntegerField()
+    mean_seats = serializers.FloatField()
+    std_seats = serializers.FloatField()
+    p5_seats = serializers.FloatField()
+    p95_seats = serializers.FloatField()
+    min_seats = serializers.IntegerField()
+    max_seats = serializers.IntegerField()
+    mean_won = serializers.FloatField()
+    majority_probability = serializers.FloatField()
+
+
+class AreaTurnoutSerializer(serializers.ModelSerializer):
+    """
+    This serializer is used to serialize the turnout of an area.
+    """
+    area = AreaSerializer()
+
+    class Meta:
+        model = AreaTurnout
+        fields = ('area', 'eligible', 'voted', 'rate', 'updated_at')
+
+
+class TurnoutSummarySerializer(serializers.Serializer):
+    """
+    This serializer is used to serialize the total turnout of an election.
+    """
+    eligible = serializers.IntegerField()
+    voted = serializers.IntegerField()
+    rate = serializers.FloatField()
+
+
+class PageCacheMetricsSerializer(serializers.Serializer):
+    """
+    This serializer is used to serialize the page cache metrics.
+    """
+    hits = serializers.IntegerField()
+    misses = serializers.IntegerField()
+    hit_rate = serializers.FloatField()
+    render_seconds = serializers.FloatField()
+    render_seconds_saved = serializers.FloatField()
+
+
+class AdmissionMetricsSerializer(serializers.Serializer):
+    """
+    This serializer is used to serialize the admission control metrics of an endpoint.
+    """
+    endpoint = serializers.CharField()
+    in_flight = serializers.IntegerField()
+    queued = serializers.IntegerField()
+    admitted = serializers.IntegerField()
+    rejected = serializers.IntegerField()
+    rate_limited = serializers.IntegerField()
+    wait_seconds = serializers.FloatField()
+
+
+class MetricsSerializer(serializers.Serializer):
+    """
+    This serializer is used to serialize the metrics API response.
+    """
+    detail = serializers.CharField()
+    page_cache = PageCacheMetricsSerializer()
+    admission = AdmissionMetricsSerializer(many=True)
+
+
+class VoteRateQuerySerializer(serializers.Serializer):
+    """
+    This serializer is used for election vote rate API query parameters.
+    """
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+    resolution = serializers.ChoiceField(choices=[choice for choice, _ in VoteRateBucket.RESOLUTION_CHOICES],
+                                         default=VoteRateBucket.QUARTER)
+    group_by = serializers.ChoiceField(choices=GROUP_BY_CHOICES, default=GROUP_TOTAL)
+
+
+class VoteRatePointSerializer(serializers.Serializer):
+    """
+    This serializer is used to serialize the number of ballots of a quarter of an hour or an hour.
+    """
+    time = serializers.DateTimeField()
+    count = serializers.IntegerField(allow_null=True)
+
+
+class VoteRateSeriesSerializer(serializers.Serializer):
+    """
+    This serializer is used to serialize the vote rate of an area, a party or the whole election.
+    """
+    id = serializers.IntegerField(allow_null=True)
+    name = serializers.CharField()
+    points = VoteRatePointSerializer(many=True)
+
+
+class BallotElectionSerializer(serializers.ModelSerializer):
+    """
+    This serializer is used to serialize the election of a ballot.
+    """
+
+    class Meta:
+        model = NewElection
+        fields = ('id', 'name', 'start_date', 'end_date')
+
+
+class BallotAreaSerializer(serializers.Serializer):
+    """
+    This serializer is used to serialize the area of a ballot.
+    """
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+
+
+class BallotCandidateSerializer(serializers.Serializer):
+    """
+    This serializer is used to serialize a candidate of a ballot, with the site relative URL of its thumbnails.
+    """
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    description = serializers.CharField()
+    party_id = serializers.IntegerField(allow_null=True)
+    thumbnail = serializers.CharField()
+    thumbnail_webp = serializers.CharField()
+
+
+class BallotPartySerializer(serializers.Serializer):
+    """
+    This serializer is used to serialize a party of a ballot, with the site relative URL of its thumbnails.
+    """
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    thumbnail = serializers.CharField()
+    thumbnail_webp = serializers.CharField()
+
+
+class BallotSerializer(serializers.Serializer):
+    """
+    This serializer is used to serialize the ballot bundle of an area.
+    """
+    election = BallotElectionSerializer()
+    area = BallotAreaSerializer()
+    candidates = BallotCandidateSerializer(many=True)
+    parties = BallotPartySerializer(many=True)
+
+
+class ResultsMatrixSerializer(serializers.Serializer):
+    """
+    This serializer is used to document the results matrix of an election, every field is a list in the order of
+    `area_ids`.
+    """
+    election_id = serializers.IntegerField()
+    area_ids = serializers.ListField(child=serializers.IntegerField())
+    area_names = serializers.ListField(child=serializers.CharField())
+    winner_ids = serializers.ListField(child=serializers.IntegerField(allow_null=True))
+    winner_votes = serializers.ListField(child=serializers.IntegerField())
+    runner_up_ids = serializers.ListField(child=serializers.IntegerField(allow_null=True))
+    runner_up_votes = serializers.ListField(child=serializers.IntegerField())
+    margins = serializers.ListField(child=serializers.IntegerField())
+    total_votes = serializers.ListField(child=serializers.IntegerField())
+    winner_party_ids = serializers.ListField(child=serializers.IntegerField(allow_null=True))
@@ -3,11 +3,33 @@ from http.client import UNAUTHORIZED
 
 from django.contrib.auth.models import User
 from django.core.exceptions import ObjectDoesNotExist
+from django.core.management import call_command
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
 from rest_framework import status
+from rest_framework.response import Response
 from rest_framework.test import APITestCase
-
-from apps.models import NewElection, NewCandidate, NewArea, NewParty, VoteResultParty, VoteResultCandidate, VoteCheck
+from unittest import mock
+
+import base64
+import io
+import os
+import tempfile
+import threading
+import httpx
+
+from apis import async_views, ballot, results, schema, serializers
+from apis.ballot import clear_ballots
+from apis.idempotency import idempotent, request_hash
+from apis.results import clear_results_matrices
+from apps.leaderboard import clear_leaderboards, record_vote
+from apps.reference import clear_reference_data
+from apis.schema import clear_schemas, code_version
+from apps.voterate import record_vote_rate
+from apps import metrics
+from apps.models import NewElection, NewCandidate, NewArea, NewParty, VoteResultParty, VoteResultCandidate, VoteCheck, \
+    IdempotencyKey
 from django.utils import timezone
 
 import json
@@ -140,6 +162,70 @@ class VoteApiTest(APITestCase):
                          msg="Must handle no area case")
         self.assertFalse(VoteCheck.objects.filter(user=self.users[0], election=self.election).exists())
 
+    def test_vote_idempotency_key(self):
+        """A retry with the same Idempotency-Key gets the first response and is not counted again."""
+        self.client.force_login(self.users[0])
+        data = {'candidate_id': self.candidates[0].id, 'party_id': self.parties[0].id}
+        response = self.client.post(self.test_url, data, HTTP_IDEMPOTENCY_KEY='vote-1')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        retry = self.client.post(self.test_url, data, HTTP_IDEMPOTENCY_KEY='vote-1')
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.json(), response.json())
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(VoteResultParty.objects.get(election=self.election, party=self.parties[0]).vote, 1)
+        self.assertEqual(VoteCheck.objects.filter(user=self.users[0], election=self.election).count(), 1)
+        # The key cannot be reused for another ballot.
+        response = self.client.post(self.test_url, {'candidate_id': self.candidates[1].id,
+                                                    'party_id': self.parties[0].id}, HTTP_IDEMPOTENCY_KEY='vote-1')
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    def test_vote_idempotency_key_in_progress(self):
+        """A retry of a request still running gets a 409, and takes over a request that never answered."""
+        self.client.force_login(self.users[0])
+        data = {'candidate_id': self.candidates[0].id, 'party_id': self.parties[0].id}
+        request = self.client.post(self.test_url, data, HTTP_IDEMPOTENCY_KEY='vote-1').wsgi_request
+        IdempotencyKey.objects.filter(key='vote-1').update(status_code=None, response=None)
+        VoteCheck.objects.all().delete()
+        self.assertEqual(IdempotencyKey.objects.get(key='vote-1').request_hash, request_hash(request))
+        response = self.client.post(self.test_url, data, HTTP_IDEMPOTENCY_KEY='vote-1')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        IdempotencyKey.objects.filter(key='vote-1').update(created_at=timezone.now() - timedelta(minutes=5))
+        response = self.client.post(self.test_url, data, HTTP_IDEMPOTENCY_KEY='vote-1')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn('Idempotent-Replayed', response)
+
+    def test_vote_counted_once(self):
+        """A second ballot of a voter that passes the check at the same time as the first is refused by the database."""
+        self.client.force_login(self.users[0])
+        data = {'candidate_id': self.candidates[0].id, 'party_id': self.parties[0].id}
+        self.assertEqual(self.client.post(self.test_url, data).status_code, status.HTTP_201_CREATED)
+        # As if the first ballot was not committed yet when the second one was checked.
+        with mock.patch('django.db.models.QuerySet.exists', return_value=False):
+            response = self.client.post(self.test_url, data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(VoteCheck.objects.filter(user=self.users[0]).count(), 1)
+        self.assertEqual(VoteResultCandidate.objects.get(candidate=self.candidates[0]).vote, 1)
+
+    def test_vote_turnout(self):
+        """A vote is counted in the turnout of the area of the voter."""
+        self.client.force_login(self.users[0])
+        self.client.post(self.test_url, {'candidate_id': self.candidates[0].id, 'party_id': self.parties[0].id})
+        response = self.client.get(reverse('api_election_turnout', args=[self.election.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([(row['area']['name'], row['voted'], row['eligible']) for row in response.json()['result']],
+                         [('A1', 1, 2), ('A2', 0, 2)])
+        self.assertEqual(response.json()['total']['voted'], 1)
+        self.assertEqual(self.client.get(reverse('api_election_turnout', args=[0])).status_code,
+                         status.HTTP_404_NOT_FOUND)
+
+    def test_clear_expired_idempotency_keys(self):
+        """Only the keys older than IDEMPOTENCY_KEY_TTL are deleted."""
+        old = IdempotencyKey.objects.create(user=self.users[0], key='old', request_hash='')
+        IdempotencyKey.objects.filter(id=old.id).update(created_at=timezone.now() - timedelta(days=2))
+        IdempotencyKey.objects.create(user=self.users[0], key='new', request_hash='')
+        call_command('clearidempotencykeys', stdout=io.StringIO())
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['new'])
+
 
 class CandidateApiTest(APITestCase):
     def setUp(self):
@@ -397,6 +483,18 @@ class CandidateApiTest(APITestCase):
         response = self.client.get(reverse('api_candidate_detail', args=[123456790]))
 
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_list_from_reference_data(self):
+        """The candidate list is served from the reference data, the same as from the models."""
+        self.candidates[0].party = NewParty.objects.create(name='P1', description='', quote='')
+        self.candidates[0].save()
+        response = self.client.get(reverse('api_candidate_list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        expected = serializers.GetCandidateSerializer(NewCandidate.objects.order_by('id'), many=True,
+                                                      context={'request': response.wsgi_request}).data
+        self.assertEqual(json.loads(response.content)['result'], json.loads(json.dumps(expected)))
+
+
 class ElectionApiTest(APITestCase):
     def setUp(self) -> None:
         """Create election for testing."""
@@ -526,7 +624,7 @@ class ElectionApiTest(APITestCase):
         response = self.client.get(self.test_url)
         response_content = json.loads(response.content.decode("utf-8"))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response_content["election"]), 6)
+        self.assertEqual(len(response_content["election"]), 8)
         self.assertEqual(response_content["election"]["id"], 1)
         self.assertEqual(response_content["election"]["name"], 'Test election1')
         self.assertNotEqual(response_content["election"]["start_date"], None)
@@ -557,7 +655,7 @@ class ElectionApiTest(APITestCase):
         response = self.client.get(self.test_url)
         response_content = json.loads(response.content.decode("utf-8"))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response_content["election"]), 6)
+        self.assertEqual(len(response_content["election"]), 8)
         self.assertEqual(response_content["election"]["id"], 1)
         self.assertEqual(response_content["election"]["name"], 'Test election1')
         self.assertNotEqual(response_content["election"]["start_date"], None)
@@ -650,3 +748,355 @@ class ElectionApiTest(APITestCase):
             'elction_id': self.election1.id
         }, format='json')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class MetricsApiTest(APITestCase):
+    def setUp(self) -> None:
+        self.staff = User.objects.create_user(username="staff", password="BadPassword", is_staff=True)
+        self.user = User.objects.create_user(username="user", password="BadPassword")
+        metrics.reset('pagecache.')
+        metrics.increment('pagecache.hits', 3)
+        metrics.increment('pagecache.misses')
+        metrics.increment('pagecache.render_seconds_saved', 0.5)
+
+    def test_get_metrics(self):
+        """Staff can see the page cache hit rate."""
+        self.client.login(username="staff", password="BadPassword")
+        response = self.client.get(reverse('api_metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['page_cache']['hits'], 3)
+        self.assertEqual(response.json()['page_cache']['hit_rate'], 0.75)
+        self.assertEqual(response.json()['page_cache']['render_seconds_saved'], 0.5)
+        self.assertEqual([row['endpoint'] for row in response.json()['admission']], ['vote', 'login'])
+
+    def test_get_metrics_not_staff(self):
+        """Normal users cannot see the metrics."""
+        self.client.login(username="user", password="BadPassword")
+        self.assertEqual(self.client.get(reverse('api_metrics')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class ElectionSimulationApiTest(APITestCase):
+    def setUp(self) -> None:
+        self.staff = User.objects.create_user(username="staff", password="BadPassword", is_staff=True)
+        self.user = User.objects.create_user(username="user", password="BadPassword")
+        self.election = NewElection.objects.create(name="Test election", start_date=timezone.now() - timedelta(days=2),
+                                                   end_date=timezone.now() - timedelta(days=1))
+        self.parties = [NewParty.objects.create(name="PT1"), NewParty.objects.create(name="PT2")]
+        VoteResultParty.objects.create(election=self.election, party=self.parties[0], vote=75)
+        VoteResultParty.objects.create(election=self.election, party=self.parties[1], vote=25)
+        self.url = reverse('api_election_simulation', args=[self.election.id])
+
+    def test_simulation(self):
+        """Staff get the seats of every party under the chosen method and their spread over the scenarios."""
+        self.client.login(username="staff", password="BadPassword")
+        response = self.client.post(self.url, {'method': 'dhondt', 'seats': 8, 'scenarios': 100, 'seed': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        result = response.json()['result']
+        self.assertEqual([row['party']['name'] for row in result], ['PT1', 'PT2'])
+        self.assertEqual([row['entitled'] for row in result], [6, 2])
+        self.assertEqual(response.json()['scenarios'], 100)
+
+    def test_simulation_invalid(self):
+        """Unknown methods are rejected, and only staff can run simulations."""
+        self.client.login(username="staff", password="BadPassword")
+        self.assertEqual(self.client.post(self.url, {'method': 'coin_flip'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.client.login(username="user", password="BadPassword")
+        self.assertEqual(self.client.post(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class ElectionVoteRateApiTest(APITestCase):
+    def setUp(self) -> None:
+        self.staff = User.objects.create_user(username="staff", password="BadPassword", is_staff=True)
+        self.user = User.objects.create_user(username="user", password="BadPassword")
+        self.election = NewElection.objects.create(name="Test election", start_date=timezone.now() - timedelta(hours=1),
+                                                   end_date=timezone.now() + timedelta(hours=1))
+        self.area = NewArea.objects.create(name="A1")
+        self.party = NewParty.objects.create(name="PT1")
+        record_vote_rate(self.election.id, self.area.id, self.party.id)
+        record_vote_rate(self.election.id, self.area.id, self.party.id)
+        self.url = reverse('api_election_vote_rate', args=[self.election.id])
+
+    def test_vote_rate(self):
+        """Staff get the ballots per quarter hour of every party, without the counts too small to keep secret."""
+        self.client.login(username="staff", password="BadPassword")
+        for min_count, counts in [(2, [2]), (3, [None])]:
+            with override_settings(VOTE_RATE_MIN_COUNT=min_count):
+                response = self.client.get(self.url, {'group_by': 'party'})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            result = response.json()['result']
+            self.assertEqual([(row['name'], [point['count'] for point in row['points']]) for row in result],
+                             [('PT1', counts)])
+
+    def test_vote_rate_invalid(self):
+        """Unknown groupings are rejected, and only staff can read the vote rate."""
+        self.client.login(username="staff", password="BadPassword")
+        self.assertEqual(self.client.get(self.url, {'group_by': 'candidate'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.client.login(username="user", password="BadPassword")
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class AsyncApiTest(TestCase):
+    def setUp(self) -> None:
+        self.factory = AsyncRequestFactory()
+        self.user = User.objects.create_user(username="1100000000001", password="BadPassword")
+        self.area = NewArea.objects.create(name="A1")
+        self.party = NewParty.objects.create(name="PT1")
+        self.other_party = NewParty.objects.create(name="PT2")
+        self.election = NewElection.objects.create(name="Finished election",
+                                                   start_date=timezone.now() - timedelta(days=2),
+                                                   end_date=timezone.now() - timedelta(days=1))
+        VoteResultParty.objects.create(election=self.election, party=self.party, vote=3)
+        self.upstream_requests = []
+
+    def cvv_service(self, request):
+        """A stand-in for the government CVV service that only accepts the CVV 123."""
+        self.upstream_requests.append(json.loads(request.content))
+        if json.loads(request.content)['citizenCVV'] == '123':
+            return httpx.Response(200, json={'detail': True})
+        return httpx.Response(401, json={'detail': False})
+
+    def login_request(self, cvv):
+        credential = base64.b64encode(f"{self.user.username}:{cvv}".encode()).decode()
+        request = self.factory.post('/api/auth/login/', headers={"Authorization": f"Basic {credential}"})
+        SessionMiddleware(lambda r: None).process_request(request)
+        return request
+
+    async def login(self, cvv):
+        client = httpx.AsyncClient(transport=httpx.MockTransport(self.cvv_service))
+        with mock.patch('apis.async_views.get_http_client', return_value=client):
+            return await async_views.login_view(self.login_request(cvv))
+
+    async def test_login(self):
+        """A valid CVV gives a knox token that authenticates the async profile view."""
+        response = await self.login('123')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.upstream_requests, [{'citizenID': 1100000000001, 'citizenCVV': '123'}])
+        token = json.loads(response.content)['token']
+        response = await async_views.profile_view(self.factory.get('/api/profile', headers={"Authorization": f"Token {token}"}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content)['result']['user']['username'], self.user.username)
+        self.assertFalse(json.loads(response.content)['voted_current_election'])
+
+    async def test_login_invalid_cvv(self):
+        """The upstream rejection is answered with 401."""
+        response = await self.login('999')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_raw_result_by_party(self):
+        """Parties without votes are listed after the ones with votes."""
+        request = self.factory.get('/api/election/result/party/raw')
+        request.user = mock.Mock(is_authenticated=False)
+        response = await async_views.raw_election_result_by_party_view(request, self.election.id)
+        vote_result = json.loads(response.content)['vote_result']
+        self.assertEqual([(row['party']['name'], row['vote_count']) for row in vote_result], [('PT1', 3), ('PT2', 0)])
+
+
+class ApiSchemaTest(TestCase):
+    def setUp(self) -> None:
+        """Generate the schema in a temporary folder."""
+        self.schema_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.schema_root.cleanup)
+        settings_override = override_settings(API_SCHEMA_ROOT=self.schema_root.name, CODE_VERSION='test-version')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        code_version.cache_clear()
+        self.addCleanup(code_version.cache_clear)
+        clear_schemas()
+        self.addCleanup(clear_schemas)
+
+    def test_schema_is_generated_once(self):
+        """The schema is generated by the first request and written to API_SCHEMA_ROOT."""
+        with mock.patch('apis.schema.build_schema', wraps=schema.build_schema) as build_schema:
+            response = self.client.get(reverse('schema-json', args=['.json']))
+            self.client.get(reverse('schema-json', args=['.json']))
+            self.client.get(reverse('schema-json', args=['.yaml']))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(build_schema.call_count, 1)
+        self.assertIn('/election/{election_id}/vote', json.loads(response.content)['paths'])
+        self.assertTrue(os.path.exists(os.path.join(self.schema_root.name, 'swagger-test-version.json')))
+        self.assertTrue(os.path.exists(os.path.join(self.schema_root.name, 'swagger-test-version.yaml')))
+
+    def test_schema_artifact_is_reused(self):
+        """A process serves the artifact of its code version without generating the schema."""
+        call_command('buildapischema', stdout=io.StringIO())
+        clear_schemas()
+        with mock.patch('apis.schema.build_schema') as build_schema:
+            response = self.client.get(reverse('schema-json', args=['.json']))
+        build_schema.assert_not_called()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('paths', json.loads(response.content))
+
+    def test_schema_not_modified(self):
+        """The schema is not sent again to a client with the ETag of the code version."""
+        response = self.client.get(reverse('schema-json', args=['.json']))
+        etag = response['ETag']
+        self.assertIn('test-version', etag)
+        response = self.client.get(reverse('schema-json', args=['.json']), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_documentation_page_loads_schema(self):
+        """The documentation pages load the precomputed schema instead of generating it."""
+        with mock.patch('apis.schema.build_schema') as build_schema, \
+                mock.patch('drf_yasg.generators.OpenAPISchemaGenerator.get_schema') as get_schema:
+            for name in ('schema-swagger-ui', 'schema-redoc'):
+                for _ in range(3):
+                    response = self.client.get(reverse(name))
+                    self.assertEqual(response.status_code, status.HTTP_200_OK)
+                    self.assertContains(response, reverse('schema-json', args=['.json']))
+                    self.assertContains(response, 'Sankasaint EC API')
+        build_schema.assert_not_called()
+        get_schema.assert_not_called()
+
+
+class BallotApiTest(APITestCase):
+    def setUp(self) -> None:
+        """Create an election with two areas for testing."""
+        clear_ballots()
+        self.addCleanup(clear_ballots)
+        clear_reference_data()
+        self.addCleanup(clear_reference_data)
+        self.election = NewElection.objects.create(name='E1', start_date=timezone.now() - timedelta(days=1),
+                                                   end_date=timezone.now() + timedelta(days=1))
+        self.areas = [NewArea.objects.create(name='A1'), NewArea.objects.create(name='A2')]
+        self.party = NewParty.objects.create(name='P1', description='', quote='')
+        self.candidates = [
+            NewCandidate.objects.create(user=User.objects.create_user(username='C1', first_name='First'),
+                                        area=self.areas[0], party=self.party),
+            NewCandidate.objects.create(user=User.objects.create_user(username='C2'), area=self.areas[1]),
+        ]
+        self.url = reverse('api_election_ballot', args=[self.election.id, self.areas[0].id])
+
+    def test_ballot(self):
+        """The ballot has the election, the candidates of the area and every party."""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ballot = json.loads(response.content)
+        self.assertEqual(ballot['election']['id'], self.election.id)
+        self.assertEqual(ballot['area'], {'id': self.areas[0].id, 'name': 'A1'})
+        self.assertEqual([(candidate['id'], candidate['name'], candidate['party_id'])
+                          for candidate in ballot['candidates']], [(self.candidates[0].id, 'First', self.party.id)])
+        self.assertEqual([party['id'] for party in ballot['parties']], [self.party.id])
+        self.assertTrue(ballot['parties'][0]['thumbnail'].startswith('/'))
+
+    def test_ballot_not_modified(self):
+        """The ballot is rendered once, and not sent again to a client with its ETag."""
+        with mock.patch('apis.ballot.variant_pending', return_value=False), \
+                mock.patch('apis.ballot.render_ballot', wraps=ballot.render_ballot) as render:
+            etag = self.client.get(self.url)['ETag']
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(render.call_count, 1)
+
+    def test_ballot_changed(self):
+        """The ballot is rendered again when a candidate changes."""
+        with mock.patch('apis.ballot.variant_pending', return_value=False):
+            etag = self.client.get(self.url)['ETag']
+            self.candidates[1].area = self.areas[0]
+            self.candidates[1].save()
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(json.loads(response.content)['candidates']), 2)
+
+    def test_ballot_not_found(self):
+        response = self.client.get(reverse('api_election_ballot', args=[self.election.id, 0]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(reverse('api_election_ballot', args=[0, self.areas[0].id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ResultsMatrixApiTest(APITestCase):
+    def setUp(self) -> None:
+        """Create a finished election with three areas for testing."""
+        for clear in (clear_results_matrices, clear_leaderboards, clear_reference_data):
+            clear()
+            self.addCleanup(clear)
+        self.election = NewElection.objects.create(name='E1', start_date=timezone.now() - timedelta(days=2),
+                                                   end_date=timezone.now() - timedelta(days=1))
+        self.areas = [NewArea.objects.create(name=f'A{number}') for number in range(1, 4)]
+        self.party = NewParty.objects.create(name='P1', description='', quote='')
+        self.candidates = [
+            NewCandidate.objects.create(user=User.objects.create_user(username=f'C{number}'), area=area,
+                                        party=self.party if number == 1 else None)
+            for number, area in [(1, self.areas[0]), (2, self.areas[0]), (3, self.areas[1])]]
+        for candidate, vote in zip(self.candidates, [5, 3, 2]):
+            VoteResultCandidate.objects.create(election=self.election, candidate=candidate, vote=vote)
+        self.url = reverse('api_election_result_matrix', args=[self.election.id])
+
+    def test_results_matrix(self):
+        """Every area has its winner, runner-up, margin and total votes, in the order of the areas."""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content), {
+            'election_id': self.election.id,
+            'area_ids': [area.id for area in self.areas],
+            'area_names': ['A1', 'A2', 'A3'],
+            'winner_ids': [self.candidates[0].id, self.candidates[2].id, None],
+            'winner_votes': [5, 2, 0],
+            'runner_up_ids': [self.candidates[1].id, None, None],
+            'runner_up_votes': [3, 0, 0],
+            'margins': [2, 2, 0],
+            'total_votes': [8, 2, 0],
+            'winner_party_ids': [self.party.id, None, None],
+        })
+
+    def test_results_matrix_not_modified(self):
+        """The matrix is encoded once per tally version, and encoded again once a ballot is counted."""
+        with mock.patch('apis.results.render_results_matrix',
+                        wraps=results.render_results_matrix) as render:
+            etag = self.client.get(self.url)['ETag']
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(render.call_count, 1)
+            record_vote(self.election.id, self.candidates[1].id, None)
+            record_vote(self.election.id, self.candidates[1].id, None)
+            record_vote(self.election.id, self.candidates[1].id, None)
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(render.call_count, 2)
+        matrix = json.loads(response.content)
+        self.assertEqual(matrix['winner_ids'][0], self.candidates[1].id)
+        self.assertEqual(matrix['total_votes'][0], 11)
+
+    def test_results_matrix_not_finished(self):
+        """The results of an ongoing election are only shown to staff."""
+        self.election.end_date = timezone.now() + timedelta(days=1)
+        self.election.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.client.force_authenticate(User.objects.create_user(username='staff', is_staff=True))
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_results_matrix_not_found(self):
+        response = self.client.get(reverse('api_election_result_matrix', args=[0]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class IdempotencyClaimTest(TransactionTestCase):
+    def test_claim_committed_before_view(self):
+        """The key is committed before the view runs, so a retry sent meanwhile gets a 409 at once."""
+        user = User.objects.create_user(username='voter')
+        retries = []
+
+        class View:
+            @idempotent
+            def post(self, request):
+                if not retries:
+                    # A retry from another connection, while this request is in its transaction.
+                    thread = threading.Thread(target=lambda: retries.append(View().post(make_request())))
+                    thread.start()
+                    thread.join(5)
+                return Response({'detail': 'Vote successfully'}, status=status.HTTP_201_CREATED)
+
+        def make_request():
+            request = RequestFactory().post('/api/election/1/vote', {'candidate_id': 1},
+                                            HTTP_IDEMPOTENCY_KEY='vote-1')
+            request.user = user
+            return request
+        self.assertEqual(View().post(make_request()).status_code, status.HTTP_201_CREATED)
+        self.assertEqual([retry.status_code for retry in retries], [status.HTTP_409_CONFLICT])
+        self.assertEqual(IdempotencyKey.objects.get(key='vote-1').status_code, status.HTTP_201_CREATED)
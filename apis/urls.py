@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 
 # NOTE: THIS IS ONLY TEMPORARY FIX. IT MUST BE ADDRESSED LATER
@@ -5,11 +6,24 @@ from django.views.decorators.csrf import csrf_exempt
 
 from apis.views import *
 
+if settings.ASYNC_VIEWS:
+    from apis import async_views
+
+    profile_view = async_views.profile_view
+    election_result_by_party_view = async_views.election_result_by_party_view
+    raw_election_result_by_party_view = async_views.raw_election_result_by_party_view
+    election_result_by_area_view = async_views.election_result_by_area_view
+else:
+    profile_view = UserProfileView.as_view()
+    election_result_by_party_view = ElectionResultByPartyView.as_view()
+    raw_election_result_by_party_view = RawElectionResultByPartyView.as_view()
+    election_result_by_area_view = ElectionResultByAreaView.as_view()
+
 urlpatterns = [
     # Remove login view as it is not used anymore.
     # path('login', csrf_exempt(LoginView.as_view()), name='api_login'),
     # path('logout', LogoutView.as_view(), name='api_logout'),
-    path('profile', UserProfileView.as_view(), name='api_profile'),
+    path('profile', profile_view, name='api_profile'),
     path('area', AreasView.as_view(), name='api_area_list'),
     path('area/<int:area_id>', AreaDetailView.as_view(), name='api_area_detail'),
     path('candidate', CandidatesView.as_view(), name='api_candidate_list'),
@@ -20,11 +34,17 @@ urlpatterns = [
     path('election/<int:election_id>/vote', ElectionVoteView.as_view(), name='api_election_vote'),
     path('party', PartyView.as_view(), name='api_party_list'),
     path('party/<int:party_id>', PartyDetailView.as_view(), name='api_party_detail'),
-    path('election/<int:election_id>/result/party', ElectionResultByPartyView.as_view(), name='api_election_result_by_party'),
-    path('election/<int:election_id>/result/party/raw', RawElectionResultByPartyView.as_view(), name='api_raw_election_result_by_party'),
-    path('election/<int:election_id>/result/area/<int:area_id>', ElectionResultByAreaView.as_view(), name='api_election_result_by_area'),
+    path('election/<int:election_id>/result/party', election_result_by_party_view, name='api_election_result_by_party'),
+    path('election/<int:election_id>/result/party/raw', raw_election_result_by_party_view, name='api_raw_election_result_by_party'),
+    path('election/<int:election_id>/result/area/<int:area_id>', election_result_by_area_view, name='api_election_result_by_area'),
+    path('election/<int:election_id>/result/areas', ElectionResultsMatrixView.as_view(), name='api_election_result_matrix'),
+    path('election/<int:election_id>/turnout', ElectionTurnoutView.as_view(), name='api_election_turnout'),
+    path('election/<int:election_id>/ballot/<int:area_id>', ElectionBallotView.as_view(), name='api_election_ballot'),
+    path('election/<int:election_id>/vote-rate', ElectionVoteRateView.as_view(), name='api_election_vote_rate'),
+    path('election/<int:election_id>/simulation', ElectionSimulationView.as_view(), name='api_election_simulation'),
     path('election/latest', ElectionLatestView.as_view(), name='api_latest_election'),
     path('election/latest/result/party', LatestElectionResultByPartyView.as_view(), name='api_latest_election_result_by_party'),
     path('election/latest/result/party/raw', LatestRawElectionResultByPartyView.as_view(), name='api_latest_raw_election_result_by_party'),
     path('election/latest/result/area/<int:area_id>', LatestElectionResultByAreaView.as_view(), name='api_latest_election_result_by_area'),
+    path('metrics', MetricsView.as_view(), name='api_metrics'),
 ]
\ No newline at end of file
@@ -2,27 +2,74 @@ import base64
 import logging
 
 import requests
+from django.conf import settings
 from django.contrib.auth import login, logout
 from django.contrib.auth.models import User
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.http import HttpResponse, HttpResponseNotModified
 from django.utils import timezone
+from django.utils.http import parse_etags
 from django.views.decorators.csrf import csrf_exempt
+from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import permissions, status
 from rest_framework import views
 from rest_framework.response import Response
 import logging
 
+from apps import metrics
+from apps.allocation import VoteMatrix, party_list_result, simulate
+from apps.leaderboard import record_vote
+from apps.reference import get_reference_data
+from apps.turnout import get_turnout, record_turnout, summarize_turnout
+from apps.voterate import GROUP_AREA, GROUP_PARTY, record_vote_rate, vote_rate_series
 from apps.models import NewArea, NewCandidate, NewElection, VoteCheck, VoteResultCandidate, VoteResultParty, NewParty
 from apps.utils import check_election_status, is_there_ongoing_election, check_election_status, \
-    calculate_election_party_result, get_one_ongoing_election
+    get_election_party_result, get_one_ongoing_election
 from . import serializers
+from .ballot import get_ballot
+from .idempotency import idempotent
+from .results import get_results_matrix
 from .serializers import VoteSerializer, VoteCheckSerializer
 from knox.views import LoginView as KnoxLoginView
 
 logger = logging.getLogger(__name__)
 
 
+def area_vote_result(election: NewElection, area_id: int) -> list:
+    """
+    Return the votes of the candidates of an area, the candidates with votes by vote count then the ones without.
+
+    The candidates are records of the reference data (see ``apps.reference``), for ``VoteAreaResultSerializer``.
+    """
+    reference = get_reference_data()
+    votes = VoteResultCandidate.objects.filter(election=election, candidate__area_id=area_id) \
+        .order_by('-vote', 'candidate_id').values_list('candidate_id', 'vote')
+    result = [{'candidate': reference.candidates[candidate_id], 'vote_count': vote}
+              for candidate_id, vote in votes if candidate_id in reference.candidates]
+    voted = {row['candidate'].id for row in result}
+    result.extend({'candidate': candidate, 'vote_count': 0}
+                  for candidate in reference.candidates_in_area(area_id) if candidate.id not in voted)
+    return result
+
+
+def raw_party_vote_result(election: NewElection) -> list:
+    """
+    Return the votes of the parties, the parties with votes by vote count then the ones without.
+
+    The parties are records of the reference data, for ``VotePartyRawResultSerializer``.
+    """
+    reference = get_reference_data()
+    votes = VoteResultParty.objects.filter(election=election).order_by('-vote', 'party_id') \
+        .values_list('party_id', 'vote')
+    result = [{'party': reference.parties[party_id], 'vote_count': vote}
+              for party_id, vote in votes if party_id in reference.parties]
+    voted = {row['party'].id for row in result}
+    result.extend({'party': party, 'vote_count': 0} for party in reference.parties.values() if party.id not in voted)
+    return result
+
+
 class LoginView(KnoxLoginView):
     # This view should be accessible also for unauthenticated users.
     permission_classes = [permissions.AllowAny]
@@ -52,10 +99,10 @@ class LoginView(KnoxLoginView):
         # TODO: Use production API
 
         try:
-            response = requests.post("https://catnip-api.herokuapp.com/api/v1/validate-cvv", json={
+            response = requests.post(settings.CVV_SERVICE_URL, json={
                 'citizenID': int(username),
                 'citizenCVV': str(cvv)
-            })
+            }, timeout=settings.CVV_SERVICE_TIMEOUT)
         except ValueError:
             return Response({'error': {'detail': 'Invalid credential'}}, status=status.HTTP_400_BAD_REQUEST)
         if response.status_code in [status.HTTP_401_UNAUTHORIZED, status.HTTP_404_NOT_FOUND]:
@@ -120,7 +167,7 @@ class AreasView(views.APIView):
 
         Get a list of all areas.
         """
-        serializer = serializers.AreaSerializer(NewArea.objects.all().order_by('id'), many=True)
+        serializer = serializers.AreaSerializer(list(get_reference_data().areas.values()), many=True)
         return Response({'detail': 'Get all election area successfully', 'result': serializer.data},
                         status=status.HTTP_200_OK)
 
@@ -202,19 +249,18 @@ class AreaDetailView(views.APIView):
 
         Get the full detail of the target area with list of candidates in that area.
         """
-        try:
-            area = NewArea.objects.get(id=area_id)
-            area_serializer = serializers.AreaSerializer(area, context={'request': self.request})
-            candidate_serializer = serializers.GetCandidateSerializer(
-                NewCandidate.objects.filter(area=area).order_by('id'), many=True,
-                context={'request': self.request})
-            return Response({'detail': 'Get area detail successfully', 'result': {
-                'area': area_serializer.data,
-                'candidates': candidate_serializer.data
-            }}, status=status.HTTP_200_OK)
-        except NewArea.DoesNotExist:
+        reference = get_reference_data()
+        area = reference.areas.get(area_id)
+        if area is None:
             return Response({'detail': 'Get area detail failed', 'errors': {'detail': 'Area does not exist.'}},
                             status=status.HTTP_404_NOT_FOUND)
+        area_serializer = serializers.AreaSerializer(area, context={'request': self.request})
+        candidate_serializer = serializers.GetCandidateSerializer(
+            reference.candidates_in_area(area.id), many=True, context={'request': self.request})
+        return Response({'detail': 'Get area detail successfully', 'result': {
+            'area': area_serializer.data,
+            'candidates': candidate_serializer.data
+        }}, status=status.HTTP_200_OK)
 
 
 class CandidatesView(views.APIView):
@@ -227,7 +273,7 @@ class CandidatesView(views.APIView):
 
         Get a list of all candidates.
         """
-        serializer = serializers.GetCandidateSerializer(NewCandidate.objects.all().order_by('id'), many=True,
+        serializer = serializers.GetCandidateSerializer(list(get_reference_data().candidates.values()), many=True,
                                                         context={'request': self.request})
         return Response({'detail': 'Get all candidates successfully', 'result': serializer.data},
                         status=status.HTTP_200_OK)
@@ -519,15 +565,20 @@ class ElectionDetailView(views.APIView):
 class ElectionVoteView(views.APIView):
     permission_classes = [permissions.IsAuthenticated]
 
-    @swagger_auto_schema(request_body=serializers.VoteSerializer, responses={
+    @swagger_auto_schema(request_body=serializers.VoteSerializer, manual_parameters=[
+        openapi.Parameter('Idempotency-Key', openapi.IN_HEADER, type=openapi.TYPE_STRING, required=False,
+                          description='A unique key for this vote, retries with the same key get the first response.')
+    ], responses={
         404: serializers.ErrorSerializer(detail='Election does not exist.'),
         201: serializers.VoteCheckSerializer
     })
+    @idempotent
     def post(self, request, election_id):
         """
         Vote candidate and party in the election
 
-        Post the vote using given `candidate_id` and `party_id`
+        Post the vote using given `candidate_id` and `party_id`. Send an `Idempotency-Key` header to retry a vote
+        safely, a retry with the same key gets the response of the first request.
         """
         vote_data = VoteSerializer(data=request.data)
         if not vote_data.is_valid():
@@ -548,34 +599,44 @@ class ElectionVoteView(views.APIView):
             # TODO: Area check
 
             candidate_id = vote_data.data['candidate_id']
+            reference = get_reference_data()
 
-            if not NewCandidate.objects.filter(id=candidate_id).exists():
+            if candidate_id not in reference.candidates:
                 return Response({'detail': 'Vote failed', 'errors': {'detail': 'Candidate does not exist.'}},
                                 status=status.HTTP_400_BAD_REQUEST)
 
-            if request.user.newprofile.area is None:
+            if request.user.newprofile.area_id is None:
                 return Response({'detail': 'Vote failed',
                                  'errors': {'detail': 'Please contact administrator to set area.'}},
                                 status=status.HTTP_400_BAD_REQUEST)
 
-            if NewCandidate.objects.get(id=candidate_id).area.id != request.user.newprofile.area.id:
+            if reference.candidates[candidate_id].area_id != request.user.newprofile.area_id:
                 return Response({'detail': 'Vote failed', 'errors': {'detail': 'Cannot vote candidate outside area'}},
                                 status=status.HTTP_400_BAD_REQUEST)
 
             party_id = vote_data.data['party_id']
-            if not NewParty.objects.filter(id=party_id).exists():
+            if party_id not in reference.parties:
                 return Response({'detail': 'Vote failed', 'errors': {'detail': 'Party does not exist.'}},
                                 status=status.HTTP_400_BAD_REQUEST)
 
-            vote_result_candidate, _ = VoteResultCandidate.objects.get_or_create(election=election,
-                                                                                 candidate_id=candidate_id)
-            vote_result_candidate.vote += 1
-            vote_result_candidate.save()
-            vote_result_party, _ = VoteResultParty.objects.get_or_create(election=election,
-                                                                         party_id=party_id)
-            vote_result_party.vote += 1
-            vote_result_party.save()
-            vote_check = VoteCheck.objects.create(election=election, user=request.user)
+            try:
+                with transaction.atomic():
+                    # First, the unique VoteCheck of the voter stops a second request that passed the check above.
+                    vote_check = VoteCheck.objects.create(election=election, user=request.user,
+                                                          area_id=request.user.newprofile.area_id)
+                    # Increment in the database, concurrent votes would overwrite each other's count otherwise.
+                    vote_result_candidate, _ = VoteResultCandidate.objects.get_or_create(election=election,
+                                                                                         candidate_id=candidate_id)
+                    VoteResultCandidate.objects.filter(id=vote_result_candidate.id).update(vote=F('vote') + 1)
+                    vote_result_party, _ = VoteResultParty.objects.get_or_create(election=election,
+                                                                                 party_id=party_id)
+                    VoteResultParty.objects.filter(id=vote_result_party.id).update(vote=F('vote') + 1)
+                    record_turnout(election.id, request.user.newprofile.area_id)
+                    record_vote_rate(election.id, request.user.newprofile.area_id, party_id)
+                    transaction.on_commit(lambda: record_vote(election.id, candidate_id, party_id))
+            except IntegrityError:
+                return Response({'detail': 'Vote failed', 'errors': {'detail': 'Already voted'}},
+                                status=status.HTTP_400_BAD_REQUEST)
 
             # Success
             return Response({'detail': 'Vote successfully', 'vote_check': VoteCheckSerializer(vote_check).data},
@@ -597,9 +658,8 @@ class PartyView(views.APIView):
 
         Get the list of all party.
         """
-        party = NewParty.objects.all().order_by('id')
-        serializer = serializers.PartySerializer(data=party, many=True, context={'request': self.request})
-        serializer.is_valid()
+        serializer = serializers.PartySerializer(list(get_reference_data().parties.values()), many=True,
+                                                 context={'request': self.request})
         return Response({'detail': 'Get party list successfully', 'party': serializer.data},
                         status=status.HTTP_200_OK)
 
@@ -713,30 +773,16 @@ class ElectionResultByAreaView(views.APIView):
         except NewElection.DoesNotExist:
             return Response({'detail': 'Get election result failed', 'errors': {'detail': 'Election does not exist.'}},
                             status=status.HTTP_404_NOT_FOUND)
-        try:
-            area = NewArea.objects.get(id=area_id)
-        except NewArea.DoesNotExist:
+        if area_id not in get_reference_data().areas:
             return Response({'detail': 'Get election result failed', 'errors': {'detail': 'Area does not exist.'}},
                             status=status.HTTP_404_NOT_FOUND)
         if check_election_status(election) != 'Finished' and (
                 request.user.is_staff or request.user.is_superuser) or check_election_status(
             election) == 'Finished':
-            vote_result = VoteResultCandidate.objects.filter(election=election, candidate__area_id=area_id).order_by(
-                '-vote')
-            candidate_no_vote = []
-            candidate_in_area = NewCandidate.objects.filter(area_id=area_id).order_by('id')
-            for candidate in candidate_in_area:
-                if not vote_result.filter(candidate=candidate):
-                    candidate_no_vote.append(candidate)
-            api_result = []
-            for result in vote_result:
-                # Set candidate and vote in VoteAreaResultSerializer
-                api_result.append({'candidate': result.candidate, 'vote_count': result.vote})
-            for candidate in candidate_no_vote:
-                api_result.append({'candidate': candidate, 'vote_count': 0})
             return Response({'detail': 'Get election result successfully',
-                             'vote_result': serializers.VoteAreaResultSerializer(api_result, many=True, context={
-                                 'request': self.request}).data})
+                             'vote_result': serializers.VoteAreaResultSerializer(
+                                 area_vote_result(election, area_id), many=True,
+                                 context={'request': self.request}).data})
         else:
             return Response(
                 {'detail': 'Get election result failed', 'errors': {'detail': 'Election has not finished.'}},
@@ -764,20 +810,9 @@ class RawElectionResultByPartyView(views.APIView):
                             status=status.HTTP_404_NOT_FOUND)
         if check_election_status(election) != 'Finished' and (
                 request.user.is_staff or request.user.is_superuser) or check_election_status(election) == 'Finished':
-            vote_result = VoteResultParty.objects.filter(election=election).order_by('-vote')
-            party_no_vote = []
-            for party in NewParty.objects.all():
-                if not vote_result.filter(party=party):
-                    party_no_vote.append(party)
-            api_result = []
-            for result in vote_result:
-                # Set candidate and vote in VoteAreaResultSerializer
-                api_result.append({'party': result.party, 'vote_count': result.vote})
-            for party in party_no_vote:
-                api_result.append({'party': party, 'vote_count': 0})
             return Response({'detail': 'Get election result successfully',
-                             'vote_result': serializers.VotePartyRawResultSerializer(api_result, many=True, context={
-                                 'request': self.request}).data})
+                             'vote_result': serializers.VotePartyRawResultSerializer(
+                                 raw_party_vote_result(election), many=True, context={'request': self.request}).data})
         else:
             return Response(
                 {'detail': 'Get election result failed', 'errors': {'detail': 'Election has not finished.'}},
@@ -805,7 +840,7 @@ class ElectionResultByPartyView(views.APIView):
                             status=status.HTTP_404_NOT_FOUND)
         if check_election_status(election) != 'Finished' and (
                 request.user.is_staff or request.user.is_superuser) or check_election_status(election) == 'Finished':
-            result = calculate_election_party_result(election.id)
+            result = get_election_party_result(election)
             result = result['result']
             api_result = []
             for data in result:
@@ -838,9 +873,7 @@ class LatestElectionResultByAreaView(views.APIView):
 
         Get the latest election result by area.
         """
-        try:
-            area = NewArea.objects.get(id=area_id)
-        except NewArea.DoesNotExist:
+        if area_id not in get_reference_data().areas:
             return Response({'detail': 'Get election result failed', 'errors': {'detail': 'Area does not exist.'}},
                             status=status.HTTP_404_NOT_FOUND)
         try:
@@ -852,22 +885,10 @@ class LatestElectionResultByAreaView(views.APIView):
         if check_election_status(election) != 'Finished' and (
                 request.user.is_staff or request.user.is_superuser) or check_election_status(
             election) == 'Finished':
-            vote_result = VoteResultCandidate.objects.filter(election=election, candidate__area_id=area_id).order_by(
-                '-vote')
-            candidate_no_vote = []
-            candidate_in_area = NewCandidate.objects.filter(area_id=area_id).order_by('id')
-            for candidate in candidate_in_area:
-                if not vote_result.filter(candidate=candidate):
-                    candidate_no_vote.append(candidate)
-            api_result = []
-            for result in vote_result:
-                # Set candidate and vote in VoteAreaResultSerializer
-                api_result.append({'candidate': result.candidate, 'vote_count': result.vote})
-            for candidate in candidate_no_vote:
-                api_result.append({'candidate': candidate, 'vote_count': 0})
             return Response({'detail': 'Get election result successfully',
-                             'vote_result': serializers.VoteAreaResultSerializer(api_result, many=True, context={
-                                 'request': self.request}).data})
+                             'vote_result': serializers.VoteAreaResultSerializer(
+                                 area_vote_result(election, area_id), many=True,
+                                 context={'request': self.request}).data})
         else:
             return Response(
                 {'detail': 'Get election result failed', 'errors': {'detail': 'Election has not finished.'}},
@@ -909,20 +930,9 @@ class LatestRawElectionResultByPartyView(views.APIView):
         except IndexError:
             return Response({'detail': 'Get election result failed', 'errors': {'detail': 'No election found.'}},
                             status=status.HTTP_404_NOT_FOUND)
-        vote_result = VoteResultParty.objects.filter(election=election).order_by('-vote')
-        party_no_vote = []
-        for party in NewParty.objects.all():
-            if not vote_result.filter(party=party):
-                party_no_vote.append(party)
-        api_result = []
-        for result in vote_result:
-            # Set candidate and vote in VoteAreaResultSerializer
-            api_result.append({'party': result.party, 'vote_count': result.vote})
-        for party in party_no_vote:
-            api_result.append({'party': party, 'vote_count': 0})
         return Response({'detail': 'Get election result successfully',
-                         'vote_result': serializers.VotePartyRawResultSerializer(api_result, many=True, context={
-                             'request': self.request}).data})
+                         'vote_result': serializers.VotePartyRawResultSerializer(
+                             raw_party_vote_result(election), many=True, context={'request': self.request}).data})
 
 
 class LatestElectionResultByPartyView(views.APIView):
@@ -945,7 +955,7 @@ class LatestElectionResultByPartyView(views.APIView):
         except IndexError:
             return Response({'detail': 'Get election result failed', 'errors': {'detail': 'No election found.'}},
                             status=status.HTTP_404_NOT_FOUND)
-        result = calculate_election_party_result(election.id)
+        result = get_election_party_result(election)
         result = result['result']
         api_result = []
         for data in result:
@@ -958,3 +968,258 @@ class LatestElectionResultByPartyView(views.APIView):
                          'vote_result': serializers.PartylistElectionResultSerializer(api_result, many=True,
                                                                                       context={
                                                                                           'request': self.request}).data})
+
+
+class ElectionSimulationView(views.APIView):
+    permission_classes = [permissions.AllowAny]
+
+    @swagger_auto_schema(request_body=serializers.SimulationSerializer, responses={
+        200: serializers.SimulationResultSerializer(many=True),
+        400: serializers.SimulationSerializer,
+        401: serializers.ErrorSerializer(detail='You do not have permission to perform this action.'),
+        404: serializers.ErrorSerializer(detail='Election does not exist.')
+    })
+    def post(self, request, election_id):
+        """
+        Simulate the seats of the parties.
+
+        Allocate the seats of the election with the given `method` (`largest_remainder`, `dhondt` or `sainte_lague`),
+        then run `scenarios` random vote swings of about `swing` (0.1 is 10%) on the votes of every party in every
+        area and summarize the seats of every party over them. This action is only allowed for staff user.
+        """
+        if request.user.is_authenticated and (request.user.is_superuser or request.user.is_staff):
+            serializer = serializers.SimulationSerializer(data=request.data)
+            if not serializer.is_valid():
+                return Response({'detail': 'Simulate election failed', 'errors': serializer.errors},
+                                status=status.HTTP_400_BAD_REQUEST)
+            try:
+                election = NewElection.objects.get(id=election_id)
+            except NewElection.DoesNotExist:
+                return Response({'detail': 'Simulate election failed', 'errors': {'detail': 'Election does not exist.'}},
+                                status=status.HTTP_404_NOT_FOUND)
+            options = serializer.validated_data
+            seats = options.get('seats', settings.ELECTION_TOTAL_SEATS)
+            matrix = VoteMatrix.from_election(election.id)
+            allocation = party_list_result(matrix, seats, options['method'])
+            simulation = simulate(matrix, options['scenarios'], seats, options['method'], options['swing'],
+                                  options.get('seed'))
+            parties = NewParty.objects.in_bulk(matrix.party_ids)
+            api_result = []
+            for index, party_id in enumerate(matrix.party_ids):
+                api_result.append({
+                    'party': parties[party_id],
+                    'entitled': allocation['entitled'][index],
+                    'won': allocation['won'][index],
+                    'list_seats': allocation['list_seats'][index],
+                    'mean_seats': simulation['mean'][index],
+                    'std_seats': simulation['std'][index],
+                    'p5_seats': simulation['p5'][index],
+                    'p95_seats': simulation['p95'][index],
+                    'min_seats': simulation['min'][index],
+                    'max_seats': simulation['max'][index],
+                    'mean_won': simulation['mean_won'][index],
+                    'majority_probability': simulation['majority'][index],
+                })
+            api_result.sort(key=lambda row: row['mean_seats'], reverse=True)
+            return Response({'detail': 'Simulate election successfully', 'method': options['method'], 'seats': seats,
+                             'scenarios': options['scenarios'],
+                             'result': serializers.SimulationResultSerializer(api_result, many=True,
+                                                                              context={'request': request}).data},
+                            status=status.HTTP_200_OK)
+        else:
+            return Response({'detail': 'Simulate election failed',
+                             'errors': {'detail': 'You do not have permission to perform this action.'}},
+                            status=status.HTTP_401_UNAUTHORIZED)
+
+
+class ElectionTurnoutView(views.APIView):
+    permission_classes = [permissions.AllowAny]
+
+    @swagger_auto_schema(responses={
+        200: serializers.AreaTurnoutSerializer(many=True),
+        404: serializers.ErrorSerializer(detail='Election does not exist.')
+    })
+    def get(self, request, election_id):
+        """
+        Get the turnout of an election.
+
+        Get the number of eligible voters and of users who voted in every area, and in total.
+        """
+        try:
+            election = NewElection.objects.get(id=election_id)
+        except NewElection.DoesNotExist:
+            return Response({'detail': 'Get election turnout failed', 'errors': {'detail': 'Election does not exist.'}},
+                            status=status.HTTP_404_NOT_FOUND)
+        turnout = get_turnout(election.id)
+        return Response({'detail': 'Get election turnout successfully',
+                         'total': serializers.TurnoutSummarySerializer(summarize_turnout(turnout)).data,
+                         'result': serializers.AreaTurnoutSerializer(turnout, many=True).data},
+                        status=status.HTTP_200_OK)
+
+
+class ElectionBallotView(views.APIView):
+    permission_classes = [permissions.AllowAny]
+
+    @swagger_auto_schema(responses={
+        200: serializers.BallotSerializer,
+        304: 'The ballot did not change since the request of the `If-None-Match` ETag.',
+        404: serializers.ErrorSerializer(detail='Election does not exist.')
+    })
+    def get(self, request, election_id, area_id):
+        """
+        Get the ballot of an area.
+
+        Get the election, the candidates of the area and every party in one response, with the site relative URL of
+        their thumbnails. The ballot is pre-rendered and sent with an `ETag`, send it back in `If-None-Match` to get a
+        304 while the ballot did not change.
+        """
+        try:
+            election = NewElection.objects.get(id=election_id)
+        except NewElection.DoesNotExist:
+            return Response({'detail': 'Get ballot failed', 'errors': {'detail': 'Election does not exist.'}},
+                            status=status.HTTP_404_NOT_FOUND)
+        bundle = get_ballot(election, area_id)
+        if bundle is None:
+            return Response({'detail': 'Get ballot failed', 'errors': {'detail': 'Area does not exist.'}},
+                            status=status.HTTP_404_NOT_FOUND)
+        if bundle.etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(bundle.content, content_type='application/json')
+        response['ETag'] = bundle.etag
+        response['Cache-Control'] = 'public, max-age=0, must-revalidate'
+        return response
+
+
+class ElectionResultsMatrixView(views.APIView):
+    permission_classes = [permissions.AllowAny]
+
+    @swagger_auto_schema(responses={
+        200: serializers.ResultsMatrixSerializer,
+        304: 'The results did not change since the request of the `If-None-Match` ETag.',
+        404: serializers.ErrorSerializer(detail='Election does not exist.'),
+        400: serializers.ErrorSerializer(detail='Election has not ended.')
+    })
+    def get(self, request, election_id):
+        """
+        Get the results of every area.
+
+        Get the winner, runner-up, margin and total votes of every area, column by column: every field is a list in
+        the order of `area_ids`, the winner and runner-up of an area without votes are null. The results are sent with
+        an `ETag`, send it back in `If-None-Match` to get a 304 while no ballot was counted.
+        """
+        try:
+            election = NewElection.objects.get(id=election_id)
+        except NewElection.DoesNotExist:
+            return Response({'detail': 'Get election result failed', 'errors': {'detail': 'Election does not exist.'}},
+                            status=status.HTTP_404_NOT_FOUND)
+        if check_election_status(election) != 'Finished' and (
+                request.user.is_staff or request.user.is_superuser) or check_election_status(election) == 'Finished':
+            matrix = get_results_matrix(election)
+            if matrix.etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+                response = HttpResponseNotModified()
+            else:
+                response = HttpResponse(matrix.content, content_type='application/json')
+            response['ETag'] = matrix.etag
+            # The results of an ongoing election are only shown to staff.
+            response['Cache-Control'] = 'private, max-age=0, must-revalidate'
+            return response
+        else:
+            return Response(
+                {'detail': 'Get election result failed', 'errors': {'detail': 'Election has not finished.'}},
+                status=status.HTTP_400_BAD_REQUEST)
+
+
+class ElectionVoteRateView(views.APIView):
+    permission_classes = [permissions.AllowAny]
+
+    @swagger_auto_schema(query_serializer=serializers.VoteRateQuerySerializer, responses={
+        200: serializers.VoteRateSeriesSerializer(many=True),
+        400: serializers.VoteRateQuerySerializer,
+        401: serializers.ErrorSerializer(detail='You do not have permission to perform this action.'),
+        404: serializers.ErrorSerializer(detail='Election does not exist.')
+    })
+    def get(self, request, election_id):
+        """
+        Get the vote rate of an election.
+
+        Get the number of ballots per `quarter` hour or `hour` from `start` (default: start of the election) to `end`
+        (default: now), as one series in total or a series per `area` or `party`. Quarters without ballots are left
+        out, quarters older than the retention of the quarter buckets are only available per hour, and the counts of a
+        party too small to keep the ballots secret are null. This action is only allowed for staff user.
+        """
+        if request.user.is_authenticated and (request.user.is_superuser or request.user.is_staff):
+            serializer = serializers.VoteRateQuerySerializer(data=request.query_params)
+            if not serializer.is_valid():
+                return Response({'detail': 'Get election vote rate failed', 'errors': serializer.errors},
+                                status=status.HTTP_400_BAD_REQUEST)
+            try:
+                election = NewElection.objects.get(id=election_id)
+            except NewElection.DoesNotExist:
+                return Response({'detail': 'Get election vote rate failed',
+                                 'errors': {'detail': 'Election does not exist.'}},
+                                status=status.HTTP_404_NOT_FOUND)
+            options = serializer.validated_data
+            start = options.get('start', election.start_date)
+            end = options.get('end', timezone.now())
+            series = vote_rate_series(election.id, start, end, options['resolution'], options['group_by'])
+            names = {}
+            if options['group_by'] == GROUP_AREA:
+                names = {area_id: area.name for area_id, area in get_reference_data().areas.items()}
+            elif options['group_by'] == GROUP_PARTY:
+                names = {party_id: party.name for party_id, party in get_reference_data().parties.items()}
+            api_result = [{'id': key, 'name': names.get(key, 'Total'),
+                           'points': [{'time': time, 'count': count} for time, count in points]}
+                          for key, points in series.items()]
+            return Response({'detail': 'Get election vote rate successfully', 'resolution': options['resolution'],
+                             'group_by': options['group_by'], 'start': start, 'end': end,
+                             'result': serializers.VoteRateSeriesSerializer(api_result, many=True).data},
+                            status=status.HTTP_200_OK)
+        else:
+            return Response({'detail': 'Get election vote rate failed',
+                             'errors': {'detail': 'You do not have permission to perform this action.'}},
+                            status=status.HTTP_401_UNAUTHORIZED)
+
+
+class MetricsView(views.APIView):
+    permission_classes = [permissions.AllowAny]
+
+    @swagger_auto_schema(responses={
+        200: serializers.MetricsSerializer,
+        401: serializers.ErrorSerializer(detail='You do not have permission to perform this action.')
+    })
+    def get(self, request):
+        """
+        Get the performance metrics.
+
+        Get the page cache hit rate and the render time it saved, and the load of the endpoints under admission control
+        (requests running and waiting, admitted, rejected when busy and rate limited) in the process that handles the
+        request.
+        This action is only allowed for staff user.
+        """
+        if request.user.is_authenticated and (request.user.is_superuser or request.user.is_staff):
+            counters = metrics.snapshot('pagecache.')
+            hits = int(counters.get('pagecache.hits', 0))
+            misses = int(counters.get('pagecache.misses', 0))
+            page_cache = {
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+                'render_seconds': counters.get('pagecache.render_seconds', 0.0),
+                'render_seconds_saved': counters.get('pagecache.render_seconds_saved', 0.0),
+            }
+            admission = []
+            for endpoint in settings.ADMISSION_CONTROL:
+                counters = metrics.snapshot(f'admission.{endpoint}.')
+                admission.append({'endpoint': endpoint, **{
+                    name: counters.get(f'admission.{endpoint}.{name}', 0)
+                    for name in ('in_flight', 'queued', 'admitted', 'rejected', 'rate_limited', 'wait_seconds')
+                }})
+            return Response({'detail': 'Get metrics successfully',
+                             'page_cache': serializers.PageCacheMetricsSerializer(page_cache).data,
+                             'admission': serializers.AdmissionMetricsSerializer(admission, many=True).data},
+                            status=status.HTTP_200_OK)
+        else:
+            return Response({'detail': 'Get metrics failed',
+                             'errors': {'detail': 'You do not have permission to perform this action.'}},
+                            status=status.HTTP_401_UNAUTHORIZED)
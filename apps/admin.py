@@ -13,6 +13,10 @@ admin.site.register(VoteCheck)
 admin.site.register(VoteResultParty)
 admin.site.register(VoteResultCandidate)
 admin.site.register(NewParty)
+admin.site.register(IdempotencyKey)
+admin.site.register(AreaTurnout)
+admin.site.register(AreaVoteRateBucket)
+admin.site.register(PartyVoteRateBucket)
 
 
 # Add candidate list who is in area admin page
@@ -0,0 +1,250 @@
+"""
+Seat allocation for the party list, vectorized with NumPy.
+
+The votes of an election are loaded once into a ``VoteMatrix``: the national party-list votes of every party and the
+constituency votes of every party in every area. The allocation functions work on the last axis of their input, so
+the same code allocates the seats of one election or of a whole batch of simulated scenarios at once.
+
+NumPy is imported by the functions that use it, not by this module, because the API serializers and views import it
+with the URLs and NumPy takes about as long to import as the rest of them.
+"""
+from __future__ import annotations
+
+from django.db.models import Sum
+
+from apps.models import NewArea, NewParty, VoteResultCandidate, VoteResultParty
+
+LARGEST_REMAINDER = 'largest_remainder'
+DHONDT = 'dhondt'
+SAINTE_LAGUE = 'sainte_lague'
+
+ALLOCATION_METHODS = (LARGEST_REMAINDER, DHONDT, SAINTE_LAGUE)
+
+
+class VoteMatrix:
+    """
+    The votes of an election as arrays.
+
+    ``party_votes[p]`` is the party-list votes of ``party_ids[p]`` and ``area_votes[p, a]`` the votes of the candidate
+    of ``party_ids[p]`` in ``area_ids[a]``. Candidates without a party are summed in an extra last row of
+    ``area_votes``: they can win an area, but no party gets that seat.
+    """
+
+    def __init__(self, party_ids: list, area_ids: list, party_votes: np.ndarray, area_votes: np.ndarray):
+        self.party_ids = party_ids
+        self.area_ids = area_ids
+        self.party_votes = party_votes
+        self.area_votes = area_votes
+
+    @classmethod
+    def from_election(cls, election_id: int) -> 'VoteMatrix':
+        """
+        Load the votes of an election in four queries.
+        """
+        import numpy as np
+
+        party_ids = list(NewParty.objects.order_by('id').values_list('id', flat=True))
+        area_ids = list(NewArea.objects.order_by('id').values_list('id', flat=True))
+        party_index = {party_id: index for index, party_id in enumerate(party_ids)}
+        area_index = {area_id: index for index, area_id in enumerate(area_ids)}
+        party_votes = np.zeros(len(party_ids), dtype=np.int64)
+        for party_id, vote in VoteResultParty.objects.filter(election_id=election_id).values_list('party_id', 'vote'):
+            party_votes[party_index[party_id]] += vote
+        area_votes = np.zeros((len(party_ids) + 1, len(area_ids)), dtype=np.int64)
+        rows = VoteResultCandidate.objects.filter(election_id=election_id, candidate__area__isnull=False) \
+            .values_list('candidate__party_id', 'candidate__area_id').annotate(vote=Sum('vote'))
+        for party_id, area_id, vote in rows:
+            # Candidates without a party go in the last row.
+            area_votes[party_index.get(party_id, len(party_ids)), area_index[area_id]] += vote
+        return cls(party_ids, area_ids, party_votes, area_votes)
+
+
+def largest_remainder(votes: np.ndarray, seats: int) -> np.ndarray:
+    """
+    Allocate seats with the largest remainder method (Hare quota).
+
+    Every party gets the integer part of its quota first, and the seats left go to the largest fractional parts.
+
+    :param votes: The votes of every party, on the last axis.
+    :param seats: Number of seats to allocate.
+    :return: The seats of every party, with the same shape as ``votes``.
+    :rtype: np.ndarray
+    """
+    import numpy as np
+
+    votes = np.asarray(votes, dtype=np.float64)
+    total = votes.sum(axis=-1, keepdims=True)
+    quotas = np.divide(votes * seats, total, out=np.zeros_like(votes), where=total > 0)
+    allocated = np.floor(quotas)
+    left = seats - allocated.sum(axis=-1, keepdims=True)
+    # Rank of every remainder from the largest, ties go to the party with more votes.
+    order = np.lexsort((-votes, -(quotas - allocated)), axis=-1)
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(votes.shape[-1]), axis=-1)
+    allocated += (ranks < left) & (total > 0)
+    return allocated.astype(np.int64)
+
+
+def highest_averages(votes: np.ndarray, seats: int, step: int) -> np.ndarray:
+    """
+    Allocate seats with a highest averages method, where the divisors of a party with ``s`` seats is ``step * s + 1``.
+
+    Giving the seats one by one to the largest quotient is too slow for a batch of scenarios. Every party first gets
+    one seat for each of its quotients above a threshold low enough that they all win a seat, which leaves at most one
+    seat per party to give one by one.
+    """
+    import numpy as np
+
+    votes = np.asarray(votes, dtype=np.float64)
+    parties = votes.shape[-1]
+    total = votes.sum(axis=-1, keepdims=True)
+    allocated = np.zeros(votes.shape, dtype=np.int64)
+    if seats <= 0 or parties == 0:
+        return allocated
+    # At most `seats` quotients are above this threshold.
+    quotients_above = step * (seats - parties) + parties
+    if quotients_above > 0:
+        threshold = total / quotients_above
+        ratio = np.divide(votes, threshold, out=np.zeros_like(votes), where=threshold > 0)
+        allocated = np.maximum(np.ceil((ratio - 1) / step), 0).astype(np.int64)
+    left = np.where(total[..., 0] > 0, seats - allocated.sum(axis=-1), 0)
+    while left.any():
+        quotients = votes / (step * allocated + 1)
+        winner = quotients.argmax(axis=-1)
+        np.put_along_axis(allocated, winner[..., None],
+                          np.take_along_axis(allocated, winner[..., None], axis=-1) + (left > 0)[..., None], axis=-1)
+        left = np.maximum(left - 1, 0)
+    return allocated
+
+
+def allocate(votes: np.ndarray, seats: int, method: str = LARGEST_REMAINDER) -> np.ndarray:
+    """
+    Allocate seats to parties proportionally to their votes.
+
+    :param votes: The votes of every party on the last axis, the other axes are independent scenarios.
+    :param seats: Number of seats to allocate.
+    :param method: One of ``ALLOCATION_METHODS``.
+    :return: The seats of every party, with the same shape as ``votes``.
+    :rtype: np.ndarray
+    """
+    if method == LARGEST_REMAINDER:
+        return largest_remainder(votes, seats)
+    if method == DHONDT:
+        return highest_averages(votes, seats, step=1)
+    if method == SAINTE_LAGUE:
+        return highest_averages(votes, seats, step=2)
+    raise ValueError(f'Unknown allocation method {method!r}')
+
+
+def constituency_wins(area_votes: np.ndarray, parties: int) -> np.ndarray:
+    """
+    Count the areas won by every party.
+
+    :param area_votes: Votes of shape (..., parties + 1, areas), the last party row is the candidates without party.
+    :param parties: Number of parties.
+    :return: The number of areas won by every party, of shape (..., parties).
+    :rtype: np.ndarray
+    """
+    import numpy as np
+
+    winners = area_votes.argmax(axis=-2)
+    # Nobody wins an area without votes.
+    winners = np.where(area_votes.max(axis=-2) > 0, winners, parties)
+    return (winners[..., None, :] == np.arange(parties)[:, None]).sum(axis=-1)
+
+
+def party_list_seats(party_votes: np.ndarray, won: np.ndarray, seats: int, method: str = LARGEST_REMAINDER) -> dict:
+    """
+    Calculate the seats of every party from its party-list votes and the number of areas it won.
+
+    Every party is entitled to a share of all ``seats`` proportional to its party-list votes, and gets as many
+    party-list seats as its entitlement minus the areas it won.
+
+    :return: A dictionary with the ``quotas`` (unrounded entitlement), ``entitled``, ``won`` (areas) and ``list_seats``
+             arrays, in the order of ``party_votes``.
+    :rtype: dict
+    """
+    import numpy as np
+
+    party_votes = np.asarray(party_votes)
+    won = np.asarray(won, dtype=np.int64)
+    total = party_votes.sum()
+    quotas = party_votes * seats / total if total else np.zeros(len(party_votes))
+    entitled = allocate(party_votes, seats, method)
+    return {
+        'quotas': quotas,
+        'entitled': entitled,
+        'won': won,
+        'list_seats': np.maximum(entitled - won, 0),
+    }
+
+
+def party_list_result(matrix: VoteMatrix, seats: int, method: str = LARGEST_REMAINDER) -> dict:
+    """
+    Calculate the seats of every party in an election, see ``party_list_seats``.
+    """
+    return party_list_seats(matrix.party_votes, constituency_wins(matrix.area_votes, len(matrix.party_ids)), seats,
+                            method)
+
+
+def simulate(matrix: VoteMatrix, scenarios: int, seats: int, method: str = LARGEST_REMAINDER, swing: float = 0.1,
+             seed: int = None, batch_size: int = 1000) -> dict:
+    """
+    Run a Monte Carlo simulation of vote swings.
+
+    Every scenario draws a national swing for every party, normal in log space with a standard deviation of
+    ``swing``, that scales its party-list votes and its votes in every area. On top of it the votes of every party in
+    every area get a local swing of the same standard deviation (uniform in log space, it is much cheaper to draw and
+    only decides who wins the area). The seats of every scenario are then allocated like ``party_list_result``.
+
+    :param matrix: The votes the scenarios start from.
+    :param scenarios: Number of scenarios.
+    :param seats: Total number of seats.
+    :param method: One of ``ALLOCATION_METHODS``.
+    :param swing: Standard deviation of the log of the swing factors.
+    :param seed: Seed of the random generator, for reproducible runs.
+    :param batch_size: Scenarios computed at once.
+    :return: A dictionary of arrays in the order of ``matrix.party_ids``: the ``mean``, ``std``, ``p5``, ``p95``,
+             ``min`` and ``max`` of the total seats, the ``mean_won`` areas and the ``majority`` probability.
+    :rtype: dict
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    parties = len(matrix.party_ids)
+    areas = len(matrix.area_ids)
+    # Areas by parties, so the winner of an area is an argmax over contiguous memory.
+    with np.errstate(divide='ignore'):
+        log_votes = np.log(matrix.area_votes.T.astype(np.float32))
+    contested = matrix.area_votes.max(axis=0) > 0
+    # A uniform variable on [-half_width, half_width] has a standard deviation of swing.
+    half_width = np.float32(swing * np.sqrt(3))
+    totals = np.empty((scenarios, parties), dtype=np.int64)
+    won = np.empty((scenarios, parties), dtype=np.int64)
+    for start in range(0, scenarios, batch_size):
+        size = min(batch_size, scenarios - start)
+        national = rng.normal(0.0, swing, size=(size, parties)).astype(np.float32)
+        scores = rng.random(size=(size, areas, parties + 1), dtype=np.float32)
+        scores *= 2 * half_width
+        scores -= half_width
+        scores += log_votes
+        # Candidates without a party have no national swing.
+        scores[:, :, :parties] += national[:, None, :]
+        winners = scores.argmax(axis=-1)
+        winners[:, ~contested] = parties
+        # Count the areas of every party of every scenario in one bincount, the no party column is dropped.
+        offsets = winners + np.arange(size)[:, None] * (parties + 1)
+        batch_won = np.bincount(offsets.ravel(), minlength=size * (parties + 1)).reshape(size, parties + 1)[:, :parties]
+        entitled = allocate(matrix.party_votes * np.exp(national), seats, method)
+        totals[start:start + size] = np.maximum(entitled, batch_won)
+        won[start:start + size] = batch_won
+    return {
+        'mean': totals.mean(axis=0),
+        'std': totals.std(axis=0),
+        'p5': np.percentile(totals, 5, axis=0),
+        'p95': np.percentile(totals, 95, axis=0),
+        'min': totals.min(axis=0),
+        'max': totals.max(axis=0),
+        'mean_won': won.mean(axis=0),
+        'majority': (totals > seats // 2).mean(axis=0),
+    }
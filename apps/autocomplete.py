@@ -0,0 +1,42 @@
+"""
+The searches of the ``autocomplete`` view, by source name.
+
+Every source returns the rows whose text starts with a query, matched on indexed columns so a prefix is an index range
+scan, and the view pages them by id with ``apps.utils.keyset_page``. The options are labeled with ``str()``, like the
+options of a ``ModelChoiceField``.
+"""
+from django.db.models import Q
+
+from apps.models import NewArea, NewCandidate
+from apps.utils import search_users
+
+AUTOCOMPLETE_PAGE_SIZE = 20
+
+
+def search_citizens(query: str):
+    """
+    Citizens who can be candidates.
+    """
+    return search_users(query).filter(newprofile__blacklist=False)
+
+
+def search_unaffiliated_candidates(query: str):
+    """
+    Candidates who are not in a party yet, by their username or names.
+    """
+    candidates = NewCandidate.objects.filter(party=None).select_related('user', 'area')
+    if query:
+        candidates = candidates.filter(Q(user__username__startswith=query) | Q(user__first_name__startswith=query) |
+                                       Q(user__last_name__startswith=query))
+    return candidates
+
+
+def search_areas(query: str):
+    return NewArea.objects.filter(name__startswith=query) if query else NewArea.objects.all()
+
+
+AUTOCOMPLETE_SOURCES = {
+    'citizen': search_citizens,
+    'unaffiliated_candidate': search_unaffiliated_candidates,
+    'area': search_areas,
+}
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+# Backends whose entries are only seen by the process that wrote them.
+PROCESS_LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Warn when the default cache is not shared by the processes of the site, see ``CACHES`` in the settings.
+    """
+    if settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHE_BACKENDS:
+        return []
+    return [Warning(
+        'The default cache is local to each process.',
+        hint='Set CACHE_BACKEND and CACHE_LOCATION to a Redis or Memcached server, or the cached pages, the '
+             'reference data and the single-flight locks of a worker ignore the changes made in the others.',
+        id='apps.W001',
+    )]
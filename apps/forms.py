@@ -3,6 +3,8 @@ from django.contrib.auth.models import User
 
 from apps.models import LegacyCandidate, LegacyVote, NewArea, NewCandidate, \
     NewElection, NewParty
+from apps.reference import get_reference_data
+from apps.widgets import AutocompleteSelect
 
 
 class AreaForm(forms.ModelForm):
@@ -20,7 +22,7 @@ class AreaForm(forms.ModelForm):
 
 class CandidateForm(forms.ModelForm):
     user = forms.ModelChoiceField(queryset=User.objects.filter(newprofile__blacklist=False).order_by('id'),
-                                  label="Citizen", widget=forms.Select(
+                                  label="Citizen", widget=AutocompleteSelect('citizen',
         attrs={'class': 'form-control'}), help_text="The citizen that will be the candidate.")
     image = forms.ImageField(label="Candidate Image", required=False, widget=forms.FileInput(
         attrs={'class': 'form-control-file', 'placeholder': 'Candidate Image'}),
@@ -28,8 +30,8 @@ class CandidateForm(forms.ModelForm):
     description = forms.CharField(label="Candidate Description", widget=forms.Textarea(
         attrs={'class': 'form-control', 'rows': 3, 'placeholder': 'Candidate Description'}),
         help_text="Short description of the candidate.")
-    area = forms.ModelChoiceField(label="Area", queryset=NewArea.objects.all().order_by('id'), widget=forms.Select(
-        attrs={'class': 'form-control'}),
+    area = forms.ModelChoiceField(label="Area", queryset=NewArea.objects.all().order_by('id'),
+                                  widget=AutocompleteSelect('area', attrs={'class': 'form-control'}),
                                   help_text="The area that the candidate is running for.")
 
     class Meta:
@@ -82,24 +84,37 @@ class EditElectionForm(forms.ModelForm):
 
 
 class CandidateVoteForm(forms.Form):
-    candidate = forms.ModelChoiceField(label="Candidate", queryset=NewCandidate.objects.all(), widget=forms.Select(
+    """
+    The candidate of a vote, the choices are the candidates of the area from the reference data (see
+    ``apps.reference``), and the cleaned candidate is its id.
+    """
+    candidate = forms.TypedChoiceField(label="Candidate", coerce=int, widget=forms.Select(
         attrs={'class': 'form-control'}),
                                        help_text="The candidate that you want to vote for.")
 
     def __init__(self, *args, **kwargs):
         area = kwargs.pop('area')
         super(CandidateVoteForm, self).__init__(*args, **kwargs)
-        self.fields['candidate'].queryset = NewCandidate.objects.filter(area=area)
+        self.fields['candidate'].choices = [('', '---------')] + [
+            (candidate.id, str(candidate)) for candidate in get_reference_data().candidates_in_area(area.id)]
 
     class Meta:
         fields = ['candidate']
 
 
 class PartyVoteForm(forms.Form):
-    party = forms.ModelChoiceField(label="Party", queryset=NewParty.objects.all(), widget=forms.Select(
+    """
+    The party of a vote, the choices are the parties from the reference data, and the cleaned party is its id.
+    """
+    party = forms.TypedChoiceField(label="Party", coerce=int, widget=forms.Select(
         attrs={'class': 'form-control'}),
         help_text="The party that you want to vote for.")
 
+    def __init__(self, *args, **kwargs):
+        super(PartyVoteForm, self).__init__(*args, **kwargs)
+        self.fields['party'].choices = [('', '---------')] + [
+            (party.id, str(party)) for party in get_reference_data().parties.values()]
+
     class Meta:
         fields = ['party']
 
@@ -124,8 +139,9 @@ class PartyForm(forms.ModelForm):
 
 
 class AddCandidateToPartyForm(forms.Form):
-    candidate = forms.ModelChoiceField(label="Candidate", queryset=NewCandidate.objects.filter(party=None), widget=forms.Select(
-        attrs={'class': 'form-control'}),
+    candidate = forms.ModelChoiceField(label="Candidate", queryset=NewCandidate.objects.filter(party=None),
+                                       widget=AutocompleteSelect('unaffiliated_candidate',
+                                                                 attrs={'class': 'form-control'}),
         help_text="The candidate that you want to add to the party.")
 
     class Meta:
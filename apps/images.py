@@ -0,0 +1,196 @@
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Name of the variant -> (width, height, crop). Avatars are shown as 50px circles so they are cropped to a square
+# twice that size, covers are only scaled down to fit.
+VARIANTS = {
+    'avatar': (100, 100, True),
+    'medium': (400, 400, True),
+    'cover': (1280, 720, False),
+}
+
+DERIVATIVE_DIRECTORY = 'derivatives'
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = set()
+_pending_lock = threading.Lock()
+# (file name, size, modified time) -> content hash, so the file is only read again when it changes.
+_content_hashes = {}
+# Paths of the derivatives that are known to exist on disk.
+_generated = set()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.IMAGE_DERIVATIVE_WORKERS,
+                                           thread_name_prefix='image-derivative')
+        return _executor
+
+
+def _content_hash(image) -> str | None:
+    """
+    Return the content hash of an image file, or None if the file cannot be read.
+    """
+    try:
+        path = image.path
+        stat = os.stat(path)
+    except (NotImplementedError, ValueError, OSError):
+        return None
+    key = (image.name, stat.st_size, stat.st_mtime_ns)
+    content_hash = _content_hashes.get(key)
+    if content_hash is None:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as image_file:
+            for chunk in iter(lambda: image_file.read(64 * 1024), b''):
+                digest.update(chunk)
+        content_hash = digest.hexdigest()[:32]
+        _content_hashes[key] = content_hash
+    return content_hash
+
+
+def _derivative_name(content_hash: str, variant: str, extension: str) -> str:
+    return f'{DERIVATIVE_DIRECTORY}/{content_hash[:2]}/{content_hash}-{variant}.{extension}'
+
+
+def _original_extension(image) -> str:
+    extension = os.path.splitext(image.name)[1].lower().lstrip('.')
+    return 'jpg' if extension in ('jpg', 'jpeg') else 'png'
+
+
+def _variant_name(image, variant: str, webp: bool) -> str | None:
+    content_hash = _content_hash(image) if image else None
+    if content_hash is None:
+        return None
+    return _derivative_name(content_hash, variant, 'webp' if webp else _original_extension(image))
+
+
+def _exists(name: str) -> bool:
+    path = default_storage.path(name)
+    if path in _generated:
+        return True
+    if os.path.exists(path):
+        _generated.add(path)
+        return True
+    return False
+
+
+def generate_variants(image):
+    """
+    Generate every variant of an image in its original format (JPEG or PNG) and in WebP.
+
+    Variants that already exist on disk are skipped, since they are keyed by the content hash of the original.
+
+    :param image: The ImageField file to generate the variants for.
+    """
+    content_hash = _content_hash(image)
+    if content_hash is None:
+        return
+    extension = _original_extension(image)
+    targets = []
+    for variant in VARIANTS:
+        for target_extension in (extension, 'webp'):
+            name = _derivative_name(content_hash, variant, target_extension)
+            if not _exists(name):
+                targets.append((variant, target_extension, name))
+    if not targets:
+        return
+    with Image.open(image.path) as original:
+        original = ImageOps.exif_transpose(original)
+        for variant, target_extension, name in targets:
+            width, height, crop = VARIANTS[variant]
+            if crop:
+                resized = ImageOps.fit(original, (width, height), Image.LANCZOS)
+            else:
+                resized = original.copy()
+                resized.thumbnail((width, height), Image.LANCZOS)
+            if target_extension == 'jpg':
+                resized = resized.convert('RGB')
+                save_options = {'format': 'JPEG', 'quality': 85, 'optimize': True}
+            elif target_extension == 'webp':
+                resized = resized.convert('RGBA' if resized.mode in ('RGBA', 'LA', 'P') else 'RGB')
+                save_options = {'format': 'WEBP', 'quality': 80, 'method': 4}
+            else:
+                resized = resized.convert('RGBA' if resized.mode in ('RGBA', 'LA', 'P') else 'RGB')
+                save_options = {'format': 'PNG', 'optimize': True}
+            path = default_storage.path(name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temporary file first so a half written variant is never served.
+            temporary_path = f'{path}.{threading.get_ident()}.tmp'
+            resized.save(temporary_path, **save_options)
+            os.replace(temporary_path, path)
+            _generated.add(path)
+
+
+def _generate_in_background(image):
+    try:
+        generate_variants(image)
+    except Exception:
+        logger.exception('Cannot generate image variants for %s', image.name)
+    finally:
+        with _pending_lock:
+            _pending.discard(image.name)
+
+
+def schedule_variants(image):
+    """
+    Generate the variants of an image in the worker pool, unless it is already being generated.
+    """
+    if not image:
+        return
+    with _pending_lock:
+        if image.name in _pending:
+            return
+        _pending.add(image.name)
+    _get_executor().submit(_generate_in_background, image)
+
+
+def variant_url(image, variant: str, webp: bool = False) -> str:
+    """
+    Return the URL of an image variant.
+
+    The variants are generated lazily, if the variant does not exist yet its generation is scheduled in the worker
+    pool and the URL of the original image is returned in the meantime.
+
+    :param image: The ImageField file.
+    :param variant: The name of the variant in VARIANTS.
+    :param webp: Return the WebP variant instead of the one in the original format.
+    :return: The URL of the variant, or of the original image when it is not ready.
+    :rtype: str
+    """
+    if not image:
+        return ''
+    name = _variant_name(image, variant, webp)
+    if name is None:
+        return image.url
+    if _exists(name):
+        return default_storage.url(name)
+    schedule_variants(image)
+    return image.url
+
+
+def variant_ready(image, variant: str, webp: bool = False) -> bool:
+    """
+    Return True if the variant of an image has been generated.
+    """
+    name = _variant_name(image, variant, webp)
+    return name is not None and _exists(name)
+
+
+def variant_pending(image, variant: str, webp: bool = False) -> bool:
+    """
+    Return True if the variant of an image is not generated yet but can be, so its URL will change.
+    """
+    name = _variant_name(image, variant, webp)
+    return name is not None and not _exists(name)
@@ -0,0 +1,108 @@
+"""
+Measure what a fresh process pays to start, for the ``benchmarkimports`` command.
+
+Every measurement runs in a new interpreter with ``-X importtime``, which reports the time spent importing every
+module: ``django.setup`` (the settings, the apps and their models and admin modules, what every ``manage.py`` command
+and worker pays) and then the module of a target (the URLs for example, what the first request pays).
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import namedtuple
+
+from django.conf import settings
+
+SETUP = 'django.setup'
+
+# Written by the measured process between the imports of django.setup and of the target.
+MARKER = '--- target ---'
+
+ModuleImport = namedtuple('ModuleImport', ['name', 'depth', 'self_us', 'cumulative_us'])
+
+ImportMeasurement = namedtuple('ImportMeasurement', ['target', 'milliseconds', 'modules'])
+
+_SCRIPT = '''
+import importlib, json, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter() - started
+sys.stderr.write({marker!r} + '\\n')
+sys.stderr.flush()
+started = time.perf_counter()
+if {target!r} != {setup!r}:
+    importlib.import_module({target!r})
+print(json.dumps({{'setup': setup, 'target': time.perf_counter() - started}}))
+'''
+
+
+def parse_importtime(output: str) -> list:
+    """
+    Parse the report of ``-X importtime``.
+
+    :return: A list of ``ModuleImport``, in the order the imports finished, a module imported by another one is
+             listed before it with a greater depth.
+    :rtype: list
+    """
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or line.endswith('| imported package'):
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        stripped = name.lstrip(' ')
+        modules.append(ModuleImport(stripped, (len(name) - len(stripped) - 1) // 2, int(self_us), int(cumulative_us)))
+    return modules
+
+
+def measure_import(target: str) -> ImportMeasurement:
+    """
+    Import a module in a new process after ``django.setup``, or only run ``django.setup`` with ``SETUP``.
+
+    :return: The time the target took in milliseconds, and the modules it imported.
+    :rtype: ImportMeasurement
+    """
+    environment = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'ayaka.settings'))
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', _SCRIPT.format(marker=MARKER, target=target, setup=SETUP)],
+        cwd=settings.BASE_DIR, env=environment, capture_output=True, text=True)
+    if process.returncode:
+        error = '\n'.join(line for line in process.stderr.splitlines()
+                          if not line.startswith('import time:') and line != MARKER)
+        raise RuntimeError(f'Importing {target} failed:\n{error[-2000:]}')
+    setup_report, _, target_report = process.stderr.partition(MARKER)
+    seconds = json.loads(process.stdout.splitlines()[-1])
+    if target == SETUP:
+        return ImportMeasurement(target, seconds['setup'] * 1000, parse_importtime(setup_report))
+    return ImportMeasurement(target, seconds['target'] * 1000, parse_importtime(target_report))
+
+
+def benchmark_import(target: str, repeat: int = 5) -> ImportMeasurement:
+    """
+    Measure a target ``repeat`` times.
+
+    :return: The median time, and the modules of the run closest to it.
+    :rtype: ImportMeasurement
+    """
+    measurements = sorted((measure_import(target) for _ in range(repeat)),
+                          key=lambda measurement: measurement.milliseconds)
+    median = statistics.median(measurement.milliseconds for measurement in measurements)
+    return ImportMeasurement(target, median, measurements[len(measurements) // 2].modules)
+
+
+def top_imports(modules: list, limit: int = 10) -> list:
+    """
+    Return the costliest modules imported directly (depth 0) by a measurement, by cumulative time.
+
+    :rtype: list
+    """
+    roots = [module for module in modules if module.depth == 0]
+    return sorted(roots, key=lambda module: module.cumulative_us, reverse=True)[:limit]
+
+
+def budget_of(target: str) -> float | None:
+    """
+    Return the budget of a target in milliseconds from ``IMPORT_TIME_BUDGETS``, or None if it has none.
+    """
+    return settings.IMPORT_TIME_BUDGETS.get(target)
@@ -0,0 +1,251 @@
+"""
+In-process leaderboard of every election: the leading candidates of every area and the totals of every party.
+
+A leaderboard is built from the tally tables the first time an election is read, then every ballot recorded by this
+process updates it in O(1), so the area winners and party standings never need a sorted query. The votes recorded by
+the other processes (and any change made to the tally tables directly) are picked up by rebuilding the leaderboard
+every ``LEADERBOARD_RECONCILE_SECONDS``, until it has been rebuilt once after the election ended.
+"""
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.dispatch import Signal
+from django.utils import timezone
+
+from apps.models import NewCandidate, NewElection, VoteResultCandidate, VoteResultParty
+
+# Sent when the leading candidate of an area changes, with the election_id, area_id, previous and current
+# (candidate ids, None when nobody has a vote).
+leader_changed = Signal()
+
+_leaderboards = {}
+_leaderboards_lock = threading.Lock()
+
+
+class AreaStanding:
+    """
+    The votes of the candidates of an area, with its two leading candidates.
+
+    Votes only go up between two rebuilds, so a candidate can only enter the top two by passing the runner-up, and
+    keeping them up to date is O(1) per ballot. Ties go to the candidate with the smallest id.
+    """
+    __slots__ = ('votes', 'top')
+
+    def __init__(self):
+        self.votes = {}
+        self.top = []
+
+    def _rank(self, candidate_id: int):
+        return -self.votes[candidate_id], candidate_id
+
+    def sort(self):
+        self.top = sorted((candidate_id for candidate_id, vote in self.votes.items() if vote > 0),
+                          key=self._rank)[:2]
+
+    def add_vote(self, candidate_id: int):
+        self.votes[candidate_id] = self.votes.get(candidate_id, 0) + 1
+        if candidate_id not in self.top:
+            self.top.append(candidate_id)
+        self.top = sorted(self.top, key=self._rank)[:2]
+
+    @property
+    def leader(self):
+        return self.top[0] if self.top else None
+
+    @property
+    def runner_up(self):
+        return self.top[1] if len(self.top) > 1 else None
+
+
+class Leaderboard:
+    """
+    The standings of one election.
+    """
+
+    def __init__(self, election_id: int):
+        self.election_id = election_id
+        self.areas = defaultdict(AreaStanding)
+        # Candidate id to its (area id, party id).
+        self.candidates = {}
+        self.party_votes = defaultdict(int)
+        # Number of areas led by the candidates of every party.
+        self.party_wins = defaultdict(int)
+        self.built_at = None
+        # Number of ballots counted since the build, see tally_version.
+        self.version = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def build(cls, election_id: int) -> 'Leaderboard':
+        """
+        Build the leaderboard of an election from the tally tables in three queries.
+        """
+        leaderboard = cls(election_id)
+        # Taken before the queries, so a vote made while they run is picked up by the next rebuild.
+        leaderboard.built_at = timezone.now()
+        for candidate_id, area_id, party_id in NewCandidate.objects.filter(area__isnull=False) \
+                .values_list('id', 'area_id', 'party_id'):
+            leaderboard.candidates[candidate_id] = (area_id, party_id)
+            leaderboard.areas[area_id].votes[candidate_id] = 0
+        for candidate_id, vote in VoteResultCandidate.objects.filter(election_id=election_id) \
+                .values_list('candidate_id', 'vote'):
+            if candidate_id in leaderboard.candidates:
+                leaderboard.areas[leaderboard.candidates[candidate_id][0]].votes[candidate_id] += vote
+        for party_id, vote in VoteResultParty.objects.filter(election_id=election_id).values_list('party_id', 'vote'):
+            leaderboard.party_votes[party_id] += vote
+        for standing in leaderboard.areas.values():
+            standing.sort()
+            if standing.leader is not None:
+                party_id = leaderboard.candidates[standing.leader][1]
+                if party_id is not None:
+                    leaderboard.party_wins[party_id] += 1
+        return leaderboard
+
+    def record_vote(self, candidate_id: int, party_id: int):
+        """
+        Count a ballot.
+
+        :return: The (area id, previous leader, current leader) if the leader of the area changed, else None.
+        """
+        with self.lock:
+            self.version += 1
+            self.party_votes[party_id] += 1
+            if candidate_id not in self.candidates:
+                # A candidate added after the build, the next read rebuilds the leaderboard.
+                self.built_at = None
+                return None
+            area_id, _ = self.candidates[candidate_id]
+            standing = self.areas[area_id]
+            previous = standing.leader
+            standing.add_vote(candidate_id)
+            if standing.leader == previous:
+                return None
+            self._move_win(previous, standing.leader)
+            return area_id, previous, standing.leader
+
+    def _move_win(self, previous, current):
+        for candidate_id, change in ((previous, -1), (current, 1)):
+            if candidate_id is not None and self.candidates[candidate_id][1] is not None:
+                self.party_wins[self.candidates[candidate_id][1]] += change
+
+    def leader(self, area_id: int):
+        """
+        Return the id of the candidate leading an area, or None if nobody has a vote there.
+        """
+        return self.areas[area_id].leader if area_id in self.areas else None
+
+    def margin(self, area_id: int) -> int:
+        """
+        Return how many votes the leader of an area is ahead of the runner-up.
+        """
+        standing = self.areas.get(area_id)
+        if standing is None or standing.leader is None:
+            return 0
+        runner_up_votes = standing.votes[standing.runner_up] if standing.runner_up is not None else 0
+        return standing.votes[standing.leader] - runner_up_votes
+
+    @property
+    def tally_version(self) -> tuple:
+        """
+        The version of the tally, changed by every ballot and rebuild.
+        """
+        return self.built_at, self.version
+
+    def area_results(self, area_ids) -> tuple:
+        """
+        Return the winner, runner-up, margin and total votes of areas, one list (column) per value in the order of the
+        areas. The winner and runner-up of an area without votes are None.
+
+        :return: The tally version of the results, and a dictionary of column name to its list.
+        :rtype: tuple
+        """
+        columns = {name: [] for name in ('winner_ids', 'winner_votes', 'runner_up_ids', 'runner_up_votes', 'margins',
+                                         'total_votes')}
+        with self.lock:
+            for area_id in area_ids:
+                # Not self.areas[area_id], which would add the area to the leaderboard.
+                standing = self.areas.get(area_id)
+                leader = standing.leader if standing is not None else None
+                runner_up = standing.runner_up if standing is not None else None
+                columns['winner_ids'].append(leader)
+                columns['winner_votes'].append(standing.votes[leader] if leader is not None else 0)
+                columns['runner_up_ids'].append(runner_up)
+                columns['runner_up_votes'].append(standing.votes[runner_up] if runner_up is not None else 0)
+                columns['margins'].append(columns['winner_votes'][-1] - columns['runner_up_votes'][-1])
+                columns['total_votes'].append(sum(standing.votes.values()) if standing is not None else 0)
+            return self.tally_version, columns
+
+    def area_leaders(self) -> dict:
+        """
+        Return the leading candidate id of every area that has votes.
+        """
+        with self.lock:
+            return {area_id: standing.leader for area_id, standing in self.areas.items()
+                    if standing.leader is not None}
+
+    def is_stale(self, election: NewElection) -> bool:
+        if self.built_at is None:
+            return True
+        if self.built_at > election.end_date:
+            # Rebuilt after the election ended, nothing can change anymore.
+            return False
+        return (timezone.now() - self.built_at).total_seconds() > settings.LEADERBOARD_RECONCILE_SECONDS
+
+
+def send_leader_changed(election_id: int, changes: list):
+    for area_id, previous, current in changes:
+        leader_changed.send(sender=Leaderboard, election_id=election_id, area_id=area_id, previous=previous,
+                            current=current)
+
+
+def reconcile(election_id: int) -> Leaderboard:
+    """
+    Rebuild the leaderboard of an election from the tally tables, and send ``leader_changed`` for every area whose
+    leader is not the one this process knew.
+    """
+    leaderboard = Leaderboard.build(election_id)
+    with _leaderboards_lock:
+        previous = _leaderboards.get(election_id)
+        _leaderboards[election_id] = leaderboard
+    if previous is not None:
+        known = previous.area_leaders()
+        current = leaderboard.area_leaders()
+        send_leader_changed(election_id, [(area_id, known.get(area_id), current.get(area_id))
+                                          for area_id in sorted(known.keys() | current.keys())
+                                          if known.get(area_id) != current.get(area_id)])
+    return leaderboard
+
+
+def get_leaderboard(election: NewElection) -> Leaderboard:
+    """
+    Return the leaderboard of an election, building or reconciling it when it is missing or stale.
+    """
+    leaderboard = _leaderboards.get(election.id)
+    if leaderboard is None or leaderboard.is_stale(election):
+        leaderboard = reconcile(election.id)
+    return leaderboard
+
+
+def record_vote(election_id: int, candidate_id: int, party_id: int):
+    """
+    Count a ballot in the leaderboard of its election, if this process has built it.
+
+    Call it once the vote is committed, the leaderboard is not rolled back with a transaction.
+    """
+    leaderboard = _leaderboards.get(election_id)
+    if leaderboard is None:
+        # Built from the tally tables, with this vote, the first time it is read.
+        return
+    change = leaderboard.record_vote(candidate_id, party_id)
+    if change is not None:
+        send_leader_changed(election_id, [change])
+
+
+def clear_leaderboards():
+    """
+    Forget every leaderboard of this process.
+    """
+    with _leaderboards_lock:
+        _leaderboards.clear()
@@ -0,0 +1,46 @@
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from apps.allocation import ALLOCATION_METHODS, VoteMatrix, simulate
+
+
+def random_matrix(parties: int, areas: int, seed: int = 0) -> VoteMatrix:
+    """
+    Build the votes of a made up election, with a few big parties and many small ones.
+    """
+    rng = np.random.default_rng(seed)
+    popularity = rng.dirichlet(np.full(parties, 0.5))
+    area_votes = rng.poisson(popularity[:, None] * rng.uniform(0.5, 1.5, (parties, areas)) * 50000)
+    # No candidates without a party.
+    area_votes = np.vstack([area_votes, np.zeros((1, areas), dtype=area_votes.dtype)])
+    party_votes = rng.poisson(popularity * areas * 50000)
+    return VoteMatrix(list(range(1, parties + 1)), list(range(1, areas + 1)), party_votes, area_votes)
+
+
+class Command(BaseCommand):
+    help = 'Measure how many seat allocation scenarios the simulator runs per second'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--election', type=int, help='Simulate this election instead of a made up one')
+        parser.add_argument('--parties', type=int, default=20, help='Parties of the made up election (default: %(default)s)')
+        parser.add_argument('--areas', type=int, default=400, help='Areas of the made up election (default: %(default)s)')
+        parser.add_argument('--scenarios', type=int, default=10000, help='Scenarios per method (default: %(default)s)')
+        parser.add_argument('--seats', type=int, default=settings.ELECTION_TOTAL_SEATS,
+                            help='Total number of seats (default: %(default)s)')
+
+    def handle(self, *args, **options):
+        if options['election']:
+            matrix = VoteMatrix.from_election(options['election'])
+        else:
+            matrix = random_matrix(options['parties'], options['areas'])
+        self.stdout.write(f'{len(matrix.party_ids)} parties, {len(matrix.area_ids)} areas, {options["seats"]} seats')
+        for method in ALLOCATION_METHODS:
+            started = time.perf_counter()
+            simulate(matrix, options['scenarios'], options['seats'], method, seed=0)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(self.style.SUCCESS(
+                f'{method}: {options["scenarios"]} scenarios in {elapsed:.2f} s '
+                f'({options["scenarios"] / elapsed:,.0f} scenarios/s)'))
@@ -0,0 +1,131 @@
+import asyncio
+import base64
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.contrib.auth.models import User
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.management import BaseCommand
+from django.db import close_old_connections
+from django.test import AsyncRequestFactory, RequestFactory, override_settings
+
+from apis import async_views
+from apis.views import LoginView
+
+# Far away from the 13 digit citizen IDs, so the benchmark never touches a real user.
+FIRST_USERNAME = 9900000000000
+
+
+def make_cvv_service(latency: float):
+    """
+    Start a local stand-in for the CVV service that answers every request after some latency.
+
+    :return: The server, already serving in a daemon thread.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            time.sleep(latency)
+            body = json.dumps({'detail': True}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+        # Every async login connects at once.
+        request_queue_size = 1024
+
+    server = Server(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def basic_auth(username: str) -> str:
+    return 'Basic ' + base64.b64encode(f'{username}:000'.encode()).decode()
+
+
+def add_session(request):
+    SessionMiddleware(lambda request: None).process_request(request)
+    return request
+
+
+class Command(BaseCommand):
+    help = 'Compare the throughput of the sync and async login views against a slow CVV service'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Logins per run (default: %(default)s)')
+        parser.add_argument('--latency', type=float, default=0.2,
+                            help='Seconds the CVV service takes to answer (default: %(default)s)')
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Threads serving the sync view, like a threaded WSGI worker (default: %(default)s)')
+
+    def handle(self, *args, **options):
+        total = options['requests']
+        usernames = [str(FIRST_USERNAME + number) for number in range(total * 2)]
+        User.objects.bulk_create([User(username=username) for username in usernames], ignore_conflicts=True)
+        server = make_cvv_service(options['latency'])
+        url = f'http://127.0.0.1:{server.server_address[1]}/'
+        try:
+            with override_settings(CVV_SERVICE_URL=url):
+                self.report('sync', self.run_sync(usernames[:total], options['workers']))
+                self.report('async', self.run_async(usernames[total:]))
+        finally:
+            server.shutdown()
+            User.objects.filter(username__in=usernames).delete()
+
+    def run_sync(self, usernames: list, workers: int):
+        factory = RequestFactory()
+        view = LoginView.as_view()
+
+        def login(username):
+            started = time.perf_counter()
+            try:
+                request = add_session(factory.post('/api/auth/login/', HTTP_AUTHORIZATION=basic_auth(username)))
+                status_code = view(request).status_code
+            finally:
+                close_old_connections()
+            return status_code, time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(login, usernames))
+        return results, time.perf_counter() - started
+
+    def run_async(self, usernames: list):
+        factory = AsyncRequestFactory()
+
+        async def login(username):
+            started = time.perf_counter()
+            request = add_session(factory.post('/api/auth/login/', headers={'Authorization': basic_auth(username)}))
+            response = await async_views.login_view(request)
+            return response.status_code, time.perf_counter() - started
+
+        async def run():
+            try:
+                return await asyncio.gather(*(login(username) for username in usernames))
+            finally:
+                await async_views.get_http_client().aclose()
+
+        started = time.perf_counter()
+        results = asyncio.run(run())
+        return results, time.perf_counter() - started
+
+    def report(self, name: str, run):
+        results, elapsed = run
+        latencies = sorted(latency for _, latency in results)
+        failed = sum(1 for status_code, _ in results if status_code != 200)
+        self.stdout.write(self.style.SUCCESS(
+            f'{name}: {len(results) / elapsed:.1f} logins/s, '
+            f'median {statistics.median(latencies) * 1000:.0f} ms, '
+            f'p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.0f} ms, '
+            f'{failed} failed'))
@@ -0,0 +1,39 @@
+from django.core.management import BaseCommand, CommandError
+from django.conf import settings
+
+from apps.importtime import SETUP, benchmark_import, budget_of, top_imports
+
+
+class Command(BaseCommand):
+    help = 'Measure the import time of django.setup and of modules in fresh processes, and check them against ' \
+           'IMPORT_TIME_BUDGETS'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', action='append',
+                            help=f'{SETUP} or a module to import after it, can be repeated '
+                                 f'(default: the targets of IMPORT_TIME_BUDGETS)')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per target (default: %(default)s)')
+        parser.add_argument('--top', type=int, default=10,
+                            help='Costliest imports listed per target (default: %(default)s)')
+
+    def handle(self, *args, **options):
+        over_budget = []
+        for target in options['target'] or list(settings.IMPORT_TIME_BUDGETS):
+            try:
+                measurement = benchmark_import(target, options['repeat'])
+            except RuntimeError as e:
+                raise CommandError(str(e))
+            budget = budget_of(target)
+            line = f'{target}: {measurement.milliseconds:.1f} ms'
+            if budget is None:
+                self.stdout.write(line)
+            elif measurement.milliseconds > budget:
+                over_budget.append(target)
+                self.stdout.write(self.style.ERROR(f'{line} (over the budget of {budget} ms)'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'{line} (budget {budget} ms)'))
+            for module in top_imports(measurement.modules, options['top']):
+                self.stdout.write(f'  {module.cumulative_us / 1000:8.1f} ms  {module.name}')
+        if over_budget:
+            raise CommandError(f'Over the import time budget: {", ".join(over_budget)}')
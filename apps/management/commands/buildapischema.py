@@ -0,0 +1,13 @@
+from django.core.management import BaseCommand
+
+from apis.schema import FORMATS, artifact_path, build_schema, code_version
+
+
+class Command(BaseCommand):
+    help = 'Generate the OpenAPI schema of the running code into API_SCHEMA_ROOT'
+
+    def handle(self, *args, **options):
+        build_schema()
+        for format in FORMATS:
+            self.stdout.write(self.style.SUCCESS(f'Wrote {artifact_path(format)}'))
+        self.stdout.write(self.style.SUCCESS(f'API schema of code version {code_version()} is ready'))
@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.utils import timezone
+
+from apps.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = 'Delete the idempotency keys of votes that are older than IDEMPOTENCY_KEY_TTL'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000,
+                            help='Keys deleted per query, to keep each transaction short (default: %(default)s)')
+
+    def handle(self, *args, **options):
+        expired = IdempotencyKey.objects.filter(
+            created_at__lt=timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL))
+        deleted = 0
+        while True:
+            ids = list(expired.values_list('id', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            deleted += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired idempotency keys'))
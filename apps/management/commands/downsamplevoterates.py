@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.utils import timezone
+
+from apps.voterate import downsample
+
+
+class Command(BaseCommand):
+    help = 'Fold the quarter hour vote rate buckets older than VOTE_RATE_QUARTER_RETENTION into hourly buckets'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention', type=int, default=None,
+                            help='Seconds the quarter buckets are kept (default: VOTE_RATE_QUARTER_RETENTION)')
+
+    def handle(self, *args, **options):
+        retention = options['retention']
+        if retention is None:
+            retention = settings.VOTE_RATE_QUARTER_RETENTION
+        folded = downsample(timezone.now() - timedelta(seconds=retention))
+        self.stdout.write(self.style.SUCCESS(f'Folded {folded} quarter buckets into hourly buckets'))
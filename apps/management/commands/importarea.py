@@ -1,44 +1,20 @@
-import traceback
-
-import requests
 from django.core.management import BaseCommand
 
-from apps.models import NewArea
+from users.seed import AREA_API_URL, import_areas
 
 
 class Command(BaseCommand):
     help = 'Import election area from government API'
+    requires_system_checks = []
 
     def handle(self, *args, **options):
+        import requests
+
         # fetch data from government API
-        # TODO: Change to production API
-        data = requests.get("https://catnip-api.herokuapp.com/api/v1/locations").json()
-        print(data)
+        data = requests.get(AREA_API_URL, timeout=60).json()
         self.stdout.write(self.style.SUCCESS('Found %s areas' % len(data)))
-        # loop through data
-        for area in data:
-            try:
-                area_in_database = NewArea.objects.filter(id=area['locationID']).first()
-                if area_in_database:
-                    self.stdout.write(
-                        self.style.SUCCESS('Area "%s" already exists in database, updating...' % area['location']))
-                    area_in_database.id = area['locationID']
-                    area_in_database.name = area['location']
-                    area_in_database.population = area['population']
-                    area_in_database.number_of_voters = area['numberOfVoters']
-                    area_in_database.save()
-                else:
-                    self.stdout.write(self.style.SUCCESS('Area with id "%s" not found in database, importing...' % area['locationID']))
-                    NewArea.objects.create(
-                        id=area['locationID'],
-                        name=area['location'],
-                        population=area['population'],
-                        number_of_voters=area['numberOfVoters'],
-                    )
-                    self.stdout.write(
-                        self.style.SUCCESS(f"Area {area['locationID']} has been imported"))
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f"Cannot import area {area['locationID']}: {e}"))
-                # print full error to console
-                traceback.print_exc()
+        counts = import_areas(data, progress=lambda processed, total: self.stdout.write(f'{processed}/{total}'))
+        for outcome, count in sorted(counts.items()):
+            style = self.style.ERROR if outcome == 'failed' else self.style.SUCCESS
+            self.stdout.write(style(f'{count} areas {outcome}'))
         self.stdout.write(self.style.SUCCESS('Import election area completed!'))
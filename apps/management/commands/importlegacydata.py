@@ -0,0 +1,15 @@
+from django.core.management import BaseCommand
+
+from users.seed import DUMP_PATH, seed_data
+
+
+class Command(BaseCommand):
+    help = 'Import the legacy data from the old dump file to the new database tables'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=DUMP_PATH, help='Path to the dump file (default: %(default)s)')
+
+    def handle(self, *args, **options):
+        seed_data(options['path'], progress=lambda message: self.stdout.write(self.style.SUCCESS(message)))
+        self.stdout.write(self.style.SUCCESS('Import legacy data completed!'))
@@ -1,74 +1,20 @@
-import traceback
-
-import requests
-from django.contrib.auth.models import User
 from django.core.management import BaseCommand
 
-from apps.models import NewArea
-from users.models import NewProfile
+from users.seed import POPULATION_API_URL, import_population
 
 
 class Command(BaseCommand):
     help = 'Import population from government API'
+    requires_system_checks = []
 
     def handle(self, *args, **options):
+        import requests
+
         # fetch data from government API
-        # TODO: Change to production API
-        data = requests.get("https://catnip-api.herokuapp.com/api/v1/populations").json()
+        data = requests.get(POPULATION_API_URL, timeout=60).json()
         self.stdout.write(self.style.SUCCESS('Found %s population data' % len(data)))
-        # loop through data
-        for population in data:
-            try:
-                # We use citizen ID as the username for the user so user can log in with their citizen ID
-                user_in_database = User.objects.filter(username=str(population['citizenID'])).first()
-                if user_in_database:
-                    self.stdout.write(
-                        self.style.SUCCESS('User "%s" already exists in database, updating...' % population['citizenID']))
-                    user_in_database.username = population['citizenID']
-                    user_in_database.first_name = population['firstName']
-                    user_in_database.last_name = population['lastName']
-                    user_in_database.save()
-                    try:
-                        user_profile = user_in_database.newprofile
-                    except:
-                        # create new profile
-                        user_profile = NewProfile.objects.create(user=user_in_database)
-                    user_profile.title = population['title']
-                    user_profile.sex = population['sex']
-                    user_profile.area = NewArea.objects.get(id=population['locationID'])
-                    # If cannot vote, remove from the database.
-                    if not population['rightToVote']:
-                        self.stdout.write(
-                            self.style.SUCCESS('User with id "%s" cannot vote!, removing' % user_in_database.username)
-                        )
-                        user_profile.delete()
-                        user_in_database.delete()
-                        continue
-                    user_profile.right_to_vote = population['rightToVote']
-                    user_profile.blacklist = population['blacklist']
-                    user_profile.save()
-                else:
-                    if not population['rightToVote']:
-                        self.stdout.write(self.style.SUCCESS('User with id "%s" cannot vote.. no import' % population['citizenID']))
-                        continue
-                    self.stdout.write(self.style.SUCCESS('User with id "%s" not found in database, importing...' % population['citizenID']))
-                    user = User.objects.create(
-                        username=population['citizenID'],
-                        first_name=population['firstName'],
-                        last_name=population['lastName'],
-                    )
-                    user.save()
-                    profile = user.newprofile
-                    profile.title = population['title']
-                    profile.sex = population['sex']
-                    profile.area = NewArea.objects.get(id=population['locationID'])
-                    profile.right_to_vote = population['rightToVote']
-                    profile.blacklist = population['blacklist']
-                    profile.save()
-                    self.stdout.write(
-                        self.style.SUCCESS(f"User {population['citizenID']} has been imported"))
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f"Cannot import user {population['citizenID']}: {e}"))
-                # print full error to console
-                traceback.print_exc()
+        counts = import_population(data, progress=lambda processed, total: self.stdout.write(f'{processed}/{total}'))
+        for outcome, count in sorted(counts.items()):
+            style = self.style.ERROR if outcome == 'failed' else self.style.SUCCESS
+            self.stdout.write(style(f'{count} citizens {outcome}'))
         self.stdout.write(self.style.SUCCESS('Import population completed!'))
@@ -0,0 +1,27 @@
+from django.core.management import BaseCommand, CommandError
+
+from apps.models import NewElection
+from apps.turnout import rollup_turnout
+from apps.utils import check_election_status
+
+
+class Command(BaseCommand):
+    help = 'Recount the per-area turnout counters of the ongoing elections from the votes and profiles'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--election', type=int, action='append',
+                            help='Id of an election to recount, can be repeated (default: the ongoing elections)')
+
+    def handle(self, *args, **options):
+        if options['election']:
+            elections = list(NewElection.objects.filter(id__in=options['election']))
+            missing = set(options['election']) - {election.id for election in elections}
+            if missing:
+                raise CommandError(f'Election {", ".join(str(i) for i in sorted(missing))} does not exist')
+        else:
+            elections = [election for election in NewElection.objects.all()
+                         if check_election_status(election) == 'Ongoing']
+        for election in elections:
+            areas = rollup_turnout(election.id)
+            self.stdout.write(self.style.SUCCESS(f'Recounted the turnout of {areas} areas in {election.name}'))
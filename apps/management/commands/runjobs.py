@@ -0,0 +1,25 @@
+import logging
+
+from django.core.management import BaseCommand
+
+from users.jobs import work, worker_name
+
+
+class Command(BaseCommand):
+    help = 'Run the background jobs queued from the utility menu'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Exit when the queue is empty instead of waiting for new jobs')
+
+    def handle(self, *args, **options):
+        logging.getLogger('users.jobs').setLevel(logging.INFO)
+        worker = worker_name()
+        self.stdout.write(self.style.SUCCESS(f'Worker {worker} is waiting for jobs'))
+        try:
+            work(worker, once=options['once'])
+        except KeyboardInterrupt:
+            # The running job is queued again by the next worker once its heartbeat is stale.
+            self.stdout.write(self.style.WARNING(f'Worker {worker} stopped'))
+            return
+        self.stdout.write(self.style.SUCCESS('No job left in the queue'))
@@ -0,0 +1,38 @@
+import threading
+from collections import defaultdict
+
+# Counters are kept per process, each worker reports its own numbers.
+_counters = defaultdict(float)
+_lock = threading.Lock()
+
+
+def increment(name: str, value: float = 1):
+    """
+    Add a value to a counter.
+
+    :param name: Name of the counter, dotted by component (e.g. ``pagecache.hits``).
+    :param value: The value to add.
+    """
+    with _lock:
+        _counters[name] += value
+
+
+def snapshot(prefix: str = '') -> dict:
+    """
+    Return a copy of the counters whose name starts with a prefix.
+
+    :param prefix: Only return the counters starting with this prefix.
+    :return: A dictionary of counter name to value.
+    :rtype: dict
+    """
+    with _lock:
+        return {name: value for name, value in sorted(_counters.items()) if name.startswith(prefix)}
+
+
+def reset(prefix: str = ''):
+    """
+    Remove the counters whose name starts with a prefix.
+    """
+    with _lock:
+        for name in [name for name in _counters if name.startswith(prefix)]:
+            del _counters[name]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def set_vote_check_area(apps, schema_editor):
+    VoteCheck = apps.get_model('apps', 'VoteCheck')
+    NewProfile = apps.get_model('users', 'NewProfile')
+    VoteCheck.objects.update(area_id=models.Subquery(
+        NewProfile.objects.filter(user_id=models.OuterRef('user_id')).values('area_id')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0014_idempotencykey'),
+        ('users', '0012_coloursettings_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='votecheck',
+            name='area',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='apps.newarea'),
+        ),
+        migrations.CreateModel(
+            name='AreaTurnout',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('voted', models.IntegerField(default=0)),
+                ('eligible', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('area', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='apps.newarea')),
+                ('election', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='apps.newelection')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='areaturnout',
+            constraint=models.UniqueConstraint(fields=('election', 'area'), name='unique_turnout_per_election_area'),
+        ),
+        migrations.RunPython(set_vote_check_area, migrations.RunPython.noop),
+    ]
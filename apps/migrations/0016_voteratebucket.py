@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0015_areaturnout'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VoteRateBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('minute', 'Minute'), ('hour', 'Hour')], default='minute', max_length=10)),
+                ('bucket_start', models.DateTimeField()),
+                ('count', models.IntegerField(default=0)),
+                ('area', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='apps.newarea')),
+                ('election', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='apps.newelection')),
+                ('party', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='apps.newparty')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='voteratebucket',
+            constraint=models.UniqueConstraint(fields=('election', 'resolution', 'bucket_start', 'area', 'party'), name='unique_vote_rate_bucket'),
+        ),
+    ]
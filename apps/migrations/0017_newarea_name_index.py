@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0016_voteratebucket'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='newarea',
+            name='name',
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+    ]
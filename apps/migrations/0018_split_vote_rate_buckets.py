@@ -0,0 +1,77 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def split_vote_rate_buckets(apps, schema_editor):
+    """
+    Count the ballots of the buckets per area and party again per area and per party, per quarter instead of minute.
+    """
+    VoteRateBucket = apps.get_model('apps', 'VoteRateBucket')
+    AreaVoteRateBucket = apps.get_model('apps', 'AreaVoteRateBucket')
+    PartyVoteRateBucket = apps.get_model('apps', 'PartyVoteRateBucket')
+    areas = {}
+    parties = {}
+    for bucket in VoteRateBucket.objects.iterator():
+        start = bucket.bucket_start
+        resolution = bucket.resolution
+        if resolution == 'minute':
+            start = start.replace(minute=start.minute - start.minute % 15)
+            resolution = 'quarter'
+        area_key = (bucket.election_id, resolution, start, bucket.area_id)
+        party_key = (bucket.election_id, resolution, start, bucket.party_id)
+        areas[area_key] = areas.get(area_key, 0) + bucket.count
+        parties[party_key] = parties.get(party_key, 0) + bucket.count
+    AreaVoteRateBucket.objects.bulk_create(
+        [AreaVoteRateBucket(election_id=election_id, resolution=resolution, bucket_start=start, area_id=area_id,
+                            count=count)
+         for (election_id, resolution, start, area_id), count in areas.items()])
+    PartyVoteRateBucket.objects.bulk_create(
+        [PartyVoteRateBucket(election_id=election_id, resolution=resolution, bucket_start=start, party_id=party_id,
+                             count=count)
+         for (election_id, resolution, start, party_id), count in parties.items()])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0017_newarea_name_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AreaVoteRateBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('quarter', 'Quarter hour'), ('hour', 'Hour')], default='quarter', max_length=10)),
+                ('bucket_start', models.DateTimeField()),
+                ('count', models.IntegerField(default=0)),
+                ('area', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='apps.newarea')),
+                ('election', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='apps.newelection')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PartyVoteRateBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('quarter', 'Quarter hour'), ('hour', 'Hour')], default='quarter', max_length=10)),
+                ('bucket_start', models.DateTimeField()),
+                ('count', models.IntegerField(default=0)),
+                ('election', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='apps.newelection')),
+                ('party', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='apps.newparty')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='partyvoteratebucket',
+            constraint=models.UniqueConstraint(fields=('election', 'resolution', 'bucket_start', 'party'), name='unique_party_vote_rate_bucket'),
+        ),
+        migrations.AddConstraint(
+            model_name='areavoteratebucket',
+            constraint=models.UniqueConstraint(fields=('election', 'resolution', 'bucket_start', 'area'), name='unique_area_vote_rate_bucket'),
+        ),
+        migrations.RunPython(split_vote_rate_buckets, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='VoteRateBucket',
+        ),
+    ]
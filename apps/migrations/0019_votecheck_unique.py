@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:43
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicate_vote_checks(apps, schema_editor):
+    """
+    Keep the first VoteCheck of a voter in an election, so the unique constraint can be added.
+    """
+    VoteCheck = apps.get_model('apps', 'VoteCheck')
+    duplicates = VoteCheck.objects.values('user_id', 'election_id').annotate(count=Count('id'), first_id=Min('id')) \
+        .filter(count__gt=1)
+    for duplicate in duplicates:
+        VoteCheck.objects.filter(user_id=duplicate['user_id'], election_id=duplicate['election_id']) \
+            .exclude(id=duplicate['first_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0018_split_vote_rate_buckets'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_vote_checks, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='votecheck',
+            constraint=models.UniqueConstraint(fields=('user', 'election'), name='unique_vote_check_per_election'),
+        ),
+    ]
@@ -12,7 +12,7 @@ class LegacyArea(models.Model):
 
 
 class NewArea(models.Model):
-    name = models.CharField(max_length=100)
+    name = models.CharField(max_length=100, db_index=True)
     population = models.IntegerField(default=0)
     number_of_voters = models.IntegerField(default=0)
 
@@ -96,8 +96,16 @@ class LegacyVote(models.Model):
 class VoteCheck(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     election = models.ForeignKey(NewElection, on_delete=models.CASCADE)
+    # The area of the voter when they voted, for the turnout.
+    area = models.ForeignKey(NewArea, on_delete=models.SET_NULL, null=True, blank=True)
     time = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            # A ballot is counted once even when two requests of a voter pass the check of the vote views at once.
+            models.UniqueConstraint(fields=['user', 'election'], name='unique_vote_check_per_election'),
+        ]
+
     def __str__(self):
         return self.user.username + ' voted in ' + self.election.name + ' at ' + self.time.strftime('%Y-%m-%d %H:%M:%S')
 
@@ -118,3 +126,108 @@ class VoteResultCandidate(models.Model):
 
     def __str__(self):
         return self.election.name + ' - ' + self.candidate.user.username + ' - ' + str(self.vote)
+
+
+class AreaTurnout(models.Model):
+    """
+    The turnout counters of an area in an election, see ``apps.turnout``.
+    """
+    election = models.ForeignKey(NewElection, on_delete=models.CASCADE)
+    area = models.ForeignKey(NewArea, on_delete=models.CASCADE)
+    voted = models.IntegerField(default=0)
+    # Users of the area with the right to vote who are not blacklisted.
+    eligible = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['election', 'area'], name='unique_turnout_per_election_area'),
+        ]
+
+    def __str__(self):
+        return self.election.name + ' - ' + self.area.name + ' - ' + str(self.voted) + '/' + str(self.eligible)
+
+    @property
+    def rate(self) -> float:
+        return self.voted / self.eligible if self.eligible else 0.0
+
+
+class VoteRateBucket(models.Model):
+    """
+    The number of ballots cast during a quarter of an hour or an hour, see ``apps.voterate``.
+
+    Ballots are counted per area and per party in separate buckets, never per area and party, so the buckets do not
+    tell the party of the voters of an area.
+    """
+    QUARTER = 'quarter'
+    HOUR = 'hour'
+    RESOLUTION_CHOICES = (
+        (QUARTER, 'Quarter hour'),
+        (HOUR, 'Hour'),
+    )
+
+    election = models.ForeignKey(NewElection, on_delete=models.CASCADE)
+    resolution = models.CharField(max_length=10, choices=RESOLUTION_CHOICES, default=QUARTER)
+    bucket_start = models.DateTimeField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+
+class AreaVoteRateBucket(VoteRateBucket):
+    """
+    The number of ballots cast in an area during a quarter of an hour or an hour.
+    """
+    area = models.ForeignKey(NewArea, on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            # Also the index of the time range queries of an election.
+            models.UniqueConstraint(fields=['election', 'resolution', 'bucket_start', 'area'],
+                                    name='unique_area_vote_rate_bucket'),
+        ]
+
+    def __str__(self):
+        return self.election.name + ' - ' + self.area.name + ' - ' + \
+            self.bucket_start.strftime('%Y-%m-%d %H:%M') + ' - ' + str(self.count)
+
+
+class PartyVoteRateBucket(VoteRateBucket):
+    """
+    The number of ballots cast for a party during a quarter of an hour or an hour.
+    """
+    party = models.ForeignKey(NewParty, on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            # Also the index of the time range queries of an election.
+            models.UniqueConstraint(fields=['election', 'resolution', 'bucket_start', 'party'],
+                                    name='unique_party_vote_rate_bucket'),
+        ]
+
+    def __str__(self):
+        return self.election.name + ' - ' + self.party.name + ' - ' + \
+            self.bucket_start.strftime('%Y-%m-%d %H:%M') + ' - ' + str(self.count)
+
+
+class IdempotencyKey(models.Model):
+    """
+    The response of an API request sent with an ``Idempotency-Key`` header, replayed to the retries of the request.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    # Hash of the request, a key cannot be reused for a different request.
+    request_hash = models.CharField(max_length=64)
+    # Empty while the first request is still running.
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response = models.BinaryField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key_per_user'),
+        ]
+
+    def __str__(self):
+        return self.user.username + ' - ' + self.key
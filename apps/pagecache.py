@@ -0,0 +1,134 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils import timezone
+
+from apps import metrics
+
+GENERATION_KEY_PREFIX = 'pagecache:generation:'
+
+
+def _generation_key(label: str) -> str:
+    return GENERATION_KEY_PREFIX + label
+
+
+def user_label(user_id: int) -> str:
+    """
+    Return the label of what every cached page of a logged in user shows about them: the navbar with their name and
+    profile picture. It is bumped when that user or their profile is saved, not when any other user is.
+    """
+    return f'users.newprofile:{user_id}'
+
+
+def get_generations(labels) -> list:
+    """
+    Return the current generation of each model label.
+
+    A model that has never been changed since the cache was cleared is at generation 1.
+    """
+    keys = [_generation_key(label) for label in labels]
+    generations = cache.get_many(keys)
+    return [generations.get(key, 1) for key in keys]
+
+
+def bump_generation(*labels: str):
+    """
+    Invalidate every cached page that depends on the given model labels (``app_label.model_name``).
+    """
+    for label in labels:
+        key = _generation_key(label)
+        # Start at 1 so the first bump changes the generation from the default of get_generations.
+        cache.add(key, 1, None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 2, None)
+
+
+def is_cacheable(request, anonymous_only: bool = False) -> bool:
+    """
+    Return True if the page for this request can be served from or stored in the page cache.
+
+    Staff see edit buttons, and a page that is about to show flash messages is different for the next request, so
+    both are always rendered.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    user = request.user
+    if user.is_authenticated and (anonymous_only or user.is_staff or user.is_superuser):
+        return False
+    return len(get_messages(request)) == 0
+
+
+def page_cache_key(request, labels) -> str:
+    """
+    Build the cache key of a page from its URL, who is looking at it and the generation of the models it shows.
+    """
+    if request.user.is_authenticated:
+        audience = f'user{request.user.id}'
+        labels = tuple(labels) + (user_label(request.user.id),)
+    else:
+        audience = 'anonymous'
+    generations = '.'.join(str(generation) for generation in get_generations(labels))
+    url = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'pagecache:page:{url}:{audience}:{generations}'
+
+
+def cache_page_for_visitors(*models, timeout: int = None, anonymous_only: bool = False, expires_at=None):
+    """
+    Cache a whole page for anonymous and non-staff users until one of the models it shows is changed.
+
+    Anonymous visitors share one cached copy per URL, logged in users get their own. The generation of every model is
+    part of the cache key and is bumped by ``apps.signals`` when an object is saved or deleted, so a stale page is
+    simply never looked up again.
+
+    :param models: The models whose objects are shown on the page.
+    :param timeout: Seconds to keep a page, defaults to the ``PAGE_CACHE_TIMEOUT`` setting.
+    :param anonymous_only: Only cache the page for anonymous visitors, for pages with per-user content.
+    :param expires_at: An optional callable returning a datetime (or None) after which the page is stale even if
+                       nothing changed, e.g. when an election starts or ends.
+    """
+    labels = tuple(model._meta.label_lower for model in models)
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if not is_cacheable(request, anonymous_only):
+                return view_func(request, *args, **kwargs)
+            key = page_cache_key(request, labels)
+            entry = cache.get(key)
+            if entry is not None and (entry['expires'] is None or entry['expires'] > time.time()):
+                metrics.increment('pagecache.hits')
+                metrics.increment('pagecache.render_seconds_saved', entry['render_time'])
+                response = HttpResponse(entry['content'], content_type=entry['content_type'])
+                response['X-Page-Cache'] = 'hit'
+                return response
+
+            started = time.perf_counter()
+            response = view_func(request, *args, **kwargs)
+            render_time = time.perf_counter() - started
+            metrics.increment('pagecache.misses')
+            metrics.increment('pagecache.render_seconds', render_time)
+            # A page with a CSRF token or a cookie is tied to this request.
+            if response.status_code != 200 or response.streaming or response.cookies \
+                    or request.META.get('CSRF_COOKIE_NEEDS_UPDATE'):
+                return response
+            page_timeout = settings.PAGE_CACHE_TIMEOUT if timeout is None else timeout
+            expires = expires_at() if expires_at is not None else None
+            if expires is not None:
+                page_timeout = min(page_timeout, max(int((expires - timezone.now()).total_seconds()), 0) + 1)
+            cache.set(key, {
+                'content': response.content,
+                'content_type': response['Content-Type'],
+                'render_time': render_time,
+                'expires': expires.timestamp() if expires is not None else None,
+            }, page_timeout)
+            response['X-Page-Cache'] = 'miss'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,211 @@
+import asyncio
+import cProfile
+import contextlib
+import io
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import slugify
+
+# Views living in these modules can be picked by the random sampling mode.
+SAMPLED_VIEW_MODULES = ('apps.', 'apis.')
+
+PROFILE_MODES = ('cprofile', 'sample')
+
+
+def get_profile_root() -> Path:
+    """
+    Return the directory that profiling artifacts are written to.
+    """
+    return Path(settings.PROFILER_ROOT)
+
+
+def list_profile_artifacts() -> list:
+    """
+    List all stored profiling artifacts, newest first.
+
+    :return: A list of dictionaries with the artifact name, size and modified time.
+    :rtype: list
+    """
+    root = get_profile_root()
+    if not root.is_dir():
+        return []
+    artifacts = []
+    for entry in os.scandir(root):
+        if entry.is_file() and entry.name.endswith('.txt'):
+            stat = entry.stat()
+            artifacts.append({
+                'name': entry.name,
+                'size': stat.st_size,
+                'time': timezone.datetime.fromtimestamp(stat.st_mtime, tz=timezone.get_current_timezone()),
+            })
+    return sorted(artifacts, key=lambda i: i['time'], reverse=True)
+
+
+def prune_profile_artifacts(keep: int) -> int:
+    """
+    Delete the oldest profiling artifacts, keeping the newest ones.
+
+    :param keep: The number of artifacts to keep.
+    :return: The number of artifacts deleted.
+    :rtype: int
+    """
+    root = get_profile_root()
+    deleted = 0
+    for artifact in list_profile_artifacts()[keep:]:
+        with contextlib.suppress(FileNotFoundError):
+            (root / artifact['name']).unlink()
+            deleted += 1
+    return deleted
+
+
+def call_and_render(view_func, request, *args, **kwargs):
+    """
+    Call a view and render its response, template and DRF responses are otherwise rendered after the view returns.
+    """
+    response = view_func(request, *args, **kwargs)
+    if hasattr(response, 'render') and callable(response.render):
+        response.render()
+    return response
+
+
+class SQLTimer:
+    """
+    A database execute wrapper that records the SQL and timing of each query.
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((time.perf_counter() - start, context['connection'].alias, sql))
+
+    def report(self) -> str:
+        total = sum(duration for duration, _, _ in self.queries)
+        lines = [f'{len(self.queries)} queries in {total * 1000:.2f} ms', '']
+        for duration, alias, sql in sorted(self.queries, key=lambda i: i[0], reverse=True):
+            lines.append(f'{duration * 1000:9.2f} ms  [{alias}]  {sql}')
+        return '\n'.join(lines)
+
+
+class StackSampler:
+    """
+    A sampling profiler that periodically captures the stack of one thread.
+
+    The samples are aggregated into the collapsed stack format (``frame;frame;frame count``)
+    that flame graph tools understand.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def report(self) -> str:
+        return '\n'.join(f'{stack} {count}' for stack, count in self.stacks.most_common())
+
+
+class ProfilerMiddleware(MiddlewareMixin):
+    """
+    Profile a request on demand and store the result as a downloadable artifact.
+
+    Staff can profile any request by adding ``?profile=cprofile`` (or ``?profile=sample``) to the URL or by sending
+    the ``X-Profile`` header with the same value. When ``PROFILER_SAMPLE_RATE`` is set to N, one in N requests to
+    the ``apps`` and ``apis`` views is also profiled with the sampling profiler.
+    """
+
+    def get_profile_mode(self, request, view_func) -> str | None:
+        requested = request.GET.get('profile') or request.META.get('HTTP_X_PROFILE')
+        if requested and request.user.is_authenticated and (request.user.is_staff or request.user.is_superuser):
+            return requested if requested in PROFILE_MODES else 'cprofile'
+        sample_rate = settings.PROFILER_SAMPLE_RATE
+        if sample_rate > 0 and view_func.__module__.startswith(SAMPLED_VIEW_MODULES) \
+                and random.randrange(sample_rate) == 0:
+            return 'sample'
+        return None
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if asyncio.iscoroutinefunction(view_func):
+            # The async views run in the event loop, not in this thread.
+            return None
+        mode = self.get_profile_mode(request, view_func)
+        if mode is None:
+            return None
+        sql_timer = SQLTimer()
+        started = time.perf_counter()
+        with contextlib.ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(sql_timer))
+            if mode == 'cprofile':
+                profiler = cProfile.Profile()
+                response = profiler.runcall(call_and_render, view_func, request, *view_args, **view_kwargs)
+                stats_output = io.StringIO()
+                pstats.Stats(profiler, stream=stats_output).sort_stats('cumulative').print_stats(60)
+                profile_report = stats_output.getvalue()
+            else:
+                sampler = StackSampler(threading.get_ident(), settings.PROFILER_SAMPLE_INTERVAL)
+                sampler.start()
+                try:
+                    response = call_and_render(view_func, request, *view_args, **view_kwargs)
+                finally:
+                    sampler.stop()
+                profile_report = sampler.report()
+        elapsed = time.perf_counter() - started
+        self.save_artifact(request, mode, elapsed, sql_timer, profile_report)
+        return response
+
+    @staticmethod
+    def save_artifact(request, mode: str, elapsed: float, sql_timer: SQLTimer, profile_report: str):
+        root = get_profile_root()
+        root.mkdir(parents=True, exist_ok=True)
+        now = timezone.now()
+        name = f"{now.strftime('%Y%m%d-%H%M%S-%f')}-{request.method.lower()}-{slugify(request.path)[:80] or 'root'}.txt"
+        header = [
+            f'Path: {request.get_full_path()}',
+            f'Method: {request.method}',
+            f'User: {request.user.username if request.user.is_authenticated else "anonymous"}',
+            f'Mode: {mode}',
+            f'Time: {now.isoformat()}',
+            f'Elapsed: {elapsed * 1000:.2f} ms',
+        ]
+        sections = [
+            '\n'.join(header),
+            '== SQL ==\n' + sql_timer.report(),
+            ('== Collapsed stacks ==\n' if mode == 'sample' else '== cProfile ==\n') + profile_report,
+        ]
+        (root / name).write_text('\n\n'.join(sections), encoding='utf-8')
+        prune_profile_artifacts(settings.PROFILER_MAX_ARTIFACTS)
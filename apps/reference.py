@@ -0,0 +1,188 @@
+"""
+In-process cache of the reference data: the areas, the parties and the candidates.
+
+They are read on almost every request (the vote forms, the vote API, the lists and the results) and change rarely, so
+every process keeps them as immutable records indexed by id, by area and by party, instead of querying them. The
+cache is versioned by a generation in the shared cache, bumped when one of them (or the user of a candidate) is saved or
+deleted, and rebuilt by the first read after a bump. It is also rebuilt once older than ``REFERENCE_DATA_MAX_AGE``, so a
+process that missed a bump (a cache that is not shared, or a change made outside of the models) catches up anyway.
+The warm-up builds it before the workers fork, see apps.warmup.
+
+The records have the attributes the serializers read, so they serialize like the models.
+"""
+import threading
+import time
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.fields.files import ImageFieldFile
+
+from apps.models import NewArea, NewCandidate, NewParty
+
+GENERATION_KEY = 'reference:generation'
+
+
+class AreaRecord(NamedTuple):
+    id: int
+    name: str
+    population: int
+    number_of_voters: int
+
+    def __str__(self):
+        return self.name
+
+
+class PartyRecord(NamedTuple):
+    id: int
+    name: str
+    description: str
+    quote: str
+    image_name: str
+
+    @property
+    def image(self) -> ImageFieldFile:
+        return ImageFieldFile(None, NewParty._meta.get_field('image'), self.image_name)
+
+    def __str__(self):
+        return self.name
+
+
+class UserRecord(NamedTuple):
+    id: int
+    username: str
+    email: str
+    first_name: str
+    last_name: str
+
+
+class CandidateRecord(NamedTuple):
+    id: int
+    user: UserRecord
+    description: str
+    image_name: str
+    area: AreaRecord | None
+    party: PartyRecord | None
+
+    @property
+    def image(self) -> ImageFieldFile:
+        return ImageFieldFile(None, NewCandidate._meta.get_field('image'), self.image_name)
+
+    @property
+    def area_id(self) -> int | None:
+        return self.area.id if self.area is not None else None
+
+    @property
+    def party_id(self) -> int | None:
+        return self.party.id if self.party is not None else None
+
+    def __str__(self):
+        return f'{self.user.username} - {self.area.name if self.area is not None else "No area"}'
+
+
+class ReferenceData:
+    """
+    The records of a generation, every mapping is ordered by id.
+    """
+    __slots__ = ('generation', 'built_at', 'areas', 'parties', 'candidates', 'candidates_by_area',
+                 'candidates_by_party')
+
+    def __init__(self, generation, areas: dict, parties: dict, candidates: dict):
+        self.generation = generation
+        self.built_at = time.monotonic()
+        self.areas = areas
+        self.parties = parties
+        self.candidates = candidates
+        by_area = {}
+        by_party = {}
+        for candidate in candidates.values():
+            by_area.setdefault(candidate.area_id, []).append(candidate)
+            by_party.setdefault(candidate.party_id, []).append(candidate)
+        self.candidates_by_area = {area_id: tuple(records) for area_id, records in by_area.items()}
+        self.candidates_by_party = {party_id: tuple(records) for party_id, records in by_party.items()}
+
+    @classmethod
+    def build(cls, generation) -> 'ReferenceData':
+        areas = {row[0]: AreaRecord(*row) for row in
+                 NewArea.objects.order_by('id').values_list('id', 'name', 'population', 'number_of_voters')}
+        parties = {row[0]: PartyRecord(*row) for row in
+                   NewParty.objects.order_by('id').values_list('id', 'name', 'description', 'quote', 'image')}
+        candidates = {}
+        for candidate_id, user_id, username, email, first_name, last_name, description, image, area_id, party_id in \
+                NewCandidate.objects.order_by('id').values_list(
+                    'id', 'user_id', 'user__username', 'user__email', 'user__first_name', 'user__last_name',
+                    'description', 'image', 'area_id', 'party_id'):
+            candidates[candidate_id] = CandidateRecord(
+                candidate_id, UserRecord(user_id, username, email, first_name, last_name), description, image,
+                areas.get(area_id), parties.get(party_id))
+        return cls(generation, areas, parties, candidates)
+
+    @property
+    def version(self):
+        """
+        Version of the records for the caches derived from them, None without a generation.
+        """
+        return None if self.generation is None else (self.generation, self.built_at)
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() - self.built_at >= settings.REFERENCE_DATA_MAX_AGE
+
+    def candidates_in_area(self, area_id: int) -> tuple:
+        return self.candidates_by_area.get(area_id, ())
+
+    def candidates_in_party(self, party_id: int) -> tuple:
+        return self.candidates_by_party.get(party_id, ())
+
+
+_reference_data = None
+_reference_lock = threading.Lock()
+
+
+def get_generation():
+    """
+    Return the current generation of the reference data, or None if the cache cannot keep it.
+    """
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        # Start from the clock, so the generation is a new one when the cache was cleared.
+        cache.add(GENERATION_KEY, time.time_ns(), None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def bump_generation():
+    """
+    Make every process rebuild its reference data on its next read.
+    """
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.add(GENERATION_KEY, time.time_ns(), None)
+
+
+def get_reference_data() -> ReferenceData:
+    """
+    Return the reference data of the current generation, rebuilding it if it changed or expired.
+    """
+    global _reference_data
+    # Read before the rows, so a change made while building is picked up by the next read.
+    generation = get_generation()
+    data = _reference_data
+    if data is not None and generation is not None and data.generation == generation and not data.expired:
+        return data
+    with _reference_lock:
+        data = _reference_data
+        if data is None or generation is None or data.generation != generation or data.expired:
+            data = ReferenceData.build(generation)
+            _reference_data = data
+        return data
+
+
+def clear_reference_data():
+    """
+    Forget the reference data of this process.
+    """
+    global _reference_data
+    with _reference_lock:
+        _reference_data = None
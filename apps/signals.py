@@ -0,0 +1,78 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from apps.images import schedule_variants
+from apps.models import NewCandidate, NewParty, NewElection, NewArea, LegacyArea, LegacyCandidate, LegacyElection, \
+    LegacyParty, LegacyVote
+from apps.pagecache import bump_generation, user_label
+from apps.reference import bump_generation as bump_reference_generation
+from apps.turnout import create_turnout_counters
+from users.models import NewProfile
+
+# Models shown on the cached pages, see apps.pagecache, and in the memoized legacy results, see
+# apps.utils.get_sorted_election_result.
+PAGE_CACHE_MODELS = (NewArea, NewCandidate, NewParty, NewElection, LegacyArea, LegacyCandidate, LegacyElection,
+                     LegacyParty, LegacyVote, NewProfile, User)
+
+# Models of the reference data, see apps.reference.
+REFERENCE_MODELS = (NewArea, NewCandidate, NewParty)
+
+
+@receiver(post_save, sender=NewCandidate)
+@receiver(post_save, sender=NewParty)
+def generate_image_variants(sender, instance, **kwargs):
+    transaction.on_commit(lambda: schedule_variants(instance.image))
+
+
+@receiver(post_save, sender=NewElection)
+def generate_front_image_variants(sender, instance, **kwargs):
+    transaction.on_commit(lambda: schedule_variants(instance.front_image))
+
+
+@receiver(post_save, sender=NewElection)
+def create_election_turnout_counters(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        create_turnout_counters(instance.id)
+
+
+def invalidate_cached_pages(sender, instance, update_fields=None, **kwargs):
+    # Logging in only updates last_login, which is not shown anywhere.
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    bump_generation(sender._meta.label_lower)
+    if sender is User:
+        bump_generation(user_label(instance.pk))
+    elif sender is NewProfile:
+        bump_generation(user_label(instance.user_id))
+
+
+for model in PAGE_CACHE_MODELS:
+    post_save.connect(invalidate_cached_pages, sender=model, dispatch_uid=f'pagecache-save-{model._meta.label_lower}')
+    post_delete.connect(invalidate_cached_pages, sender=model,
+                        dispatch_uid=f'pagecache-delete-{model._meta.label_lower}')
+
+
+def invalidate_reference_data(sender, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    bump_reference_generation()
+    # Again once committed, another process may have rebuilt from the rows of before the commit in the meantime.
+    transaction.on_commit(bump_reference_generation)
+
+
+for model in REFERENCE_MODELS:
+    post_save.connect(invalidate_reference_data, sender=model,
+                      dispatch_uid=f'reference-save-{model._meta.label_lower}')
+    post_delete.connect(invalidate_reference_data, sender=model,
+                        dispatch_uid=f'reference-delete-{model._meta.label_lower}')
+
+
+@receiver(post_save, sender=User, dispatch_uid='reference-save-auth.user')
+def invalidate_candidate_user(sender, instance, update_fields=None, **kwargs):
+    # Only the users of the candidates are in the reference data, deleting one deletes its candidate too.
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    if NewCandidate.objects.filter(user_id=instance.pk).exists():
+        invalidate_reference_data(sender, update_fields=update_fields, **kwargs)
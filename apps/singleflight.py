@@ -0,0 +1,147 @@
+"""
+Single-flight computations: one caller computes the value of a key while the others wait for it, instead of every one
+of them computing it at the same time (a cache stampede, when an election closes for example).
+
+The value is kept in the shared cache, fresh for ``fresh_seconds`` and then stale for ``stale_seconds`` more. A stale
+value is still served to everyone while a single caller computes it again (stale-while-revalidate), so only that caller
+waits for the database. Within a process, the threads asking for a key wait for the one computing it. Across processes,
+the caller that takes the lock of the key in the shared cache (``cache.add``) computes it, and the others poll the cache
+for the value for up to ``SINGLE_FLIGHT_WAIT_SECONDS``, then compute it themselves. The lock of a process that died
+expires after ``SINGLE_FLIGHT_LOCK_SECONDS``.
+"""
+import threading
+import time
+import uuid
+from typing import Any, Callable
+
+from django.conf import settings
+from django.core.cache import cache
+
+from apps import metrics
+
+VALUE_KEY = 'singleflight:value:{}'
+LOCK_KEY = 'singleflight:lock:{}'
+
+# Seconds between two looks at the cache while another process computes the value.
+POLL_SECONDS = 0.05
+
+
+class _Flight:
+    """
+    A computation in progress in this process.
+    """
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def _is_fresh(entry) -> bool:
+    return entry is not None and entry[0] > time.time()
+
+
+def _acquire(key: str) -> str | None:
+    token = uuid.uuid4().hex
+    return token if cache.add(LOCK_KEY.format(key), token, settings.SINGLE_FLIGHT_LOCK_SECONDS) else None
+
+
+def _release(key: str, token: str):
+    # Not the lock of another process, taken after this one expired.
+    if cache.get(LOCK_KEY.format(key)) == token:
+        cache.delete(LOCK_KEY.format(key))
+
+
+def _compute(key: str, compute: Callable[[], Any], fresh_seconds: float, stale_seconds: float):
+    value = compute()
+    cache.set(VALUE_KEY.format(key), (time.time() + fresh_seconds, value), fresh_seconds + stale_seconds)
+    metrics.increment('singleflight.computed')
+    return value
+
+
+def _compute_locked(key: str, token: str, compute: Callable[[], Any], fresh_seconds: float, stale_seconds: float):
+    try:
+        # Another process may have stored the value since it was read.
+        entry = cache.get(VALUE_KEY.format(key))
+        if _is_fresh(entry):
+            return entry[1]
+        return _compute(key, compute, fresh_seconds, stale_seconds)
+    finally:
+        _release(key, token)
+
+
+def _fetch(key: str, entry, compute: Callable[[], Any], fresh_seconds: float, stale_seconds: float):
+    """
+    Get the value of a key that is not fresh, run by one thread of the process at a time.
+    """
+    token = _acquire(key)
+    if token is not None:
+        return _compute_locked(key, token, compute, fresh_seconds, stale_seconds)
+    if entry is not None:
+        metrics.increment('singleflight.stale')
+        return entry[1]
+    deadline = time.monotonic() + settings.SINGLE_FLIGHT_WAIT_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(POLL_SECONDS)
+        entry = cache.get(VALUE_KEY.format(key))
+        if entry is not None:
+            metrics.increment('singleflight.waited')
+            return entry[1]
+        # The lock is free without a value when the computation of the other process failed.
+        token = _acquire(key)
+        if token is not None:
+            return _compute_locked(key, token, compute, fresh_seconds, stale_seconds)
+    metrics.increment('singleflight.timeouts')
+    return _compute(key, compute, fresh_seconds, stale_seconds)
+
+
+def single_flight(key: str, compute: Callable[[], Any], fresh_seconds: float, stale_seconds: float = 0):
+    """
+    Return the value of a key from the shared cache, computing it once for every caller when it is missing or stale.
+
+    :param key: The key of the value, it must change with anything the value depends on.
+    :param compute: The function computing the value, the value must be picklable.
+    :param fresh_seconds: Seconds the value is served without being computed again.
+    :param stale_seconds: Seconds the value is still served after that, while one caller computes it again.
+    :return: The value.
+    """
+    entry = cache.get(VALUE_KEY.format(key))
+    if _is_fresh(entry):
+        metrics.increment('singleflight.hits')
+        return entry[1]
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+    if not leader:
+        if entry is not None:
+            metrics.increment('singleflight.stale')
+            return entry[1]
+        flight.done.wait()
+        metrics.increment('singleflight.waited')
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+    try:
+        flight.value = _fetch(key, entry, compute, fresh_seconds, stale_seconds)
+        return flight.value
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            del _flights[key]
+        flight.done.set()
+
+
+def forget(key: str):
+    """
+    Remove the value of a key, the next caller computes it.
+    """
+    cache.delete(VALUE_KEY.format(key))
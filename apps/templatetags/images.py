@@ -0,0 +1,25 @@
+from django import template
+from django.utils.html import format_html
+
+from apps.images import variant_url, variant_ready
+
+register = template.Library()
+
+
+@register.filter
+def thumbnail(image, variant='avatar'):
+    """
+    Return the URL of a resized variant of an image, e.g. ``{{ candidate.image|thumbnail:'avatar' }}``.
+    """
+    return variant_url(image, variant)
+
+
+@register.simple_tag
+def picture(image, variant='avatar', alt='', style=''):
+    """
+    Render a ``<picture>`` element that serves the WebP variant of an image to the browsers that support it.
+    """
+    if variant_ready(image, variant, webp=True):
+        return format_html('<picture><source srcset="{}" type="image/webp"><img src="{}" alt="{}" style="{}"></picture>',
+                           variant_url(image, variant, webp=True), variant_url(image, variant), alt, style)
+    return format_html('<img src="{}" alt="{}" style="{}">', variant_url(image, variant), alt, style)
@@ -1,12 +1,52 @@
-from django.contrib.auth.models import User
+import base64
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
 from django.contrib.messages import get_messages
-from django.test import TestCase
-from django.urls import reverse
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.http import HttpResponse
+from django.test import TestCase, RequestFactory, override_settings
+from django.urls import reverse, resolve
 from django.utils import timezone
+from knox.models import AuthToken
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+
+from PIL import Image
 
-from apps.models import LegacyArea, LegacyElection, LegacyCandidate, NewArea, NewCandidate
-from users.models import LegacyProfile
+from ayaka.admission import ADMITTED, QUEUE_FULL, TIMED_OUT, AdmissionControlMiddleware, ConcurrencyLimiter, \
+    TokenBuckets, client_address
+from ayaka.db_router import ReplicaRouter, ReplicaRoutingMiddleware, use_replica
+from ayaka.middleware import StaticFilesMiddleware
+from apps.allocation import DHONDT, LARGEST_REMAINDER, SAINTE_LAGUE, VoteMatrix, allocate, party_list_result, \
+    simulate
+from apps.checks import check_shared_cache
+from apps.forms import CandidateForm, CandidateVoteForm, PartyVoteForm
+from apps.importtime import SETUP, ImportMeasurement, ModuleImport, parse_importtime, top_imports
+from apps.images import generate_variants, variant_url, variant_ready
+from apps.reference import clear_reference_data, get_generation, get_reference_data
+from apps.singleflight import LOCK_KEY, VALUE_KEY, single_flight
+from apps.leaderboard import clear_leaderboards, get_leaderboard, leader_changed, record_vote
+from apps import metrics
+from apps.pagecache import bump_generation
+from apps.models import AreaTurnout, AreaVoteRateBucket, LegacyArea, LegacyElection, LegacyCandidate, LegacyVote, \
+    NewArea, NewCandidate, NewParty, NewElection, PartyVoteRateBucket, VoteCheck, VoteRateBucket, VoteResultCandidate, \
+    VoteResultParty
+from apps.turnout import get_turnout, record_turnout, rollup_turnout
+from apps.warmup import WARM_UP_STEPS, WarmUpStep, reset_warm_up, warm_up, warm_up_process, warm_up_report
+from apps.voterate import GROUP_AREA, GROUP_PARTY, GROUP_TOTAL, downsample, record_vote_rate, vote_rate_series
+from apps.utils import LEGACY_RESULT_LABELS, calculate_election_party_result, get_election_party_result, \
+    get_sorted_election_result, clear_legacy_election_result_cache, keyset_page, next_election_boundary, search_users
+from users.models import LegacyProfile, UtilityMissionLog
 
 
 class HomepageTest(TestCase):
@@ -335,3 +375,1049 @@ class AreaEditView(TestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
 
+
+
+class ProfilerMiddlewareTest(TestCase):
+    def setUp(self) -> None:
+        self.profile_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.profile_root, ignore_errors=True)
+        self.staff = User.objects.create_superuser(username='staff', password='password')
+        self.user = User.objects.create_user(username='user', password='password')
+        self.url = reverse('area_list')
+
+    def test_staff_can_profile_request(self):
+        """Staff requesting a profile must get an artifact with SQL timings and cProfile output."""
+        self.client.login(username='staff', password='password')
+        with self.settings(PROFILER_ROOT=self.profile_root):
+            response = self.client.get(self.url, {'profile': 'cprofile'})
+        self.assertEqual(response.status_code, 200)
+        artifacts = os.listdir(self.profile_root)
+        self.assertEqual(len(artifacts), 1)
+        with open(os.path.join(self.profile_root, artifacts[0]), encoding='utf-8') as artifact:
+            content = artifact.read()
+        self.assertIn('== SQL ==', content)
+        self.assertIn('== cProfile ==', content)
+
+    def test_profile_includes_rendering(self):
+        """The cProfile output must include the rendering of DRF responses, which happens after the view returns."""
+        profiled = []
+        render = JSONRenderer.render
+
+        def profiled_render(renderer, *args, **kwargs):
+            profiled.append(sys.getprofile() is not None)
+            return render(renderer, *args, **kwargs)
+
+        self.client.login(username='staff', password='password')
+        with self.settings(PROFILER_ROOT=self.profile_root), \
+                mock.patch.object(JSONRenderer, 'render', profiled_render):
+            self.client.get(reverse('api_area_list'), {'profile': 'cprofile'})
+        self.assertEqual(profiled, [True])
+
+    def test_artifacts_pruned(self):
+        """Only the newest PROFILER_MAX_ARTIFACTS artifacts are kept."""
+        self.client.login(username='staff', password='password')
+        with self.settings(PROFILER_ROOT=self.profile_root, PROFILER_MAX_ARTIFACTS=2):
+            for _ in range(3):
+                self.client.get(self.url, {'profile': 'cprofile'})
+        self.assertEqual(len(os.listdir(self.profile_root)), 2)
+
+    def test_sampling_profiler_by_header(self):
+        """The X-Profile header must select the sampling profiler that writes collapsed stacks."""
+        self.client.login(username='staff', password='password')
+        with self.settings(PROFILER_ROOT=self.profile_root):
+            self.client.get(self.url, HTTP_X_PROFILE='sample')
+        artifacts = os.listdir(self.profile_root)
+        self.assertEqual(len(artifacts), 1)
+        with open(os.path.join(self.profile_root, artifacts[0]), encoding='utf-8') as artifact:
+            self.assertIn('== Collapsed stacks ==', artifact.read())
+
+    def test_non_staff_cannot_profile_request(self):
+        """Normal users asking for a profile must not create any artifact."""
+        self.client.login(username='user', password='password')
+        with self.settings(PROFILER_ROOT=self.profile_root):
+            self.client.get(self.url, {'profile': 'cprofile'})
+        self.assertEqual(os.listdir(self.profile_root), [])
+
+    def test_random_sampling(self):
+        """With a sample rate of 1 every request to the apps views must be profiled."""
+        with self.settings(PROFILER_ROOT=self.profile_root, PROFILER_SAMPLE_RATE=1):
+            self.client.get(self.url)
+        self.assertEqual(len(os.listdir(self.profile_root)), 1)
+
+    def test_download_artifact_staff_only(self):
+        """The artifact must be downloadable from the utility page by staff only."""
+        self.client.login(username='staff', password='password')
+        with self.settings(PROFILER_ROOT=self.profile_root):
+            self.client.get(self.url, {'profile': 'cprofile'})
+            name = os.listdir(self.profile_root)[0]
+            download_url = reverse('download_profile_artifact', kwargs={'name': name})
+            self.assertContains(self.client.get(reverse('utils')), download_url)
+            response = self.client.get(download_url)
+            self.assertEqual(response.status_code, 200)
+            self.client.login(username='user', password='password')
+            self.assertRedirects(self.client.get(download_url), reverse('homepage'))
+
+
+class LegacyElectionResultTest(TestCase):
+    def setUp(self) -> None:
+        clear_legacy_election_result_cache()
+        self.addCleanup(clear_legacy_election_result_cache)
+        self.election = LegacyElection.objects.create(name='legacy election', description='legacy',
+                                                      start_date=timezone.now() - timezone.timedelta(days=2),
+                                                      end_date=timezone.now() - timezone.timedelta(days=1))
+        self.other_election = LegacyElection.objects.create(name='other election', description='other',
+                                                            start_date=timezone.now() - timezone.timedelta(days=2),
+                                                            end_date=timezone.now() - timezone.timedelta(days=1))
+        self.candidates = [LegacyCandidate.objects.create(name=f'candidate {i}', description='') for i in range(3)]
+        voters = [User.objects.create_user(username=f'voter{i}', password='password') for i in range(3)]
+        LegacyVote.objects.create(user=voters[0], candidate=self.candidates[2], election=self.election)
+        LegacyVote.objects.create(user=voters[1], candidate=self.candidates[2], election=self.election)
+        LegacyVote.objects.create(user=voters[2], candidate=self.candidates[1], election=self.election)
+        LegacyVote.objects.create(user=voters[0], candidate=self.candidates[0], election=self.other_election)
+
+    def test_sorted_result(self):
+        """Only the candidates of the election must be ranked, by their vote count in the election."""
+        result = get_sorted_election_result(self.election)
+        self.assertEqual([row['candidate'] for row in result], [self.candidates[2], self.candidates[1]])
+        self.assertEqual([row['vote_count'] for row in result], [2, 1])
+        self.assertEqual([row['rank'] for row in result], [1, 2])
+
+    def test_result_is_memoized(self):
+        """The second call for the same election must not touch the database."""
+        get_sorted_election_result(self.election)
+        with self.assertNumQueries(0):
+            result = get_sorted_election_result(self.election)
+        self.assertEqual(result[0]['vote_count'], 2)
+
+    def test_result_is_copied(self):
+        """Changing a returned result must not change the memoized one."""
+        result = get_sorted_election_result(self.election)
+        result[0]['vote_count'] = 100
+        result[0]['candidate'].name = 'changed'
+        result.pop()
+        result = get_sorted_election_result(self.election)
+        self.assertEqual([row['vote_count'] for row in result], [2, 1])
+        self.assertEqual(result[0]['candidate'].name, 'candidate 2')
+
+    def test_result_forgotten_after_import(self):
+        """A result read before the legacy data changes must not be served after it."""
+        get_sorted_election_result(self.election)
+        voter = User.objects.create_user(username='voter3', password='password')
+        LegacyVote.objects.create(user=voter, candidate=self.candidates[0], election=self.election)
+        self.assertEqual([row['vote_count'] for row in get_sorted_election_result(self.election)], [2, 1, 1])
+        # Bulk updates, like the import, send no signal, the import bumps the generations itself.
+        LegacyVote.objects.filter(user=voter).update(candidate=self.candidates[1])
+        self.assertEqual([row['vote_count'] for row in get_sorted_election_result(self.election)], [2, 1, 1])
+        bump_generation(*LEGACY_RESULT_LABELS)
+        self.assertEqual([row['vote_count'] for row in get_sorted_election_result(self.election)], [2, 2])
+
+
+class ImageVariantTest(TestCase):
+    def setUp(self) -> None:
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        os.makedirs(os.path.join(self.media_root, 'parties'))
+        Image.new('RGB', (800, 600), (200, 30, 30)).save(os.path.join(self.media_root, 'parties', 'red.png'))
+        self.party = NewParty(name='red party', image='parties/red.png')
+
+    def test_generate_variants(self):
+        """Every variant must be generated in the original format and in WebP with the right size."""
+        generate_variants(self.party.image)
+        self.assertTrue(variant_ready(self.party.image, 'avatar', webp=True))
+        avatar_url = variant_url(self.party.image, 'avatar')
+        self.assertTrue(avatar_url.startswith('/media/derivatives/'))
+        self.assertTrue(avatar_url.endswith('-avatar.png'))
+        with Image.open(os.path.join(self.media_root, avatar_url[len('/media/'):])) as avatar:
+            self.assertEqual(avatar.size, (100, 100))
+        with Image.open(os.path.join(self.media_root, variant_url(self.party.image, 'cover', webp=True)[len('/media/'):])) as cover:
+            self.assertEqual(cover.format, 'WEBP')
+            self.assertEqual(cover.size, (800, 600))
+
+    def test_detail_pages_render(self):
+        """The detail and profile pages must render with the thumbnail of their image."""
+        self.party.save()
+        user = User.objects.create_user(username='citizen', password='12345')
+        with mock.patch('apps.images.schedule_variants'):
+            response = self.client.get(reverse('party_detail_new', args=[self.party.id]))
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, self.party.image.url)
+            self.client.force_login(user)
+            response = self.client.get(reverse('profile'))
+            self.assertEqual(response.status_code, 200)
+            self.assertTemplateUsed(response, 'users/profile.html')
+
+    def test_missing_variant_falls_back_to_original(self):
+        """The original image must be served until the variant is generated."""
+        self.assertFalse(variant_ready(self.party.image, 'medium'))
+        with mock.patch('apps.images.schedule_variants') as schedule_variants:
+            self.assertEqual(variant_url(self.party.image, 'medium', webp=True), self.party.image.url)
+        schedule_variants.assert_called_once_with(self.party.image)
+
+
+class StaticFilesMiddlewareTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.static_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, cls.static_root, ignore_errors=True)
+        override = override_settings(STATIC_ROOT=cls.static_root,
+                                     STATICFILES_STORAGE='ayaka.storage.CompressedManifestStaticFilesStorage')
+        override.enable()
+        cls.addClassCleanup(override.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    def setUp(self) -> None:
+        self.middleware = StaticFilesMiddleware(lambda request: HttpResponse('not static'))
+        self.factory = RequestFactory()
+        self.hashed_css = next(name for name in os.listdir(os.path.join(self.static_root, 'css'))
+                               if name.startswith('index.') and name.endswith('.css') and name != 'index.css')
+
+    def test_fingerprinted_file_is_immutable(self):
+        """Fingerprinted files must be served compressed and cached forever."""
+        response = self.middleware(self.factory.get(f'/static/css/{self.hashed_css}', HTTP_ACCEPT_ENCODING='gzip, br;q=0'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertEqual(int(response['Content-Length']), len(b''.join(response.streaming_content)))
+
+    def test_identity_and_not_modified(self):
+        """Clients without gzip get the original file and a matching ETag gets a 304."""
+        response = self.middleware(self.factory.get('/static/css/index.css'))
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=3600')
+        response = self.middleware(self.factory.get('/static/css/index.css', HTTP_IF_NONE_MATCH=response['ETag']))
+        self.assertEqual(response.status_code, 304)
+
+    def test_unknown_path_goes_through(self):
+        """Anything that is not in the index must reach the rest of the application."""
+        response = self.middleware(self.factory.get('/static/missing.css'))
+        self.assertEqual(response.content, b'not static')
+
+
+class PageCacheTest(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        metrics.reset('pagecache.')
+        self.addCleanup(cache.clear)
+        NewArea.objects.create(name='first area')
+        User.objects.create_user(username='user', password='password')
+        User.objects.create_user(username='staff', password='password', is_staff=True)
+
+    def test_anonymous_page_is_cached_until_model_changes(self):
+        """A page must be served from the cache until one of its models is saved."""
+        self.assertEqual(self.client.get(reverse('area_list'))['X-Page-Cache'], 'miss')
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('area_list'))
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertContains(response, 'first area')
+        NewArea.objects.create(name='second area')
+        response = self.client.get(reverse('area_list'))
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'second area')
+        self.assertEqual(metrics.snapshot('pagecache.')['pagecache.hits'], 1)
+
+    def test_users_do_not_share_pages(self):
+        """Logged in users get their own copy, staff always get a freshly rendered page."""
+        self.client.get(reverse('area_list'))
+        self.client.login(username='user', password='password')
+        self.assertEqual(self.client.get(reverse('area_list'))['X-Page-Cache'], 'miss')
+        self.assertEqual(self.client.get(reverse('area_list'))['X-Page-Cache'], 'hit')
+        self.client.login(username='staff', password='password')
+        self.assertNotIn('X-Page-Cache', self.client.get(reverse('area_list')))
+
+    def test_login_does_not_invalidate(self):
+        """Only updating last_login must keep the cached pages."""
+        self.client.get(reverse('candidate_list'))
+        User.objects.get(username='user').save(update_fields=['last_login'])
+        self.assertEqual(self.client.get(reverse('candidate_list'))['X-Page-Cache'], 'hit')
+
+    def test_profile_only_invalidates_its_user(self):
+        """Saving a profile only invalidates the pages of its user, who sees it in the navbar."""
+        users = [User.objects.get(username='user'), User.objects.create_user(username='other', password='password')]
+        for user in users:
+            self.client.force_login(user)
+            self.client.get(reverse('area_list'))
+        users[0].newprofile.save()
+        self.assertEqual(self.client.get(reverse('area_list'))['X-Page-Cache'], 'hit')
+        self.client.force_login(users[0])
+        self.assertEqual(self.client.get(reverse('area_list'))['X-Page-Cache'], 'miss')
+
+    def test_process_local_cache_warning(self):
+        """The deploy checks warn about a cache that the processes do not share."""
+        self.assertEqual([warning.id for warning in check_shared_cache(None)], ['apps.W001'])
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+                                                   'LOCATION': 'redis://127.0.0.1:6379/1'}}):
+            self.assertEqual(check_shared_cache(None), [])
+
+    def test_election_page_expires_when_election_starts(self):
+        """An election page must not be cached past the start of an upcoming election."""
+        election = NewElection.objects.create(name='upcoming', description='',
+                                              start_date=timezone.now() + timezone.timedelta(hours=1),
+                                              end_date=timezone.now() + timezone.timedelta(hours=2))
+        self.assertEqual(next_election_boundary(), election.start_date)
+        self.client.get(reverse('election_list'))
+        self.assertEqual(self.client.get(reverse('election_list'))['X-Page-Cache'], 'hit')
+        with mock.patch('apps.pagecache.time.time', return_value=election.start_date.timestamp() + 1):
+            self.assertEqual(self.client.get(reverse('election_list'))['X-Page-Cache'], 'miss')
+
+
+@mock.patch('ayaka.db_router.get_replica_aliases', return_value=['replica1', 'replica2'])
+class ReplicaRouterTest(TestCase):
+    def setUp(self) -> None:
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def route(self, request):
+        """Run a request through the middleware and return where the view would read from."""
+        request.resolver_match = resolve(request.path_info)
+        middleware = ReplicaRoutingMiddleware(lambda r: HttpResponse(self.router.db_for_read(NewArea)))
+        self.assertIsNone(middleware.process_view(request, None, (), {}))
+        return middleware(request)
+
+    def test_router(self, replicas):
+        """Reads go to a replica only inside use_replica, writes always go to the primary."""
+        self.assertEqual(self.router.db_for_read(NewArea), 'default')
+        with use_replica():
+            self.assertIn(self.router.db_for_read(NewArea), ('replica1', 'replica2'))
+            self.assertEqual(self.router.db_for_write(NewArea), 'default')
+        self.assertEqual(self.router.db_for_read(NewArea), 'default')
+        self.assertFalse(self.router.allow_migrate('replica1', 'apps'))
+        self.assertTrue(self.router.allow_migrate('default', 'apps'))
+
+    def test_read_only_view_uses_replica(self, replicas):
+        """A GET to a read-only view reads from a replica, the vote page does not."""
+        self.assertIn(self.route(self.factory.get(reverse('area_list'))).content, (b'replica1', b'replica2'))
+        self.assertEqual(self.route(self.factory.get(reverse('vote', kwargs={'election_id': 1}))).content, b'default')
+        self.assertEqual(self.router.db_for_read(NewArea), 'default')
+
+    def test_sticky_after_write(self, replicas):
+        """A client that just wrote keeps reading from the primary."""
+        response = self.route(self.factory.post(reverse('vote', kwargs={'election_id': 1})))
+        self.assertIn('read_primary', response.cookies)
+        request = self.factory.get(reverse('area_list'))
+        request.COOKIES['read_primary'] = response.cookies['read_primary'].value
+        self.assertEqual(self.route(request).content, b'default')
+
+
+ADMISSION_TEST_SETTINGS = {
+    'vote': {'url_names': ('vote',), 'concurrency': 1, 'queue': 0, 'queue_timeout': 1, 'rate': 0.001, 'burst': 2,
+             'limit_by': ('user',)},
+    'login': {'url_names': ('login', 'knox_login_login_login'), 'concurrency': 1, 'queue': 0, 'queue_timeout': 1,
+              'rate': 0.001, 'burst': 2, 'limit_by': ('address', 'citizen_id')},
+}
+
+
+@override_settings(ADMISSION_CONTROL=ADMISSION_TEST_SETTINGS)
+class AdmissionControlTest(TestCase):
+    def setUp(self) -> None:
+        self.factory = RequestFactory()
+        self.url = reverse('vote', kwargs={'election_id': 1})
+        metrics.reset('admission.')
+
+    def test_limiter(self):
+        """Requests over the concurrency limit wait in the queue, and are rejected when it is full or they time out."""
+        limiter = ConcurrencyLimiter('test', concurrency=1, queue_size=1, queue_timeout=0.05)
+        self.assertEqual(limiter.acquire(), ADMITTED)
+        self.assertEqual(limiter.acquire(), TIMED_OUT)
+        limiter.queued = 1
+        self.assertEqual(limiter.acquire(), QUEUE_FULL)
+        limiter.queued = 0
+        limiter.queue_timeout = 5
+        threading.Timer(0.05, limiter.release).start()
+        self.assertEqual(limiter.acquire(), ADMITTED)
+        self.assertEqual(limiter.in_flight, 1)
+        self.assertEqual(metrics.snapshot('admission.test.rejected')['admission.test.rejected'], 2)
+
+    def test_token_buckets(self):
+        """A client can send a burst of requests, then has to wait for the bucket to refill."""
+        buckets = TokenBuckets(rate=1, burst=2)
+        self.assertEqual(buckets.take('a'), 0)
+        self.assertEqual(buckets.take('a'), 0)
+        self.assertGreater(buckets.take('a'), 0)
+        self.assertEqual(buckets.take('b'), 0)
+
+    def test_busy_endpoint(self):
+        """A vote sent while the only slot is in use gets a 503 with Retry-After."""
+        def view(request):
+            nested = middleware(self.factory.post(self.url))
+            self.assertEqual(nested.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+            self.assertEqual(nested['Retry-After'], '1')
+            return HttpResponse('voted')
+
+        middleware = AdmissionControlMiddleware(view)
+        self.assertEqual(middleware(self.factory.post(self.url)).content, b'voted')
+        # The slot is free again.
+        self.assertEqual(middleware.endpoints['vote'].limiter.in_flight, 0)
+        self.assertEqual(metrics.snapshot('admission.vote.rejected')['admission.vote.rejected'], 1)
+
+    def test_rate_limit(self):
+        """A voter over its rate gets a 429, other voters and other methods are not limited."""
+        middleware = AdmissionControlMiddleware(lambda request: HttpResponse('voted'))
+        voters = [User.objects.create_user(username='1001'), User.objects.create_user(username='1002')]
+
+        def vote(user, method='post', url=self.url):
+            request = getattr(self.factory, method)(url)
+            request.user = user
+            response = middleware(request)
+            return middleware.process_view(request, None, (), {}) or response
+        for _ in range(2):
+            self.assertEqual(vote(voters[0]).status_code, status.HTTP_200_OK)
+        response = vote(voters[0])
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+        # From the same address.
+        self.assertEqual(vote(voters[1]).status_code, status.HTTP_200_OK)
+        self.assertEqual(vote(voters[0], 'get').status_code, status.HTTP_200_OK)
+        self.assertEqual(vote(voters[0], url=reverse('area_list')).status_code, status.HTTP_200_OK)
+
+    def test_token_rate_limit(self):
+        """API voters are limited per user from their knox token, not together by their shared address."""
+        middleware = AdmissionControlMiddleware(lambda request: HttpResponse('voted'))
+        tokens = [AuthToken.objects.create(User.objects.create_user(username=f'100{number}'))[1]
+                  for number in range(2)]
+
+        def vote(token):
+            request = self.factory.post(self.url, REMOTE_ADDR='10.0.0.1', HTTP_AUTHORIZATION=f'Token {token}')
+            request.user = AnonymousUser()
+            response = middleware(request)
+            return (middleware.process_view(request, None, (), {}) or response).status_code
+        self.assertEqual([vote(token) for token in tokens for _ in range(3)],
+                         [status.HTTP_200_OK, status.HTTP_200_OK, status.HTTP_429_TOO_MANY_REQUESTS] * 2)
+        # An invalid token is limited by its address.
+        self.assertEqual([vote('invalid') for _ in range(3)],
+                         [status.HTTP_200_OK, status.HTTP_200_OK, status.HTTP_429_TOO_MANY_REQUESTS])
+
+    def test_login_rate_limit(self):
+        """Logins are limited per address and per citizen ID, whatever credentials or cookies they send."""
+        middleware = AdmissionControlMiddleware(lambda request: HttpResponse('logged in'))
+        url = reverse('login')
+
+        def login(username, address='10.0.0.1', session=None):
+            self.factory.cookies[settings.SESSION_COOKIE_NAME] = session or username
+            return middleware(self.factory.post(url, {'username': username, 'password': 'guess'},
+                                                REMOTE_ADDR=address)).status_code
+        for number in range(2):
+            self.assertEqual(login(f'{number}'), status.HTTP_200_OK)
+        self.assertEqual(login('2'), status.HTTP_429_TOO_MANY_REQUESTS)
+        for number in range(2):
+            self.assertEqual(login('1001', address=f'10.0.1.{number}', session=f'{number}'), status.HTTP_200_OK)
+        self.assertEqual(login('1001', address='10.0.2.1'), status.HTTP_429_TOO_MANY_REQUESTS)
+        credentials = base64.b64encode(b'1001:guess').decode()
+        response = middleware(self.factory.post(reverse('knox_login_login_login'), REMOTE_ADDR='10.0.2.2',
+                                                HTTP_AUTHORIZATION=f'Basic {credentials}'))
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @override_settings(ADMISSION_CLIENT_IP_HEADER='HTTP_X_FORWARDED_FOR', ADMISSION_TRUSTED_PROXIES=1)
+    def test_client_address(self):
+        """Behind a proxy, the client is the address the proxy added, not the ones sent by the client."""
+        request = self.factory.post(self.url, HTTP_X_FORWARDED_FOR='1.2.3.4, 10.0.0.5', REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(client_address(request), '10.0.0.5')
+        with override_settings(ADMISSION_TRUSTED_PROXIES=2):
+            self.assertEqual(client_address(request), '1.2.3.4')
+        self.assertEqual(client_address(self.factory.post(self.url, REMOTE_ADDR='10.0.0.1')), '10.0.0.1')
+
+
+class AllocationTest(TestCase):
+    def setUp(self) -> None:
+        now = timezone.now()
+        self.election = NewElection.objects.create(name="E1", start_date=now - timezone.timedelta(days=2),
+                                                   end_date=now - timezone.timedelta(days=1))
+        self.areas = [NewArea.objects.create(name=f"A{number}") for number in range(3)]
+        self.parties = [NewParty.objects.create(name=f"PT{number}") for number in range(3)]
+        for number, (area, party, vote) in enumerate([(0, 0, 10), (0, 1, 5), (1, 1, 8), (1, 2, 2), (2, 0, 3)]):
+            user = User.objects.create_user(username=f"c{number}", password="BadPassword")
+            candidate = NewCandidate.objects.create(user=user, area=self.areas[area], party=self.parties[party])
+            VoteResultCandidate.objects.create(election=self.election, candidate=candidate, vote=vote)
+        for party, vote in zip(self.parties, [60, 30, 10]):
+            VoteResultParty.objects.create(election=self.election, party=party, vote=vote)
+
+    def test_allocation_methods(self):
+        """The methods give the textbook results, and allocate every scenario of a batch on its own."""
+        votes = [47000, 16000, 15900, 12000, 6000, 3100]
+        self.assertEqual(allocate(votes, 10, LARGEST_REMAINDER).tolist(), [5, 2, 1, 1, 1, 0])
+        self.assertEqual(allocate(votes, 10, DHONDT).tolist(), [5, 2, 2, 1, 0, 0])
+        self.assertEqual(allocate(votes, 10, SAINTE_LAGUE).tolist(), [4, 2, 2, 1, 1, 0])
+        self.assertEqual(allocate([votes, votes[::-1]], 10, DHONDT).tolist(), [[5, 2, 2, 1, 0, 0], [0, 0, 1, 2, 2, 5]])
+        self.assertEqual(allocate([0, 0], 10).tolist(), [0, 0])
+
+    def test_party_list_result(self):
+        """The areas a party won are taken from the seats it is entitled to."""
+        matrix = VoteMatrix.from_election(self.election.id)
+        self.assertEqual(matrix.area_votes[:3].tolist(), [[10, 0, 3], [5, 8, 0], [0, 2, 0]])
+        result = party_list_result(matrix, 10)
+        self.assertEqual(result['entitled'].tolist(), [6, 3, 1])
+        self.assertEqual(result['won'].tolist(), [2, 1, 0])
+        self.assertEqual(result['list_seats'].tolist(), [4, 2, 1])
+
+    def test_simulation(self):
+        """Without any swing every scenario is the election itself, and a seed makes a run reproducible."""
+        matrix = VoteMatrix.from_election(self.election.id)
+        result = simulate(matrix, 50, 10, swing=0)
+        self.assertEqual(result['mean'].tolist(), [6, 3, 1])
+        self.assertEqual(result['majority'].tolist(), [1, 0, 0])
+        first = simulate(matrix, 200, 10, swing=0.5, seed=1)
+        second = simulate(matrix, 200, 10, swing=0.5, seed=1)
+        self.assertEqual(first['mean'].tolist(), second['mean'].tolist())
+        self.assertGreater(first['std'].sum(), 0)
+
+
+class LeaderboardTest(TestCase):
+    def setUp(self) -> None:
+        clear_leaderboards()
+        now = timezone.now()
+        self.election = NewElection.objects.create(name="E1", start_date=now - timezone.timedelta(days=1),
+                                                   end_date=now + timezone.timedelta(days=1))
+        self.area = NewArea.objects.create(name="A1")
+        self.parties = [NewParty.objects.create(name="PT1"), NewParty.objects.create(name="PT2")]
+        self.candidates = []
+        for number, party in enumerate(self.parties):
+            user = User.objects.create_user(username=f"c{number}", password="BadPassword")
+            self.candidates.append(NewCandidate.objects.create(user=user, area=self.area, party=party))
+        VoteResultCandidate.objects.create(election=self.election, candidate=self.candidates[0], vote=2)
+        VoteResultCandidate.objects.create(election=self.election, candidate=self.candidates[1], vote=1)
+        VoteResultParty.objects.create(election=self.election, party=self.parties[0], vote=2)
+        VoteResultParty.objects.create(election=self.election, party=self.parties[1], vote=1)
+        self.changes = []
+        leader_changed.connect(self.on_leader_changed)
+        self.addCleanup(leader_changed.disconnect, self.on_leader_changed)
+
+    def on_leader_changed(self, sender, election_id, area_id, previous, current, **kwargs):
+        self.changes.append((area_id, previous, current))
+
+    def test_build(self):
+        """The leaderboard is built from the tally tables."""
+        leaderboard = get_leaderboard(self.election)
+        self.assertEqual(leaderboard.leader(self.area.id), self.candidates[0].id)
+        self.assertEqual(leaderboard.margin(self.area.id), 1)
+        self.assertEqual(leaderboard.party_wins[self.parties[0].id], 1)
+        self.assertEqual(leaderboard.party_votes[self.parties[1].id], 1)
+
+    def test_record_vote(self):
+        """Recorded ballots move the leader and the area win of its party, and send leader_changed."""
+        leaderboard = get_leaderboard(self.election)
+        record_vote(self.election.id, self.candidates[1].id, self.parties[1].id)
+        # A tie goes to the candidate with the smallest id.
+        self.assertEqual(leaderboard.leader(self.area.id), self.candidates[0].id)
+        record_vote(self.election.id, self.candidates[1].id, self.parties[1].id)
+        self.assertEqual(leaderboard.leader(self.area.id), self.candidates[1].id)
+        self.assertEqual(leaderboard.party_wins[self.parties[0].id], 0)
+        self.assertEqual(leaderboard.party_wins[self.parties[1].id], 1)
+        self.assertEqual(leaderboard.party_votes[self.parties[1].id], 3)
+        self.assertEqual(self.changes, [(self.area.id, self.candidates[0].id, self.candidates[1].id)])
+
+    def test_reconcile(self):
+        """A stale leaderboard is rebuilt from the tally tables and reports the leaders that changed meanwhile."""
+        get_leaderboard(self.election)
+        VoteResultCandidate.objects.filter(candidate=self.candidates[1]).update(vote=5)
+        with override_settings(LEADERBOARD_RECONCILE_SECONDS=0):
+            leaderboard = get_leaderboard(self.election)
+        self.assertEqual(leaderboard.leader(self.area.id), self.candidates[1].id)
+        self.assertEqual(self.changes, [(self.area.id, self.candidates[0].id, self.candidates[1].id)])
+
+    def test_party_result_uses_leaderboard(self):
+        """The party-list result counts the votes recorded by this process without reading the tally tables."""
+        get_leaderboard(self.election)
+        record_vote(self.election.id, self.candidates[1].id, self.parties[1].id)
+        with self.assertNumQueries(2):
+            result = calculate_election_party_result(self.election.id)
+        self.assertEqual(result['calculation_detail']['total_vote'], 4)
+
+
+class TurnoutTest(TestCase):
+    def setUp(self) -> None:
+        now = timezone.now()
+        self.election = NewElection.objects.create(name="E1", start_date=now - timezone.timedelta(days=1),
+                                                   end_date=now + timezone.timedelta(days=1))
+        self.areas = [NewArea.objects.create(name="A1"), NewArea.objects.create(name="A2")]
+        self.users = []
+        for number, area in enumerate([self.areas[0], self.areas[0], self.areas[1]]):
+            user = User.objects.create_user(username=f"u{number}", password="BadPassword")
+            user.newprofile.area = area
+            user.newprofile.save()
+            self.users.append(user)
+
+    def test_record_turnout(self):
+        """The first vote of an area creates its counters with its eligible voters, the next ones increment them."""
+        record_turnout(self.election.id, self.areas[0].id)
+        record_turnout(self.election.id, self.areas[0].id)
+        record_turnout(self.election.id, None)
+        turnout = AreaTurnout.objects.get(election=self.election, area=self.areas[0])
+        self.assertEqual((turnout.voted, turnout.eligible), (2, 2))
+        self.assertEqual(turnout.rate, 1.0)
+        self.assertEqual(AreaTurnout.objects.count(), 1)
+
+    def test_rollup_turnout(self):
+        """The rollup recounts every area from the votes and the profiles."""
+        VoteCheck.objects.create(election=self.election, user=self.users[2], area=self.areas[1])
+        record_turnout(self.election.id, self.areas[0].id)
+        self.users[1].newprofile.blacklist = True
+        self.users[1].newprofile.save()
+        self.assertEqual(rollup_turnout(self.election.id), 2)
+        self.assertEqual([(row.area.name, row.voted, row.eligible) for row in get_turnout(self.election.id)],
+                         [("A1", 0, 1), ("A2", 1, 1)])
+
+    def test_vote_records_turnout(self):
+        """Voting stores the area of the voter and counts it in the turnout page."""
+        candidate_user = User.objects.create_user(username="candidate", password="BadPassword")
+        candidate = NewCandidate.objects.create(user=candidate_user, area=self.areas[0])
+        party = NewParty.objects.create(name="PT1")
+        self.client.login(username="u0", password="BadPassword")
+        self.client.post(reverse('vote', args=[self.election.id]), {'candidate': candidate.id, 'party': party.id})
+        self.assertEqual(VoteCheck.objects.get(user=self.users[0]).area, self.areas[0])
+        response = self.client.get(reverse('election_turnout', args=[self.election.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total'], {'voted': 1, 'eligible': 3, 'rate': 1 / 3})
+
+    def test_vote_counted_once(self):
+        """A second vote that passed the voted check is refused without counting its ballot."""
+        candidate_user = User.objects.create_user(username="candidate", password="BadPassword")
+        candidate = NewCandidate.objects.create(user=candidate_user, area=self.areas[0])
+        party = NewParty.objects.create(name="PT1")
+        self.client.login(username="u0", password="BadPassword")
+        self.client.post(reverse('vote', args=[self.election.id]), {'candidate': candidate.id, 'party': party.id})
+        with mock.patch('django.db.models.QuerySet.exists', return_value=False):
+            self.client.post(reverse('vote', args=[self.election.id]), {'candidate': candidate.id, 'party': party.id})
+        self.assertEqual(VoteResultCandidate.objects.get(election=self.election, candidate=candidate).vote, 1)
+        self.assertEqual(VoteResultParty.objects.get(election=self.election, party=party).vote, 1)
+        self.assertEqual(AreaTurnout.objects.get(election=self.election, area=self.areas[0]).voted, 1)
+
+    def test_counters_created_with_election(self):
+        """A new election gets zero-vote counters for every area, with their eligible voters."""
+        now = timezone.now()
+        election = NewElection.objects.create(name="E2", start_date=now, end_date=now + timezone.timedelta(days=1))
+        self.assertEqual(sorted(AreaTurnout.objects.filter(election=election).values_list('area__name', 'voted',
+                                                                                        'eligible')),
+                         [("A1", 0, 2), ("A2", 0, 1)])
+
+    def test_read_does_not_recount(self):
+        """Reading the turnout never writes, an area without counters is read as no vote yet."""
+        record_turnout(self.election.id, self.areas[0].id)
+        with self.assertNumQueries(3):
+            turnout = get_turnout(self.election.id)
+        self.assertEqual([(row.area.name, row.voted, row.eligible) for row in turnout],
+                         [("A1", 1, 2), ("A2", 0, 1)])
+        self.assertEqual(AreaTurnout.objects.count(), 1)
+
+    def test_rollup_command(self):
+        """The command recounts the ongoing elections."""
+        call_command('rollupturnout', stdout=open(os.devnull, 'w'))
+        self.assertEqual(AreaTurnout.objects.filter(election=self.election).count(), 2)
+
+
+class VoteRateTest(TestCase):
+    def setUp(self) -> None:
+        self.start = timezone.datetime(2022, 1, 1, 8, 0, tzinfo=timezone.utc)
+        self.election = NewElection.objects.create(name="E1", start_date=self.start,
+                                                   end_date=self.start + timezone.timedelta(days=1))
+        self.areas = [NewArea.objects.create(name="A1"), NewArea.objects.create(name="A2")]
+        self.parties = [NewParty.objects.create(name="PT1"), NewParty.objects.create(name="PT2")]
+        for minutes, area, party in [(0, 0, 0), (0, 0, 0), (0, 1, 1), (1, 0, 1), (61, 1, 0)]:
+            record_vote_rate(self.election.id, self.areas[area].id, self.parties[party].id,
+                             self.start + timezone.timedelta(minutes=minutes, seconds=30))
+
+    def test_record_vote_rate(self):
+        """Ballots of the same quarter share the bucket of their area and the bucket of their party."""
+        self.assertEqual(AreaVoteRateBucket.objects.count(), 3)
+        self.assertEqual(PartyVoteRateBucket.objects.count(), 3)
+        self.assertEqual(AreaVoteRateBucket.objects.get(area=self.areas[0]).count, 3)
+        self.assertEqual(PartyVoteRateBucket.objects.get(party=self.parties[1]).count, 2)
+
+    @override_settings(VOTE_RATE_MIN_COUNT=1)
+    def test_series(self):
+        """Series are summed per quarter or per hour, in total or per area or party."""
+        end = self.start + timezone.timedelta(hours=2)
+        total = vote_rate_series(self.election.id, self.start, end)
+        self.assertEqual([count for _, count in total[None]], [4, 1])
+        by_party = vote_rate_series(self.election.id, self.start, end, VoteRateBucket.HOUR, GROUP_PARTY)
+        self.assertEqual(by_party[self.parties[0].id], [(self.start, 2), (self.start + timezone.timedelta(hours=1), 1)])
+        self.assertEqual(by_party[self.parties[1].id], [(self.start, 2)])
+        by_area = vote_rate_series(self.election.id, self.start, self.start + timezone.timedelta(minutes=15),
+                                   group_by=GROUP_AREA)
+        self.assertEqual(by_area, {self.areas[0].id: [(self.start, 3)], self.areas[1].id: [(self.start, 1)]})
+
+    @override_settings(VOTE_RATE_MIN_COUNT=2)
+    def test_small_party_counts_hidden(self):
+        """The counts of a party below VOTE_RATE_MIN_COUNT are None, the other series are not hidden."""
+        end = self.start + timezone.timedelta(hours=2)
+        by_party = vote_rate_series(self.election.id, self.start, end, VoteRateBucket.HOUR, GROUP_PARTY)
+        self.assertEqual(by_party[self.parties[0].id],
+                         [(self.start, 2), (self.start + timezone.timedelta(hours=1), None)])
+        by_area = vote_rate_series(self.election.id, self.start, end, VoteRateBucket.HOUR, GROUP_AREA)
+        self.assertEqual(by_area[self.areas[1].id], [(self.start, 1), (self.start + timezone.timedelta(hours=1), 1)])
+
+    def test_downsample(self):
+        """Only the whole hours before the cutoff are folded, and hourly series are unchanged by it."""
+        end = self.start + timezone.timedelta(hours=2)
+        before = vote_rate_series(self.election.id, self.start, end, VoteRateBucket.HOUR, GROUP_TOTAL)
+        self.assertEqual(downsample(self.start + timezone.timedelta(minutes=90)), 4)
+        self.assertEqual(AreaVoteRateBucket.objects.filter(resolution=VoteRateBucket.HOUR).count(), 2)
+        self.assertEqual(PartyVoteRateBucket.objects.filter(resolution=VoteRateBucket.HOUR).count(), 2)
+        self.assertEqual(vote_rate_series(self.election.id, self.start, end, VoteRateBucket.HOUR), before)
+        # A late quarter bucket of a folded hour is added to it.
+        record_vote_rate(self.election.id, self.areas[0].id, self.parties[0].id, self.start)
+        downsample(self.start + timezone.timedelta(minutes=90))
+        self.assertEqual(AreaVoteRateBucket.objects.get(resolution=VoteRateBucket.HOUR, area=self.areas[0]).count, 4)
+        self.assertEqual(PartyVoteRateBucket.objects.get(resolution=VoteRateBucket.HOUR, party=self.parties[0]).count,
+                         3)
+        call_command('downsamplevoterates', retention=0, stdout=open(os.devnull, 'w'))
+        self.assertFalse(AreaVoteRateBucket.objects.filter(resolution=VoteRateBucket.QUARTER).exists())
+        self.assertFalse(PartyVoteRateBucket.objects.filter(resolution=VoteRateBucket.QUARTER).exists())
+
+
+class UserDirectoryTest(TestCase):
+    def setUp(self) -> None:
+        self.staff = User.objects.create_superuser(username='staff', password='password')
+        self.area = NewArea.objects.create(name='Bangkok 1')
+        self.users = []
+        for number, (first_name, last_name) in enumerate([('Ayaka', 'Kamisato'), ('Ayato', 'Kamisato'),
+                                                          ('Hu', 'Tao')]):
+            user = User.objects.create_user(username=f'110{number}', password='password', first_name=first_name,
+                                            last_name=last_name)
+            self.users.append(user)
+        self.users[2].newprofile.area = self.area
+        self.users[2].newprofile.save()
+
+    def test_search_users(self):
+        """Users are found by the prefix of their username, names, full name or area."""
+        def usernames(query):
+            return sorted(search_users(query).values_list('username', flat=True))
+        self.assertEqual(usernames('1101'), ['1101'])
+        self.assertEqual(usernames('Aya'), ['1100', '1101'])
+        self.assertEqual(usernames('Kami'), ['1100', '1101'])
+        self.assertEqual(usernames('Ayato Ka'), ['1101'])
+        self.assertEqual(usernames('Bangkok'), ['1102'])
+        self.assertEqual(usernames('yaka'), [])
+
+    def test_keyset_page(self):
+        """Pages follow each other by id in both directions."""
+        users = User.objects.all()
+        first = keyset_page(users, size=2)
+        self.assertEqual([user.id for user in first['items']], [self.staff.id, self.users[0].id])
+        self.assertIsNone(first['previous'])
+        second = keyset_page(users, after=first['next'], size=2)
+        self.assertEqual([user.id for user in second['items']], [self.users[1].id, self.users[2].id])
+        self.assertIsNone(second['next'])
+        back = keyset_page(users, before=second['previous'], size=2)
+        self.assertEqual(back['items'], first['items'])
+        self.assertIsNone(back['previous'])
+        self.assertEqual(back['next'], first['next'])
+
+    def test_utils_page(self):
+        """The utility menu searches the directory and only shows the latest logs."""
+        self.client.login(username='staff', password='password')
+        UtilityMissionLog.objects.bulk_create([UtilityMissionLog(field='test', user=self.staff)
+                                               for _ in range(60)])
+        response = self.client.get(reverse('utils'), {'q': 'Hu'})
+        self.assertEqual([user.username for user in response.context['users_page']['items']], ['1102'])
+        self.assertEqual(len(response.context['utility_log']), 50)
+        self.assertFalse(response.context['import_legacy_data'])
+        self.assertEqual(self.client.get(reverse('utils'), {'after': 'x'}).status_code, 200)
+
+
+class AutocompleteTest(TestCase):
+    def setUp(self) -> None:
+        self.staff = User.objects.create_superuser(username='staff', password='password')
+        self.area = NewArea.objects.create(name='Bangkok 1')
+        self.citizens = [User.objects.create_user(username=f'1100{number}', password='password')
+                         for number in range(3)]
+        self.citizens[2].newprofile.blacklist = True
+        self.citizens[2].newprofile.save()
+
+    def test_autocomplete(self):
+        """Staff get a page of matching options with the cursor of the next page."""
+        self.client.login(username='staff', password='password')
+        url = reverse('autocomplete', args=['citizen'])
+        with mock.patch('apps.views.AUTOCOMPLETE_PAGE_SIZE', 1):
+            first = self.client.get(url, {'q': '1100'}).json()
+            second = self.client.get(url, {'q': '1100', 'after': first['next']}).json()
+        self.assertEqual(first['results'], [{'id': self.citizens[0].id, 'text': '11000'}])
+        # Blacklisted citizens cannot be candidates.
+        self.assertEqual(second, {'results': [{'id': self.citizens[1].id, 'text': '11001'}], 'next': None})
+        self.assertEqual(self.client.get(reverse('autocomplete', args=['area']), {'q': 'Bang'}).json()['results'],
+                         [{'id': self.area.id, 'text': 'Bangkok 1'}])
+        self.assertEqual(self.client.get(reverse('autocomplete', args=['nothing'])).status_code, 404)
+
+    def test_autocomplete_staff_only(self):
+        """Other users cannot search the citizens."""
+        self.client.login(username='11000', password='password')
+        self.assertEqual(self.client.get(reverse('autocomplete', args=['citizen'])).status_code, 403)
+
+    def test_form_renders_selected_option_only(self):
+        """The candidate form renders the selected citizen only, and still validates any eligible citizen."""
+        form = CandidateForm(initial={'user': self.citizens[1].id})
+        with self.assertNumQueries(1):
+            html = str(form['user'])
+        self.assertIn('value="%d" selected' % self.citizens[1].id, html)
+        self.assertNotIn('value="%d"' % self.citizens[0].id, html)
+        self.assertIn('data-autocomplete-url="%s"' % reverse('autocomplete', args=['citizen']), html)
+        form = CandidateForm({'user': self.citizens[0].id, 'description': 'D', 'area': self.area.id})
+        self.assertTrue(form.is_valid(), form.errors)
+        form = CandidateForm({'user': self.citizens[2].id, 'description': 'D', 'area': self.area.id})
+        self.assertIn('user', form.errors)
+
+
+class ImportTimeTest(TestCase):
+    REPORT = (
+        'import time: self [us] | cumulative | imported package\n'
+        'import time:       120 |        120 |   requests.compat\n'
+        'import time:       300 |        420 | requests\n'
+        'import time:        50 |         50 | apis.serializers\n'
+    )
+
+    def test_parse_importtime(self):
+        """The report of -X importtime is parsed with the depth of every import."""
+        modules = parse_importtime(self.REPORT)
+        self.assertEqual(modules, [ModuleImport('requests.compat', 1, 120, 120), ModuleImport('requests', 0, 300, 420),
+                                   ModuleImport('apis.serializers', 0, 50, 50)])
+        self.assertEqual([module.name for module in top_imports(modules)], ['requests', 'apis.serializers'])
+
+    @override_settings(IMPORT_TIME_BUDGETS={SETUP: 100})
+    def test_benchmark_over_budget(self):
+        """The benchmark fails when a target is over its budget."""
+        measurement = ImportMeasurement(SETUP, 150.0, parse_importtime(self.REPORT))
+        output = io.StringIO()
+        with mock.patch('apps.management.commands.benchmarkimports.benchmark_import', return_value=measurement):
+            with self.assertRaisesMessage(CommandError, SETUP):
+                call_command('benchmarkimports', stdout=output)
+        self.assertIn('requests', output.getvalue())
+
+    @override_settings(IMPORT_TIME_BUDGETS={SETUP: 200})
+    def test_benchmark_within_budget(self):
+        measurement = ImportMeasurement(SETUP, 150.0, [])
+        output = io.StringIO()
+        with mock.patch('apps.management.commands.benchmarkimports.benchmark_import', return_value=measurement):
+            call_command('benchmarkimports', stdout=output)
+        self.assertIn('150.0 ms (budget 200 ms)', output.getvalue())
+
+    def test_lazy_imports(self):
+        """The data commands do not import the HTTP clients, the URLs do not import the schema generator nor NumPy."""
+        script = 'import json, sys, django; django.setup(); ' \
+                 'import apps.management.commands.importarea, users.jobs; ' \
+                 'commands = sorted({"requests", "httpx", "rest_framework.compat"} & set(sys.modules)); ' \
+                 'import ayaka.urls; ' \
+                 'urls = sorted({"httpx", "drf_yasg.codecs", "drf_yasg.generators", "numpy"} & set(sys.modules)); ' \
+                 'print(json.dumps([commands, urls]))'
+        environment = dict(os.environ, DJANGO_SETTINGS_MODULE='ayaka.settings', ASYNC_VIEWS='False')
+        process = subprocess.run([sys.executable, '-c', script], env=environment, capture_output=True, text=True,
+                                 cwd=os.path.dirname(os.path.dirname(__file__)))
+        self.assertEqual(process.returncode, 0, process.stderr)
+        self.assertEqual(process.stdout.strip(), '[[], []]')
+
+
+@override_settings(WARM_UP=True)
+class WarmUpTest(TestCase):
+    def setUp(self) -> None:
+        reset_warm_up()
+        self.addCleanup(reset_warm_up)
+        clear_leaderboards()
+        self.addCleanup(clear_leaderboards)
+
+    def test_readiness(self):
+        """The process is only ready once it is warmed up."""
+        response = self.client.get(reverse('readiness'))
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(response.json()['ready'])
+        warm_up(['urls', 'templates'])
+        response = self.client.get(reverse('readiness'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['ready'])
+        self.assertEqual(set(response.json()['steps']), {'urls', 'templates'})
+
+    @override_settings(WARM_UP=False)
+    def test_ready_without_warm_up(self):
+        warm_up_process()
+        self.assertEqual(self.client.get(reverse('readiness')).status_code, 200)
+        self.assertEqual(warm_up_report()['steps'], {})
+
+    def test_warm_up_steps(self):
+        """The URLs, the templates and the leaderboards of the ongoing elections are warmed up."""
+        election = NewElection.objects.create(name='Election', start_date=timezone.now() - timezone.timedelta(days=1),
+                                              end_date=timezone.now() + timezone.timedelta(days=1))
+        report = warm_up(['urls', 'templates', 'leaderboards'])
+        for step in report['steps'].values():
+            self.assertIsNone(step['error'])
+        self.assertGreater(report['steps']['urls']['count'], 0)
+        self.assertGreater(report['steps']['templates']['count'], 0)
+        self.assertEqual(report['steps']['leaderboards']['count'], 1)
+        with mock.patch('apps.leaderboard.Leaderboard.build') as build:
+            get_leaderboard(election)
+        build.assert_not_called()
+
+    def test_failed_step(self):
+        """A step that fails is reported, the process is still ready."""
+        def fail():
+            raise ValueError('Broken')
+        with mock.patch.dict(WARM_UP_STEPS, {'broken': WarmUpStep(fail, 'Broken step')}), \
+                self.assertLogs('apps.warmup', 'ERROR'):
+            report = warm_up(['broken'])
+        self.assertTrue(report['ready'])
+        self.assertEqual(report['steps']['broken']['error'], 'Broken')
+
+
+class ReferenceDataTest(TestCase):
+    def setUp(self) -> None:
+        clear_reference_data()
+        self.addCleanup(clear_reference_data)
+        self.areas = [NewArea.objects.create(name='A1'), NewArea.objects.create(name='A2')]
+        self.party = NewParty.objects.create(name='P1', description='', quote='')
+        self.candidates = [
+            NewCandidate.objects.create(user=User.objects.create_user(username=f'C{index}'), area=area,
+                                        party=self.party if index == 0 else None)
+            for index, area in enumerate(self.areas + self.areas[:1])]
+
+    def test_indexes(self):
+        reference = get_reference_data()
+        self.assertEqual(list(reference.areas), [area.id for area in self.areas])
+        self.assertEqual([candidate.id for candidate in reference.candidates_in_area(self.areas[0].id)],
+                         [self.candidates[0].id, self.candidates[2].id])
+        self.assertEqual([candidate.id for candidate in reference.candidates_in_party(self.party.id)],
+                         [self.candidates[0].id])
+        candidate = reference.candidates[self.candidates[0].id]
+        self.assertEqual(str(candidate), str(self.candidates[0]))
+        self.assertEqual(candidate.party.name, 'P1')
+        self.assertEqual(candidate.image.url, self.candidates[0].image.url)
+
+    def test_cached_until_changed(self):
+        """The reference data is only read again from the database after a change."""
+        reference = get_reference_data()
+        with self.assertNumQueries(0):
+            self.assertIs(get_reference_data(), reference)
+        area = NewArea.objects.create(name='A3')
+        self.assertIn(area.id, get_reference_data().areas)
+        area.delete()
+        self.assertNotIn(area.id, get_reference_data().areas)
+
+    def test_cache_cleared(self):
+        """Clearing the cache starts a new generation."""
+        get_reference_data()
+        cache.clear()
+        NewArea.objects.filter(id=self.areas[1].id).update(name='Renamed')
+        self.assertEqual(get_reference_data().areas[self.areas[1].id].name, 'Renamed')
+
+    def test_rebuilt_when_expired(self):
+        """A change that bumped no generation shows up once the reference data is older than its maximum age."""
+        get_reference_data()
+        NewArea.objects.filter(id=self.areas[1].id).update(name='Renamed')
+        self.assertEqual(get_reference_data().areas[self.areas[1].id].name, 'A2')
+        with override_settings(REFERENCE_DATA_MAX_AGE=0):
+            self.assertEqual(get_reference_data().areas[self.areas[1].id].name, 'Renamed')
+
+    def test_candidate_users_only(self):
+        """Only saving the user of a candidate bumps the generation, logging in does not."""
+        generation = get_generation()
+        User.objects.create_user(username='voter')
+        self.assertEqual(get_generation(), generation)
+        user = self.candidates[0].user
+        user.last_login = timezone.now()
+        user.save(update_fields=['last_login'])
+        self.assertEqual(get_generation(), generation)
+        user.first_name = 'Renamed'
+        user.save()
+        self.assertNotEqual(get_generation(), generation)
+        self.assertEqual(get_reference_data().candidates[self.candidates[0].id].user.first_name, 'Renamed')
+
+    def test_vote_forms(self):
+        """The vote forms offer the candidates of the area and the parties of the reference data."""
+        form = CandidateVoteForm({'candidate': self.candidates[1].id}, area=self.areas[0])
+        self.assertEqual([value for value, _ in form.fields['candidate'].choices],
+                         ['', self.candidates[0].id, self.candidates[2].id])
+        self.assertFalse(form.is_valid())
+        form = CandidateVoteForm({'candidate': self.candidates[2].id}, area=self.areas[0])
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.cleaned_data['candidate'], self.candidates[2].id)
+        form = PartyVoteForm({'party': self.party.id})
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.cleaned_data['party'], self.party.id)
+
+
+@override_settings(SINGLE_FLIGHT_WAIT_SECONDS=5)
+class SingleFlightTest(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.calls = []
+
+    def compute(self, value='new'):
+        self.calls.append(value)
+        return value
+
+    def test_fresh_value_computed_once(self):
+        self.assertEqual(single_flight('key', self.compute, 60), 'new')
+        self.assertEqual(single_flight('key', lambda: self.compute('other'), 60), 'new')
+        self.assertEqual(self.calls, ['new'])
+
+    def test_concurrent_callers_wait(self):
+        """The threads asking for a key at the same time wait for the one computing it."""
+        started = threading.Event()
+        release = threading.Event()
+
+        def compute():
+            started.set()
+            release.wait(5)
+            return self.compute()
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(single_flight('key', compute, 60)))
+                   for _ in range(5)]
+        threads[0].start()
+        started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(results, ['new'] * 5)
+        self.assertEqual(self.calls, ['new'])
+
+    def test_stale_while_revalidate(self):
+        """A stale value is served while another process computes it again, and computed again otherwise."""
+        cache.set(VALUE_KEY.format('key'), (0, 'old'), 60)
+        cache.add(LOCK_KEY.format('key'), 'other process')
+        self.assertEqual(single_flight('key', self.compute, 60, 60), 'old')
+        cache.delete(LOCK_KEY.format('key'))
+        self.assertEqual(single_flight('key', self.compute, 60, 60), 'new')
+        self.assertEqual(self.calls, ['new'])
+        self.assertIsNone(cache.get(LOCK_KEY.format('key')))
+
+    def test_wait_for_other_process(self):
+        """A missing value computed by another process is read from the cache when it is done."""
+        cache.add(LOCK_KEY.format('key'), 'other process')
+        timer = threading.Timer(0.1, cache.set, [VALUE_KEY.format('key'), (float('inf'), 'theirs'), 60])
+        timer.start()
+        self.addCleanup(timer.cancel)
+        self.assertEqual(single_flight('key', self.compute, 60), 'theirs')
+        self.assertEqual(self.calls, [])
+
+    def test_error(self):
+        """A failed computation is raised, and releases the lock for the next caller."""
+        with self.assertRaises(ZeroDivisionError):
+            single_flight('key', lambda: 1 / 0, 60)
+        self.assertIsNone(cache.get(LOCK_KEY.format('key')))
+        self.assertEqual(single_flight('key', self.compute, 60), 'new')
+
+    def test_election_party_result(self):
+        """The party-list result is computed once, and again when the election ends."""
+        now = timezone.now()
+        election = NewElection.objects.create(name='E1', start_date=now - timezone.timedelta(days=1),
+                                              end_date=now + timezone.timedelta(days=1))
+        with mock.patch('apps.utils.calculate_election_party_result', wraps=calculate_election_party_result) as \
+                calculate:
+            get_election_party_result(election)
+            get_election_party_result(election)
+            self.assertEqual(calculate.call_count, 1)
+            election.end_date = now
+            get_election_party_result(election)
+            self.assertEqual(calculate.call_count, 2)
+
+    def test_final_party_result_reconciled(self):
+        """The final party-list result is computed from a leaderboard rebuilt from the tally tables."""
+        now = timezone.now()
+        election = NewElection.objects.create(name='E1', start_date=now - timezone.timedelta(days=2),
+                                              end_date=now - timezone.timedelta(days=1))
+        with mock.patch('apps.utils.reconcile') as reconcile:
+            get_election_party_result(election)
+        reconcile.assert_called_once_with(election.id)
@@ -0,0 +1,105 @@
+"""
+Turnout of every area in an election, served from the ``AreaTurnout`` counters.
+
+The ``voted`` counter of an area is incremented in the transaction of every vote, and ``eligible`` is counted from the
+profiles of the area when its counters are created: for every area when the election is created, or by the first vote
+of an area added later. ``rollup_turnout`` recounts both from ``VoteCheck`` and ``NewProfile`` with two grouped
+queries, it is run by the ``rollupturnout`` command to fix any drift and to pick up profile changes. Reading the
+turnout never recounts, an area without counters has no vote yet.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from apps.models import AreaTurnout, NewArea, VoteCheck
+from users.models import NewProfile
+
+
+def eligible_voters():
+    """
+    Return the profiles that can vote: with an area, the right to vote and not blacklisted.
+    """
+    return NewProfile.objects.filter(area__isnull=False, right_to_vote=True, blacklist=False)
+
+
+def record_turnout(election_id: int, area_id: int):
+    """
+    Count a vote in the turnout of its area, call it in the transaction of the vote.
+    """
+    if area_id is None:
+        return
+    if AreaTurnout.objects.filter(election_id=election_id, area_id=area_id).update(voted=F('voted') + 1):
+        return
+    try:
+        with transaction.atomic():
+            AreaTurnout.objects.create(election_id=election_id, area_id=area_id, voted=1,
+                                       eligible=eligible_voters().filter(area_id=area_id).count())
+    except IntegrityError:
+        # Another vote created the counters first.
+        AreaTurnout.objects.filter(election_id=election_id, area_id=area_id).update(voted=F('voted') + 1)
+
+
+def create_turnout_counters(election_id: int):
+    """
+    Create the zero-vote counters of every area of a new election, with their eligible voters.
+    """
+    eligible = dict(eligible_voters().values_list('area_id').annotate(count=Count('id')))
+    AreaTurnout.objects.bulk_create([AreaTurnout(election_id=election_id, area_id=area_id,
+                                                 eligible=eligible.get(area_id, 0))
+                                     for area_id in NewArea.objects.values_list('id', flat=True)],
+                                    ignore_conflicts=True)
+
+
+def rollup_turnout(election_id: int) -> int:
+    """
+    Recount the turnout counters of every area of an election, and create the missing ones.
+
+    :return: The number of areas updated.
+    :rtype: int
+    """
+    with transaction.atomic():
+        # Lock the counters before counting, so a vote counted meanwhile waits and is added on top of the recount
+        # instead of being overwritten by it.
+        counted = set(AreaTurnout.objects.select_for_update().filter(election_id=election_id)
+                      .values_list('area_id', flat=True))
+        voted = dict(VoteCheck.objects.filter(election_id=election_id, area__isnull=False)
+                     .values_list('area_id').annotate(count=Count('id')))
+        eligible = dict(eligible_voters().values_list('area_id').annotate(count=Count('id')))
+        rows = [AreaTurnout(election_id=election_id, area_id=area_id, voted=voted.get(area_id, 0),
+                            eligible=eligible.get(area_id, 0))
+                for area_id in NewArea.objects.values_list('id', flat=True)]
+        AreaTurnout.objects.bulk_create([row for row in rows if row.area_id in counted], update_conflicts=True,
+                                        unique_fields=['election', 'area'],
+                                        update_fields=['voted', 'eligible', 'updated_at'])
+        # The first vote of an area may create its counters meanwhile, they are kept.
+        AreaTurnout.objects.bulk_create([row for row in rows if row.area_id not in counted], ignore_conflicts=True)
+    return len(rows)
+
+
+def get_turnout(election_id: int) -> list:
+    """
+    Return the turnout counters of every area of an election, by area name.
+
+    :return: A list of ``AreaTurnout`` with their area.
+    :rtype: list
+    """
+    turnout = list(AreaTurnout.objects.filter(election_id=election_id).select_related('area'))
+    # Areas added after the election was created have no counters until their first vote.
+    missing = list(NewArea.objects.exclude(areaturnout__election_id=election_id))
+    if missing:
+        eligible = dict(eligible_voters().filter(area__in=missing).values_list('area_id').annotate(count=Count('id')))
+        turnout += [AreaTurnout(election_id=election_id, area=area, voted=0, eligible=eligible.get(area.id, 0))
+                    for area in missing]
+    return sorted(turnout, key=lambda row: row.area.name)
+
+
+def summarize_turnout(turnout: list) -> dict:
+    """
+    Add up the turnout of every area.
+    """
+    voted = sum(row.voted for row in turnout)
+    eligible = sum(row.eligible for row in turnout)
+    return {
+        'voted': voted,
+        'eligible': eligible,
+        'rate': voted / eligible if eligible else 0.0,
+    }
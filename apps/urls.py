@@ -5,6 +5,7 @@ urlpatterns = [
     path('', views.homepage, name='homepage'),
     path('docs/', views.documentation, name='documentation'),
     path('robots.txt', views.robots_txt, name='robots_txt'),
+    path('ready', views.readiness, name='readiness'),
     path('area', views.area_list, name='area_list'),
     path('area/add', views.add_area, name='add_area'),
     path('area/legacy', views.legacy_area_list, name='legacy_area_list'),
@@ -30,6 +31,7 @@ urlpatterns = [
     path('election/<int:election_id>/result', views.new_election_result, name='new_election_result'),
     path('election/<int:election_id>/result/area/<int:area_id>', views.new_election_result_by_area, name='new_election_result_by_area'),
     path('election/<int:election_id>/result/party', views.new_election_result_by_party, name='new_election_result_by_party'),
+    path('election/<int:election_id>/turnout', views.election_turnout, name='election_turnout'),
     path('party', views.party_list, name='party_list'),
     path('party/add', views.add_party, name='add_party'),
     path('party/legacy', views.legacy_party_list, name='legacy_party_list'),
@@ -39,6 +41,11 @@ urlpatterns = [
     path('party/<int:party_id>/add', views.add_candidate_to_party, name='add_candidate_to_party'),
     path('party/<int:party_id>/remove/<int:candidate_id>', views.remove_candidate_from_party, name='remove_candidate_from_party'),
     path('utils', views.utils, name='utils'),
+    path('utils/autocomplete/<str:source>', views.autocomplete, name='autocomplete'),
+    path('utils/profiles/<str:name>', views.download_profile_artifact, name='download_profile_artifact'),
     path('utils/legacy-import', views.import_legacy_data, name='import_legacy_data'),
+    path('utils/jobs', views.job_status, name='job_status'),
+    path('utils/jobs/<str:name>/start', views.start_job, name='start_job'),
+    path('utils/jobs/<int:log_id>/cancel', views.cancel_job, name='cancel_job'),
     path('partylist-calculation-detail', views.partylist_calculation_detail, name='partylist_calculation_detail'),
 ]
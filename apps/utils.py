@@ -1,10 +1,27 @@
 import copy
 from typing import Dict, List, Any
 
-import math
+import threading
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import Count, Q, QuerySet
 from django.utils import timezone
-from apps.models import LegacyElection, LegacyCandidate, LegacyVote, NewElection, VoteCheck, NewParty, VoteResultParty, \
-    NewArea, VoteResultCandidate
+from apps.allocation import party_list_seats
+from apps.leaderboard import get_leaderboard, reconcile
+from apps.models import LegacyElection, LegacyCandidate, NewArea, NewElection, NewParty
+from apps.pagecache import get_generations
+from apps.reference import get_generation
+from apps.singleflight import single_flight
+from users.models import NewProfile
+
+# Legacy elections only change when the legacy data is imported, so their sorted result is kept in the process until
+# the generation of one of these models is bumped (by their signals or by the import, see users.seed).
+LEGACY_RESULT_LABELS = ('apps.legacycandidate', 'apps.legacyelection', 'apps.legacyvote')
+_legacy_election_result_cache: Dict[int, tuple] = {}
+_legacy_election_result_lock = threading.Lock()
+
+USER_DIRECTORY_PAGE_SIZE = 50
 
 
 def check_election_status(election: LegacyElection | NewElection) -> str:
@@ -30,22 +47,40 @@ def get_sorted_election_result(election: LegacyElection) -> list:
     """
     Get the election result in a sorted list.
 
-    This function is for calculate in LegacyElection model.
+    This function is for calculate in LegacyElection model. The vote count of every candidate of the election (the
+    candidates voted for in it) is calculated in one grouped query, and the result is memoized per election until the
+    legacy data changes. Every call returns its own copy, so the caller can change it.
 
     :param election: The election to get the result.
     :return: The election result in a sorted list.
     :rtype: list
     """
+    version = tuple(get_generations(LEGACY_RESULT_LABELS))
+    with _legacy_election_result_lock:
+        cached = _legacy_election_result_cache.get(election.id)
+    if cached is not None and cached[0] == version:
+        return copy.deepcopy(cached[1])
+    candidates = LegacyCandidate.objects.filter(legacyvote__election=election).annotate(
+        vote_count=Count('legacyvote')
+    ).order_by('-vote_count', 'id')
     vote_result = []
-    for candidate in LegacyCandidate.objects.all():
+    for rank, candidate in enumerate(candidates, start=1):
         vote_result.append({
             'candidate': candidate,
-            'vote_count': LegacyVote.objects.filter(candidate=candidate, election=election).count()
+            'vote_count': candidate.vote_count,
+            'rank': rank
         })
-    vote_result = sorted(vote_result, key=lambda i: i['vote_count'], reverse=True)
-    for i in range(len(vote_result)):
-        vote_result[i]['rank'] = i + 1
-    return vote_result
+    with _legacy_election_result_lock:
+        _legacy_election_result_cache[election.id] = (version, vote_result)
+    return copy.deepcopy(vote_result)
+
+
+def clear_legacy_election_result_cache():
+    """
+    Forget all memoized legacy election results.
+    """
+    with _legacy_election_result_lock:
+        _legacy_election_result_cache.clear()
 
 
 def is_there_ongoing_election() -> bool:
@@ -55,6 +90,21 @@ def is_there_ongoing_election() -> bool:
     return NewElection.objects.filter(start_date__lte=timezone.now(), end_date__gte=timezone.now()).exists()
 
 
+def next_election_boundary() -> timezone.datetime | None:
+    """
+    Return the next time a new election starts or ends, when the status of the elections changes.
+
+    :return: The next start or end date after now, or None if every election is finished.
+    :rtype: datetime | None
+    """
+    now = timezone.now()
+    next_start = NewElection.objects.filter(start_date__gt=now).order_by('start_date') \
+        .values_list('start_date', flat=True).first()
+    next_end = NewElection.objects.filter(end_date__gt=now).order_by('end_date') \
+        .values_list('end_date', flat=True).first()
+    return min((date for date in (next_start, next_end) if date is not None), default=None)
+
+
 def get_one_ongoing_election() -> NewElection:
     """
     Return an ongoing election.
@@ -69,43 +119,36 @@ def calculate_election_party_result(election_id: int) -> dict[
         dict[str, float | int | Any]]]:
     """
     Calculate the election result for partylist.
+
+    The seats every party is entitled to are allocated from its party-list votes with the
+    ``PARTYLIST_ALLOCATION_METHOD`` (largest remainder by default, like the law), out of ``ELECTION_TOTAL_SEATS``
+    seats, and the areas it won are subtracted to get its party-list seats. See ``apps.allocation``. The votes and
+    the areas won are read from the in-process leaderboard of the election, see ``apps.leaderboard``.
     """
     election = NewElection.objects.get(id=election_id)
-    # Get all user who vote in this election
-    vote_per_seat = VoteCheck.objects.filter(election=election).count() / 500 if VoteCheck.objects.filter(
-        election=election).count() > 0 else 0
+    seats = settings.ELECTION_TOTAL_SEATS
+    leaderboard = get_leaderboard(election)
+    parties = list(NewParty.objects.order_by('id'))
+    party_votes = [leaderboard.party_votes.get(party.id, 0) for party in parties]
+    allocation = party_list_seats(party_votes, [leaderboard.party_wins.get(party.id, 0) for party in parties],
+                                  seats, settings.PARTYLIST_ALLOCATION_METHOD)
+    total_vote = sum(party_votes)
     supposed_to_have_result = []
-    for party in NewParty.objects.all():
-        supposed_to_have_result.append({
-            'party': party,
-            'number': VoteResultParty.objects.filter(election=election,
-                                                     party=party).count() / vote_per_seat if vote_per_seat else 0
-        })
-    real_result = copy.deepcopy(supposed_to_have_result)
-    for result in real_result:
-        # If the party has get first place in the election on the area on VoteResultCandidate,
-        # minus that number from the supposed to have result
-        for area in NewArea.objects.all():
-            first_place = VoteResultCandidate.objects.filter(election=election, candidate__area_id=area.id).order_by(
-                '-vote').first()
-            if first_place and first_place.candidate.party == result['party']:
-                result['number'] -= 1
-    # Combine two list
+    real_result = []
     result = []
-    for supposed, real in zip(supposed_to_have_result, real_result):
+    for index, party in enumerate(parties):
+        supposed_to_have_result.append({'party': party, 'number': float(allocation['quotas'][index])})
+        real_result.append({'party': party,
+                            'number': float(allocation['quotas'][index] - allocation['won'][index])})
         result.append({
-            'party': supposed['party'],
-            'supposed_to_have': supposed['number'],
-            'real': real['number']
+            'party': party,
+            'supposed_to_have': int(allocation['entitled'][index]),
+            'real': int(allocation['list_seats'][index])
         })
-    # floor the result
-    for party in result:
-        party['supposed_to_have'] = math.floor(party['supposed_to_have'])
-        party['real'] = math.floor(party['real'])
     # Add detail on number during calculation
     calculation_detail = {
-        'vote_per_seat': vote_per_seat,
-        'total_vote': VoteCheck.objects.filter(election=election).count()
+        'vote_per_seat': total_vote / seats if total_vote else 0,
+        'total_vote': total_vote
     }
     # Sort the result by real number
     result = sorted(result, key=lambda k: k['real'], reverse=True)
@@ -115,3 +158,86 @@ def calculate_election_party_result(election_id: int) -> dict[
         'result': result,
         'calculation_detail': calculation_detail,
     }
+
+
+def get_election_party_result(election: NewElection) -> dict:
+    """
+    Return the result of ``calculate_election_party_result``, shared by every request through the cache.
+
+    It is computed by one request at a time, kept fresh for ``PARTY_RESULT_FRESH_SECONDS`` and then served stale for
+    ``PARTY_RESULT_STALE_SECONDS`` while one request computes it again, see ``apps.singleflight``. The key changes when
+    the election ends and when a party or candidate changes, so the final result is computed again once it closes.
+
+    The final result is shared by every process, so its leaderboard is rebuilt from the tally tables first instead of
+    trusting the one of the process that computes it, which may have missed the last ballots counted by the others.
+    """
+    status = check_election_status(election)
+
+    def compute():
+        if status == 'Finished':
+            reconcile(election.id)
+        return calculate_election_party_result(election.id)
+
+    key = f'party-result:{election.id}:{status}:{get_generation()}'
+    return single_flight(key, compute, settings.PARTY_RESULT_FRESH_SECONDS, settings.PARTY_RESULT_STALE_SECONDS)
+
+
+def search_users(query: str = '') -> QuerySet:
+    """
+    Search the users whose username (citizen ID), first name, last name, full name or area name starts with a query.
+
+    The search is case-sensitive so that every prefix is an index range scan, see the ``users`` migration
+    ``0013_user_directory_indexes``.
+
+    :param query: The prefix to search, every user is returned if it is empty.
+    :return: A queryset of the matching users with their profile and area.
+    :rtype: QuerySet
+    """
+    users = User.objects.select_related('newprofile__area')
+    query = query.strip()
+    if not query:
+        return users
+    condition = Q(username__startswith=query) | Q(first_name__startswith=query) | Q(last_name__startswith=query)
+    first_name, _, last_name = query.partition(' ')
+    if last_name:
+        condition |= Q(first_name=first_name, last_name__startswith=last_name.strip())
+    areas = NewArea.objects.filter(name__startswith=query).values('id')
+    condition |= Q(id__in=NewProfile.objects.filter(area__in=areas).values('user_id'))
+    return users.filter(condition)
+
+
+def keyset_page(queryset: QuerySet, after: int = None, before: int = None,
+                size: int = USER_DIRECTORY_PAGE_SIZE) -> dict:
+    """
+    Get a page of a queryset ordered by id, starting after or ending before an id.
+
+    Unlike an offset, the cost of a page does not grow with the number of rows before it.
+
+    :param queryset: The rows to paginate.
+    :param after: Return the page right after this id.
+    :param before: Return the page right before this id.
+    :param size: Number of rows in a page.
+    :return: A dictionary with the ``items`` of the page and the ``previous`` and ``next`` cursors (the ids to pass
+             as ``before`` and ``after``), which are None on the first and last pages.
+    :rtype: dict
+    """
+    if before is not None:
+        items = list(queryset.filter(id__lt=before).order_by('-id')[:size + 1])
+        has_previous = len(items) > size
+        items = items[:size][::-1]
+        # The page ends before an existing row, so there is a next page.
+        return {
+            'items': items,
+            'previous': items[0].id if has_previous else None,
+            'next': items[-1].id if items else None,
+        }
+    if after is not None:
+        queryset = queryset.filter(id__gt=after)
+    items = list(queryset.order_by('id')[:size + 1])
+    has_next = len(items) > size
+    items = items[:size]
+    return {
+        'items': items,
+        'previous': items[0].id if after is not None and items else None,
+        'next': items[-1].id if has_next else None,
+    }
@@ -1,19 +1,31 @@
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
-from django.http import HttpResponse
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.http import HttpResponse, FileResponse, Http404, JsonResponse
 from django.shortcuts import render, redirect
 from django.utils import timezone
-from django.views.decorators.http import require_GET
+from django.views.decorators.http import require_GET, require_POST
 
-import users.seed
+import users.jobs
+from apps.autocomplete import AUTOCOMPLETE_PAGE_SIZE, AUTOCOMPLETE_SOURCES
 from apps.forms import AreaForm, CandidateForm, StartElectionForm, EditElectionForm, CandidateVoteForm, PartyForm, \
     PartyVoteForm, AddCandidateToPartyForm
+from apps.leaderboard import record_vote
 from apps.models import LegacyArea, LegacyCandidate, LegacyElection, LegacyVote, LegacyParty, NewArea, NewCandidate, \
     NewElection, NewParty, VoteCheck, VoteResultCandidate, VoteResultParty
-from apps.utils import check_election_status, get_sorted_election_result, calculate_election_party_result, \
-    is_there_ongoing_election
-from users.models import ColourSettings, UtilityMissionLog
+from apps.pagecache import cache_page_for_visitors
+from apps.profiling import get_profile_root, list_profile_artifacts
+from apps.turnout import get_turnout, record_turnout, summarize_turnout
+from apps.voterate import record_vote_rate
+from apps.warmup import warm_up_report
+from apps.utils import check_election_status, get_sorted_election_result, get_election_party_result, \
+    is_there_ongoing_election, keyset_page, next_election_boundary, search_users
+from users.models import UtilityMissionLog
+
+# Number of latest utility logs shown in the utility menu.
+UTILITY_LOG_LIMIT = 50
 
 
 @require_GET
@@ -29,12 +41,20 @@ def robots_txt(request):
     return HttpResponse("\n".join(lines), content_type="text/plain")
 
 
+@require_GET
+def readiness(request):
+    """
+    Tell the load balancer if this process is warmed up and ready to serve, with the time its warm-up took.
+    """
+    report = warm_up_report()
+    return JsonResponse(report, status=200 if report['ready'] else 503)
+
+
 def homepage(request):
     """
     Homepage view that's normally show the current election information.
     """
     if request.user.is_authenticated:
-        colour_settings = ColourSettings.objects.filter(user=request.user).first()
         ongoing_election_old = []
         ongoing_election_new = []
         for election in LegacyElection.objects.all().order_by('end_date'):
@@ -44,7 +64,6 @@ def homepage(request):
             if check_election_status(election) == 'Ongoing':
                 ongoing_election_new.append(election)
         return render(request, 'homepage.html', {
-            'colour_settings': colour_settings,
             'ongoing_election_old': ongoing_election_old,
             'ongoing_election_new': ongoing_election_new,
         })
@@ -56,32 +75,21 @@ def documentation(request):
     """
     A page that's include the link to API documentation.
     """
-    if request.user.is_authenticated:
-        colour_settings = ColourSettings.objects.filter(user=request.user).first()
-        return render(request, 'documentation.html', {
-            'colour_settings': colour_settings
-        })
-    else:
-        return render(request, 'documentation.html')
+    return render(request, 'documentation.html')
 
 
+@cache_page_for_visitors(NewArea)
 def area_list(request):
     """
     List all the NewArea objects in the database.
     """
     all_area_new = NewArea.objects.all().order_by('id')
-    if request.user.is_authenticated:
-        colour_settings = ColourSettings.objects.filter(user=request.user).first()
-        return render(request, 'apps/area/area_list.html', {
-            'colour_settings': colour_settings,
-            'all_area_new': all_area_new
-        })
-    else:
-        return render(request, 'apps/area/area_list.html', {
-            'all_area_new': all_area_new
-        })
+    return render(request, 'apps/area/area_list.html', {
+        'all_area_new': all_area_new
+    })
 
 
+@cache_page_for_visitors(LegacyArea)
 def legacy_area_list(request):
     """
     A fallback page that's list all the LegacyArea objects in the database.
@@ -89,16 +97,9 @@ def legacy_area_list(request):
     We are not allowed to do the CRUD operation on the LegacyArea objects anymore, but we still need to show them.
     """
     all_area_legacy = LegacyArea.objects.all().order_by('id')
-    if request.user.is_authenticated:
-        colour_settings = ColourSettings.objects.filter(user=request.user).first()
-        return render(request, 'apps/area/area_list_legacy.html', {
-            'colour_settings': colour_settings,
-            'all_area_legacy': all_area_legacy,
-        })
-    else:
-        return render(request, 'apps/area/area_list_legacy.html', {
-            'all_area_legacy': all_area_legacy,
-        })
+    return render(request, 'apps/area/area_list_legacy.html', {
+        'all_area_legacy': all_area_legacy,
+    })
 
 
 @login_required
@@ -109,7 +110,6 @@ def add_area(request):
     This view is only accessible to the staff or superuser.
     """
     if request.user.is_staff or request.user.is_superuser:
-        colour_settings = ColourSettings.objects.filter(user=request.user).first()
         if request.method == 'POST':
             form = AreaForm(request.POST)
             if form.is_valid():
@@ -119,7 +119,6 @@ def add_area(request):
         else:
             form = AreaForm()
         return render(request, 'apps/area/add_area.html', {
-            'colour_settings': colour_settings,
             'form': form
         })
     else:
@@ -140,7 +139,6 @@ def edit_area(request, area_id):
         except NewArea.DoesNotExist:
             messages.error(request, 'This area does not exist.')
             return redirect('area_list')
-        colour_settings = ColourSettings.objects.filter(user=request.user).first()
         if request.method == 'POST':
             form = AreaForm(request.POST, instance=area)
             if form.is_valid():
@@ -150,7 +148,6 @@ def edit_area(request, area_id):
         else:
             form = AreaForm(instance=area)
         return render(request, 'apps/area/edit_area.html', {
-            'colour_settings': colour_settings,
             'form': form,
             'area': area
         })
@@ -169,20 +166,13 @@ def area_detail_old(request, area_id):
         messages.error(request, 'This area does not exist.')
         return redirect('area_list')
     available_candidate = LegacyCandidate.objects.filter(area=area).order_by('id')
-    if request.user.is_authenticated:
-        colour_settings = ColourSettings.objects.filter(user=request.user).first()
-        return render(request, 'apps/area/area_detail_old.html', {
-            'colour_settings': colour_settings,
-            'area': area,
-            'available_candidate': available_candidate
-        })
-    else:
-        return render(request, 'apps/area/area_detail_old.html', {
-            'area': area,
-            'available_candidate': available_candidate
-        })
+    return render(request, 'apps/area/area_detail_old.html', {
+        'area': area,
+        'available_candidate': available_candidate
+    })
 
 
+@cache_page_for_visitors(NewArea, NewCandidate, NewParty, User)
 def area_detail_new(request, area_id):
     """
     Show the detail of a NewArea object.
@@ -193,37 +183,24 @@ def area_detail_new(request, area_id):
         messages.error(request, 'This area does not exist.')
         return redirect('area_list')
     available_candidate = NewCandidate.objects.filter(area=area).order_by('id')
-    if request.user.is_authenticated:
-        colour_settings = ColourSettings.objects.filter(user=request.user).first()
-        return render(request, 'apps/area/area_detail_new.html', {
-            'colour_settings': colour_settings,
-            'area': area,
-            'available_candidate': available_candidate
-        })
-    else:
-        return render(request, 'apps/area/area_detail_new.html', {
-            'area': area,
-            'available_candidate': available_candidate
-        })
+    return render(request, 'apps/area/area_detail_new.html', {
+        'area': area,
+        'available_candidate': available_candidate
+    })
 
 
+@cache_page_for_visitors(NewCandidate, NewArea, NewParty, User)
 def candidate_list(request):
     """
     List all the NewCandidate objects in the database.
     """
     all_candidate_new = NewCandidate.objects.all().order_by('id')
-    if request.user.is_authenticated:
-        colour_settings = ColourSettings.objects.filter(user=request.user).first()
-        return render(request, 'apps/candidate/candidate_list.html', {
-            'colour_settings': colour_settings,
-            'all_candidate_new': all_candidate_new
-        })
-    else:
-        return render(request, 'apps/candidate/candidate_list.html', {
-            'all_candidate_new': all_candidate_new
-        })
+    return render(request, 'apps/candidate/candidate_list.html', {
+        'all_candidate_new': all_candidate_new
+    })
 
 
+@cache_page_for_visitors(LegacyCandidate, LegacyArea)
 def legacy_candidate_list(request):
     """
     A fallback page that's list all the LegacyCandidate objects in the database.
@@ -231,16 +208,9 @@ def legacy_candidate_list(request):
     We are not allowed to do the CRUD operation on the LegacyCandidate objects anymore, but we still need to show them.
     """
     all_candidate_legacy = LegacyCandidate.objects.all().order_by('id')
-    if request.user.is_authenticated:
-        colour_settings = ColourSettings.objects.filter(user=request.user).first()
-        return render(request, 'apps/candidate/candidate_list_legacy.html', {
-            'colour_settings': colour_settings,
-            'all_candidate_legacy': all_candidate_legacy,
-        })
-    else:
-        return render(request, 'apps/candidate/candidate_list_legacy.html', {
-            'all_candidate_legacy': all_candidate_legacy,
-        })
+    return render(request, 'apps/candidate/candidate_list_legacy.html', {
+        'all_candidate_legacy': all_candidate_legacy,
+    })
 
 
 @login_required
@@ -251,7 +221,6 @@ def add_candidate(request):
     This view is only accessible to the staff or superuser.
     """
     if request.user.is_staff or request.user.is_superuser:
-        colour_settings = ColourSettings.objects.filter(user=request.user).first()
         if request.method == 'POST':
             form = CandidateForm(request.POST, request.FILES)
             if form.is_valid():
@@ -261,7 +230,6 @@ def add_candidate(request):
         else:
             form = CandidateForm()
         return render(request, 'apps/candidate/add_candidate.html', {
-            'colour_settings': colour_settings,
             'form': form
         })
     else:
@@ -282,7 +250,6 @@ def edit_candidate(request, candidate_id):
         except NewCandidate.DoesNotExist:
             messages.error(request, 'This candidate does not exist.')
             return redirect('candidate_list')
-        colour_settings = ColourSettings.objects.filter(user=request.user).first()
         if request.method == 'POST':
             form = CandidateForm(request.POST, request.FILES, instance=candidate)
             if form.is_valid():
@@ -292,7 +259,6 @@ def edit_candidate(request, candidate_id):
         else:
             form = CandidateForm(instance=candidate)
         return render(request, 'apps/candidate/edit_candidate.html', {
-            'colour_settings': colour_settings,
             'form': form,
             'candidate': candidate
         })
@@ -310,18 +276,12 @@ def candidate_detail_old(request, candidate_id):
     except LegacyCandidate.DoesNotExist:
         messages.error(request, 'This candidate does not exist.')
         return redirect('candidate_list')
-    if request.user.is_authenticated:
-        colour_settings = ColourSettings.objects.filter(user=request.user).first()
-        return render(request, 'apps/candidate/candidate_detail_old.html', {
-            'colour_settings': colour_settings,
-            'candidate': candidate
-        })
-    else:
-        return render(request, 'apps/candidate/candidate_detail_old.html', {
-            'candidate': candidate
-        })
+    return render(request, 'apps/candidate/candidate_detail_old.html', {
+        'candidate': candidate
+    })
 
 
+@cache_page_for_visitors(NewCandidate, NewArea, NewParty, User)
 def candidate_detail_new(request, candidate_id):
     """
     Show the detail of a NewCandidate object.
@@ -331,18 +291,12 @@ def candidate_detail_new(request, candidate_id):
     except NewCandidate.DoesNotExist:
         messages.error(request, 'This candidate does not exist.')
         return redirect('candidate_list')
-    if request.user.is_authenticated:
-        colour_settings = ColourSettings.objects.filter(user=request.user).first()
-        return render(request, 'apps/candidate/candidate_detail_new.html', {
-            'colour_settings': colour_settings,
-            'candidate': candidate
-        })
-    else:
-        return render(request, 'apps/candidate/candidate_detail_new.html', {
-            'candidate': candidate
-        })
+    return render(request, 'apps/candidate/candidate_detail_new.html', {
+        'candidate': candidate
+    })
 
 
+@cache_page_for_visitors(NewElection, expires_at=next_election_boundary)
 def election_list(request):
     """
     List all the NewElection objects in the database.
@@ -353,20 +307,13 @@ def election_list(request):
             'election': election,
             'status': check_election_status(election)
         })
-    if request.user.is_authenticated:
-        colour_settings = ColourSettings.objects.filter(user=request.user).first()
-        return render(request, 'apps/election/election.html', {
-            'colour_settings': colour_settings,
-            'all_election_new': rendered_new_election,
-            'enable_create': not is_there_ongoing_election()
-        })
-    else:
-        return render(request, 'apps/election/election.html', {
-            'all_election_new': rendered_new_election,
-            'enable_create': not is_there_ongoing_election()
-        })
+    return render(request, 'apps/election/election.html', {
+        'all_election_new': rendered_new_election,
+        'enable_create': not is_there_ongoing_election()
+    })
 
 
+@cache_page_for_visitors(LegacyElection)
 def legacy_election_list(request):
     """
     A fallback page that's list all the LegacyElection objects in the database.
@@ -379,16 +326,9 @@ def legacy_election_list(request):
             'election': election,
             'status': check_election_status(election)
         })
-    if request.user.is_authenticated:
-        colour_settings = ColourSettings.objects.filter(user=request.user).first()
-        return render(request, 'apps/election/election_legacy.html', {
-            'colour_settings': colour_settings,
-            'all_election_legacy': rendered_legacy_election,
-        })
-    else:
-        return render(request, 'apps/election/election_legacy.html', {
-            'all_election_legacy': rendered_legacy_election,
-        })
+    return render(request, 'apps/election/election_legacy.html', {
+        'all_election_legacy': rendered_legacy_election,
+    })
 
 
 def election_detail_old(request, election_id):
@@ -401,10 +341,8 @@ def election_detail_old(request, election_id):
         messages.error(request, 'This election does not exist.')
         return redirect('election_list')
     if request.user.is_authenticated:
-        colour_settings = ColourSettings.objects.filter(user=request.user).first()
         vote_history = LegacyVote.objects.filter(election=election_object, user=request.user).first()
         return render(request, 'apps/election/election_detail_old.html', {
-            'colour_settings': colour_settings,
             'election': election_object,
             'status': check_election_status(election_object),
             'vote_history': vote_history
@@ -416,6 +354,7 @@ def election_detail_old(request, election_id):
         })
 
 
+@cache_page_for_visitors(NewElection, anonymous_only=True, expires_at=next_election_boundary)
 def election_detail_new(request, election_id):
     """
     Show the detail of a NewElection object.
@@ -426,9 +365,7 @@ def election_detail_new(request, election_id):
         messages.error(request, 'This election does not exist.')
         return redirect('election_list')
     if request.user.is_authenticated:
-        colour_settings = ColourSettings.objects.filter(user=request.user).first()
         return render(request, 'apps/election/election_detail_new.html', {
-            'colour_settings': colour_settings,
             'election': election_object,
             'status': check_election_status(election_object),
             'vote_history': VoteCheck.objects.filter(election=election_object, user=request.user).first(),
@@ -452,7 +389,6 @@ def start_election(request):
         messages.error(request, 'There is already an election ongoing.')
         return redirect('election_list')
     if request.user.is_staff or request.user.is_superuser:
-        colour_settings = ColourSettings.objects.filter(user=request.user).first()
         if request.method == 'POST':
             form = StartElectionForm(request.POST, request.FILES)
             if form.is_valid():
@@ -467,7 +403,6 @@ def start_election(request):
             form = StartElectionForm()
 
         return render(request, 'apps/election/add_election.html', {
-            'colour_settings': colour_settings,
             'form': form,
             'ongoing_election': True
         })
@@ -489,7 +424,6 @@ def edit_election(request, election_id):
         except LegacyElection.DoesNotExist:
             messages.error(request, 'This election does not exist.')
             return redirect('election_list')
-        colour_settings = ColourSettings.objects.filter(user=request.user).first()
         if request.method == 'POST':
             form = EditElectionForm(request.POST, request.FILES, instance=election)
             if form.is_valid():
@@ -499,7 +433,6 @@ def edit_election(request, election_id):
         else:
             form = EditElectionForm(instance=election)
         return render(request, 'apps/election/edit_election.html', {
-            'colour_settings': colour_settings,
             'form': form,
             'election': election
         })
@@ -527,43 +460,38 @@ def vote(request, election_id):
             return redirect('election_list')
         if check_election_status(election) == 'Ongoing':
             if not VoteCheck.objects.filter(election=election, user=request.user).exists():
-                colour_settings = ColourSettings.objects.filter(user=request.user).first()
                 if request.method == 'POST':
                     candidate_form = CandidateVoteForm(request.POST, area=request.user.newprofile.area)
                     party_form = PartyVoteForm(request.POST)
                     if candidate_form.is_valid() and party_form.is_valid():
-                        # tally the candidate
-                        if VoteResultCandidate.objects.filter(election=election, candidate=candidate_form.cleaned_data[
-                            'candidate']).exists():
-                            candidate = VoteResultCandidate.objects.get(election=election,
-                                                                        candidate=candidate_form.cleaned_data[
-                                                                            'candidate'])
-                            candidate.vote += 1
-                            candidate.save()
-                        else:
-                            candidate = VoteResultCandidate.objects.create(election=election,
-                                                                           candidate=candidate_form.cleaned_data[
-                                                                               'candidate'], vote=1)
-                            candidate.save()
-                        if VoteResultParty.objects.filter(election=election,
-                                                          party=party_form.cleaned_data['party']).exists():
-                            party = VoteResultParty.objects.get(election=election,
-                                                                party=party_form.cleaned_data['party'])
-                            party.vote += 1
-                            party.save()
-                        else:
-                            party = VoteResultParty.objects.create(election=election,
-                                                                   party=party_form.cleaned_data['party'], vote=1)
-                            party.save()
-                        # register this user as voted for this election
-                        VoteCheck.objects.create(election=election, user=request.user)
+                        candidate_id = candidate_form.cleaned_data['candidate']
+                        party_id = party_form.cleaned_data['party']
+                        area_id = request.user.newprofile.area_id
+                        try:
+                            with transaction.atomic():
+                                # register this user as voted for this election, first so that a second request
+                                # of the user that passed the check above is refused by the unique VoteCheck
+                                VoteCheck.objects.create(election=election, user=request.user, area_id=area_id)
+                                # tally the candidate and the party in the database, concurrent votes would
+                                # overwrite each other's count otherwise
+                                candidate, _ = VoteResultCandidate.objects.get_or_create(election=election,
+                                                                                         candidate_id=candidate_id)
+                                VoteResultCandidate.objects.filter(id=candidate.id).update(vote=F('vote') + 1)
+                                party, _ = VoteResultParty.objects.get_or_create(election=election,
+                                                                                 party_id=party_id)
+                                VoteResultParty.objects.filter(id=party.id).update(vote=F('vote') + 1)
+                                record_turnout(election.id, area_id)
+                                record_vote_rate(election.id, area_id, party_id)
+                                transaction.on_commit(lambda: record_vote(election.id, candidate_id, party_id))
+                        except IntegrityError:
+                            messages.error(request, 'You have already voted in this election.')
+                            return redirect('election_detail_new', election_id=election_id)
                         messages.success(request, 'Vote has been submitted!')
                         return redirect('election_detail_new', election_id=election_id)
                 else:
                     candidate_form = CandidateVoteForm(area=request.user.newprofile.area)
                     party_form = PartyVoteForm()
                 return render(request, 'apps/vote/vote.html', {
-                    'colour_settings': colour_settings,
                     'candidate_form': candidate_form,
                     'party_form': party_form,
                     'election': election
@@ -593,10 +521,8 @@ def vote_history(request, election_id):
         except NewElection.DoesNotExist:
             messages.error(request, 'This election does not exist.')
             return redirect('election_list')
-        colour_settings = ColourSettings.objects.filter(user=request.user).first()
         election_vote_history = VoteCheck.objects.filter(election=election)
         return render(request, 'apps/vote/vote_history.html', {
-            'colour_settings': colour_settings,
             'vote_history': election_vote_history,
             'election': election
         })
@@ -622,22 +548,12 @@ def election_result(request, election_id):
         first_candidate = sorted_result[0]
         second_candidate = sorted_result[1]
         third_candidate = sorted_result[2]
-        if request.user.is_authenticated:
-            colour_settings = ColourSettings.objects.filter(user=request.user).first()
-            return render(request, 'apps/vote/election_result.html', {
-                'colour_settings': colour_settings,
-                'first_candidate': first_candidate,
-                'second_candidate': second_candidate,
-                'third_candidate': third_candidate,
-                'election': election
-            })
-        else:
-            return render(request, 'apps/vote/election_result.html', {
-                'first_candidate': first_candidate,
-                'second_candidate': second_candidate,
-                'third_candidate': third_candidate,
-                'election': election
-            })
+        return render(request, 'apps/vote/election_result.html', {
+            'first_candidate': first_candidate,
+            'second_candidate': second_candidate,
+            'third_candidate': third_candidate,
+            'election': election
+        })
     else:
         messages.error(request, 'This election has not ended yet.')
         return redirect('election_detail', election_id=election_id)
@@ -658,18 +574,10 @@ def detailed_election_result(request, election_id):
     if check_election_status(election) != 'Finished' and (
             request.user.is_staff or request.user.is_superuser) or check_election_status(election) == 'Finished':
         vote_result = get_sorted_election_result(election)
-        if request.user.is_authenticated:
-            colour_settings = ColourSettings.objects.filter(user=request.user).first()
-            return render(request, 'apps/vote/detailed_election_result.html', {
-                'colour_settings': colour_settings,
-                'vote_result': vote_result,
-                'election': election
-            })
-        else:
-            return render(request, 'apps/vote/detailed_election_result.html', {
-                'vote_result': vote_result,
-                'election': election
-            })
+        return render(request, 'apps/vote/detailed_election_result.html', {
+            'vote_result': vote_result,
+            'election': election
+        })
     else:
         messages.error(request, 'This election has not ended yet.')
         return redirect('election_detail', election_id=election_id)
@@ -688,18 +596,10 @@ def new_election_result(request, election_id):
         return redirect('election_list')
     if check_election_status(election) != 'Finished' and (
             request.user.is_staff or request.user.is_superuser) or check_election_status(election) == 'Finished':
-        if request.user.is_authenticated:
-            colour_settings = ColourSettings.objects.filter(user=request.user).first()
-            return render(request, 'apps/vote/new_election_result.html', {
-                'colour_settings': colour_settings,
-                'election': election,
-                'area_list': NewArea.objects.all()
-            })
-        else:
-            return render(request, 'apps/vote/new_election_result.html', {
-                'election': election,
-                'area_list': NewArea.objects.all()
-            })
+        return render(request, 'apps/vote/new_election_result.html', {
+            'election': election,
+            'area_list': NewArea.objects.all()
+        })
     else:
         messages.error(request, 'This election has not ended yet.')
         return redirect('election_detail_new', election_id=election_id)
@@ -728,22 +628,29 @@ def new_election_result_by_area(request, election_id, area_id):
     for candidate in candidate_in_area:
         if not vote_result.filter(candidate=candidate):
             candidate_no_vote.append(candidate)
-    if request.user.is_authenticated:
-        colour_settings = ColourSettings.objects.filter(user=request.user).first()
-        return render(request, 'apps/vote/new_election_result_by_area.html', {
-            'colour_settings': colour_settings,
-            'vote_result': vote_result,
-            'election': election,
-            'area': area,
-            'candidate_no_vote': candidate_no_vote
-        })
-    else:
-        return render(request, 'apps/vote/new_election_result_by_area.html', {
-            'vote_result': vote_result,
-            'election': election,
-            'area': area,
-            'candidate_no_vote': candidate_no_vote
-        })
+    return render(request, 'apps/vote/new_election_result_by_area.html', {
+        'vote_result': vote_result,
+        'election': election,
+        'area': area,
+        'candidate_no_vote': candidate_no_vote
+    })
+
+
+def election_turnout(request, election_id):
+    """
+    Show the turnout of every area in an election.
+    """
+    try:
+        election = NewElection.objects.get(id=election_id)
+    except NewElection.DoesNotExist:
+        messages.error(request, 'This election does not exist.')
+        return redirect('election_list')
+    turnout = get_turnout(election.id)
+    return render(request, 'apps/vote/turnout.html', {
+        'election': election,
+        'turnout': turnout,
+        'total': summarize_turnout(turnout),
+    })
 
 
 def new_election_result_by_party(request, election_id):
@@ -757,57 +664,34 @@ def new_election_result_by_party(request, election_id):
     except NewElection.DoesNotExist:
         messages.error(request, 'This election does not exist.')
         return redirect('election_list')
-    result = calculate_election_party_result(election.id)
+    result = get_election_party_result(election)
     print(result)
-    if request.user.is_authenticated:
-        colour_settings = ColourSettings.objects.filter(user=request.user).first()
-        return render(request, 'apps/vote/new_election_result_by_party.html', {
-            'colour_settings': colour_settings,
-            'election': election,
-            'supposed_to_have_result': result['supposed_to_have_result'],
-            'real_result': result['real_result'],
-            'result': result['result'],
-            'calculation_detail': result['calculation_detail'],
-            'raw_result': VoteResultParty.objects.filter(election=election).order_by('-vote'),
-        })
-    else:
-        return render(request, 'apps/vote/new_election_result_by_party.html', {
-            'election': election,
-            'supposed_to_have_result': result['supposed_to_have_result'],
-            'real_result': result['real_result'],
-            'result': result['result'],
-            'calculation_detail': result['calculation_detail'],
-            'raw_result': VoteResultParty.objects.filter(election=election).order_by('-vote'),
-        })
+    return render(request, 'apps/vote/new_election_result_by_party.html', {
+        'election': election,
+        'supposed_to_have_result': result['supposed_to_have_result'],
+        'real_result': result['real_result'],
+        'result': result['result'],
+        'calculation_detail': result['calculation_detail'],
+        'raw_result': VoteResultParty.objects.filter(election=election).order_by('-vote'),
+    })
 
 
 def partylist_calculation_detail(request):
-    if request.user.is_authenticated:
-        colour_settings = ColourSettings.objects.filter(user=request.user).first()
-        return render(request, 'apps/vote/partylist_calculation_detail.html', {
-            'colour_settings': colour_settings
-        })
-    else:
-        return render(request, 'apps/vote/partylist_calculation_detail.html')
+    return render(request, 'apps/vote/partylist_calculation_detail.html')
 
 
+@cache_page_for_visitors(NewParty)
 def party_list(request):
     """
     Show the list of NewParty objects.
     """
     all_party_new = NewParty.objects.all().order_by('id')
-    if request.user.is_authenticated:
-        colour_settings = ColourSettings.objects.filter(user=request.user).first()
-        return render(request, 'apps/party/party_list.html', {
-            'colour_settings': colour_settings,
-            'party_list_new': all_party_new
-        })
-    else:
-        return render(request, 'apps/party/party_list.html', {
-            'party_list_new': all_party_new
-        })
+    return render(request, 'apps/party/party_list.html', {
+        'party_list_new': all_party_new
+    })
 
 
+@cache_page_for_visitors(LegacyParty)
 def legacy_party_list(request):
     """
     A fallback page that's list all the LegacyParty objects in the database.
@@ -816,9 +700,7 @@ def legacy_party_list(request):
     """
     all_party_old = LegacyParty.objects.all().order_by('id')
     if request.user.is_authenticated:
-        colour_settings = ColourSettings.objects.filter(user=request.user).first()
         return render(request, 'apps/party/party_list_legacy.html', {
-            'colour_settings': colour_settings,
             'party_list_old': all_party_old,
         })
     else:
@@ -833,7 +715,6 @@ def add_party(request):
     Add a new party to the database.
     """
     if request.user.is_staff or request.user.is_superuser:
-        colour_settings = ColourSettings.objects.filter(user=request.user).first()
         if request.method == 'POST':
             form = PartyForm(request.POST, request.FILES)
             if form.is_valid():
@@ -844,7 +725,6 @@ def add_party(request):
         else:
             form = PartyForm()
         return render(request, 'apps/party/add_party.html', {
-            'colour_settings': colour_settings,
             'form': form
         })
     else:
@@ -862,7 +742,6 @@ def edit_party(request, party_id):
         except NewParty.DoesNotExist:
             messages.error(request, 'This party does not exist.')
             return redirect('party_list')
-        colour_settings = ColourSettings.objects.filter(user=request.user).first()
         if request.method == 'POST':
             form = PartyForm(request.POST, request.FILES, instance=party)
             if form.is_valid():
@@ -873,7 +752,6 @@ def edit_party(request, party_id):
         else:
             form = PartyForm(instance=party)
         return render(request, 'apps/party/edit_party.html', {
-            'colour_settings': colour_settings,
             'form': form,
             'party': party
         })
@@ -891,18 +769,12 @@ def party_detail_old(request, party_id):
     except LegacyParty.DoesNotExist:
         messages.error(request, 'This party does not exist.')
         return redirect('party_list')
-    if request.user.is_authenticated:
-        colour_settings = ColourSettings.objects.filter(user=request.user).first()
-        return render(request, 'apps/party/party_detail_old.html', {
-            'colour_settings': colour_settings,
-            'party': party
-        })
-    else:
-        return render(request, 'apps/party/party_detail_old.html', {
-            'party': party
-        })
+    return render(request, 'apps/party/party_detail_old.html', {
+        'party': party
+    })
 
 
+@cache_page_for_visitors(NewParty, NewCandidate, NewArea, User)
 def party_detail_new(request, party_id):
     """
     Show the detail of a NewParty object.
@@ -912,18 +784,10 @@ def party_detail_new(request, party_id):
     except NewParty.DoesNotExist:
         messages.error(request, 'This party does not exist.')
         return redirect('party_list')
-    if request.user.is_authenticated:
-        colour_settings = ColourSettings.objects.filter(user=request.user).first()
-        return render(request, 'apps/party/party_detail_new.html', {
-            'colour_settings': colour_settings,
-            'party': party,
-            'candidates': NewCandidate.objects.filter(party=party)
-        })
-    else:
-        return render(request, 'apps/party/party_detail_new.html', {
-            'party': party,
-            'candidates': NewCandidate.objects.filter(party=party)
-        })
+    return render(request, 'apps/party/party_detail_new.html', {
+        'party': party,
+        'candidates': NewCandidate.objects.filter(party=party)
+    })
 
 
 @login_required()
@@ -937,7 +801,6 @@ def add_candidate_to_party(request, party_id):
         except NewParty.DoesNotExist:
             messages.error(request, 'This party does not exist.')
             return redirect('party_list')
-        colour_settings = ColourSettings.objects.filter(user=request.user).first()
         if request.method == 'POST':
             form = AddCandidateToPartyForm(request.POST)
             if form.is_valid():
@@ -949,7 +812,6 @@ def add_candidate_to_party(request, party_id):
         else:
             form = AddCandidateToPartyForm()
         return render(request, 'apps/party/add_candidate_to_party.html', {
-            'colour_settings': colour_settings,
             'form': form,
             'party': party
         })
@@ -987,48 +849,159 @@ def remove_candidate_from_party(request, party_id, candidate_id):
 def utils(request):
     """
     A utility menu for the staff and superuser.
+
+    The user directory is searched by prefix with ``q`` and paginated by id with ``after`` and ``before``, and only
+    the latest ``UTILITY_LOG_LIMIT`` utility logs are shown, so the page does not grow with the number of users.
     """
     if request.user.is_staff or request.user.is_superuser:
-        colour_settings = ColourSettings.objects.filter(user=request.user).first()
-        utility_log = UtilityMissionLog.objects.all().order_by('id')
+        utility_log = UtilityMissionLog.objects.select_related('user').order_by('-id')[:UTILITY_LOG_LIMIT]
+        query = request.GET.get('q', '')
+        try:
+            after = int(request.GET['after']) if request.GET.get('after') else None
+            before = int(request.GET['before']) if request.GET.get('before') else None
+        except ValueError:
+            after = before = None
         return render(request, 'apps/utils/utils.html', {
-            'colour_settings': colour_settings,
-            'import_legacy_data': len(UtilityMissionLog.objects.filter(field='import_legacy_data', done=True)) > 0,
+            'import_legacy_data': UtilityMissionLog.objects.filter(field='import_legacy_data', done=True).exists(),
+            'jobs': {name: job_type.title for name, job_type in users.jobs.JOBS.items()
+                     if name != 'import_legacy_data'},
             'utility_log': utility_log,
-            'users_list': User.objects.all().order_by('id')
+            'users_page': keyset_page(search_users(query), after=after, before=before),
+            'query': query,
+            'profile_artifacts': list_profile_artifacts()
         })
     else:
         messages.error(request, 'You are not authorised to access this page.')
         return redirect('homepage')
 
 
+@login_required()
+def autocomplete(request, source):
+    """
+    Search the options of an autocomplete select, see ``apps.autocomplete``.
+
+    Return the page of options whose text starts with ``q`` after the ``after`` cursor, with the cursor of the next
+    page. This view is only accessible to the staff or superuser.
+    """
+    if request.user.is_staff or request.user.is_superuser:
+        if source not in AUTOCOMPLETE_SOURCES:
+            raise Http404('This autocomplete source does not exist.')
+        try:
+            after = int(request.GET['after']) if request.GET.get('after') else None
+        except ValueError:
+            after = None
+        page = keyset_page(AUTOCOMPLETE_SOURCES[source](request.GET.get('q', '').strip()), after=after,
+                           size=AUTOCOMPLETE_PAGE_SIZE)
+        return JsonResponse({
+            'results': [{'id': item.pk, 'text': str(item)} for item in page['items']],
+            'next': page['next'],
+        })
+    else:
+        return JsonResponse({'detail': 'You are not authorised to access this page.'}, status=403)
+
+
+@login_required()
+def download_profile_artifact(request, name):
+    """
+    Download a stored request profiling artifact.
+
+    This view is only accessible to the staff or superuser.
+    """
+    if request.user.is_staff or request.user.is_superuser:
+        root = get_profile_root()
+        path = (root / name).resolve()
+        if path.parent != root.resolve() or not path.is_file():
+            raise Http404('This profiling artifact does not exist.')
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=name, content_type='text/plain')
+    else:
+        messages.error(request, 'You are not authorised to access this page.')
+        return redirect('homepage')
+
+
 @login_required()
 def import_legacy_data(request):
     """
     Import the legacy data from the old dump file to the new database.
 
-    This menu normally can be accessed only once in the lifetime of the website and only can be accessed by the staff and superuser.
+    The import is queued as a background job and a ``runjobs`` worker writes its progress and result to the utility
+    log. This menu normally can be accessed only once in the lifetime of the website and only can be accessed by the
+    staff and superuser.
     """
     if request.user.is_staff or request.user.is_superuser:
-        try:
-            users.seed.seed_data()
-            messages.success(request, 'Legacy data has been imported!')
-            UtilityMissionLog.objects.create(
-                user=request.user,
-                field='import_legacy_data',
-                done=True,
-                description='Import legacy data successfully.'
-            )
-            return redirect('utils')
-        except Exception as e:
-            messages.error(request, 'Legacy data import failed : ' + str(e))
-            users.models.UtilityMissionLog.objects.create(
-                user=request.user,
-                field='import_legacy_data',
-                done=False,
-                description='Import legacy data failed : ' + str(e)
-            )
-            return redirect('utils')
+        if users.jobs.enqueue('import_legacy_data', request.user.id):
+            messages.success(request, 'Legacy data import has been queued! Check the utility log for the progress.')
+        else:
+            messages.error(request, 'Legacy data import is already running.')
+        return redirect('utils')
+    else:
+        messages.error(request, 'You are not authorised to access this function.')
+        return redirect('homepage')
+
+
+@login_required()
+@require_POST
+def start_job(request, name):
+    """
+    Queue a background job of the utility menu, see ``users.jobs``.
+
+    This function only can be accessed by the staff and superuser.
+    """
+    if request.user.is_staff or request.user.is_superuser:
+        if name not in users.jobs.JOBS:
+            raise Http404('This job does not exist.')
+        title = users.jobs.JOBS[name].title
+        if users.jobs.enqueue(name, request.user.id):
+            messages.success(request, f'{title} has been queued! Check the utility log for the progress.')
+        else:
+            messages.error(request, f'{title} is already running.')
+        return redirect('utils')
     else:
         messages.error(request, 'You are not authorised to access this function.')
         return redirect('homepage')
+
+
+@login_required()
+@require_POST
+def cancel_job(request, log_id):
+    """
+    Cancel a queued or running background job.
+
+    This function only can be accessed by the staff and superuser.
+    """
+    if request.user.is_staff or request.user.is_superuser:
+        if users.jobs.request_cancel(log_id):
+            messages.success(request, 'The job will be cancelled.')
+        else:
+            messages.error(request, 'This job is not running.')
+        return redirect('utils')
+    else:
+        messages.error(request, 'You are not authorised to access this function.')
+        return redirect('homepage')
+
+
+@login_required()
+def job_status(request):
+    """
+    Get the progress of the background jobs given by ``ids`` (comma separated), for the utility menu to poll.
+
+    This view is only accessible to the staff or superuser.
+    """
+    if request.user.is_staff or request.user.is_superuser:
+        try:
+            ids = [int(log_id) for log_id in request.GET.get('ids', '').split(',') if log_id][:UTILITY_LOG_LIMIT]
+        except ValueError:
+            ids = []
+        logs = UtilityMissionLog.objects.filter(id__in=ids).only(
+            'id', 'status', 'done', 'processed', 'total', 'description', 'started_at', 'finished_at')
+        return JsonResponse({'jobs': [{
+            'id': log.id,
+            'status': log.status,
+            'done': log.done,
+            'processed': log.processed,
+            'total': log.total,
+            'percentage': log.percentage,
+            'throughput': round(log.throughput, 1),
+            'description': log.description,
+        } for log in logs]})
+    else:
+        return JsonResponse({'detail': 'You are not authorised to access this page.'}, status=403)
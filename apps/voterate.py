@@ -0,0 +1,146 @@
+"""
+Votes per quarter of an hour of every area and party, for monitoring an election while it runs.
+
+Every ballot increments the ``AreaVoteRateBucket`` of its area and the ``PartyVoteRateBucket`` of its party for its
+quarter of an hour in the transaction of the vote, so a time series is read from the buckets of the range instead of
+scanning ``VoteCheck``. The ``downsamplevoterates`` command folds the quarter buckets older than
+``VOTE_RATE_QUARTER_RETENTION`` into hourly buckets to keep the tables small.
+
+The buckets must not tell how anyone voted when they are put next to the time of their ``VoteCheck``: areas and parties
+are never counted together, buckets are a quarter of an hour wide, and the series per party report the counts below
+``VOTE_RATE_MIN_COUNT`` as None.
+
+Buckets start on UTC quarters and hours, and buckets without votes are not stored.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from apps.models import AreaVoteRateBucket, PartyVoteRateBucket, VoteRateBucket
+
+GROUP_TOTAL = 'total'
+GROUP_AREA = 'area'
+GROUP_PARTY = 'party'
+
+GROUP_BY_CHOICES = (GROUP_TOTAL, GROUP_AREA, GROUP_PARTY)
+
+QUARTER_MINUTES = 15
+
+# The model and the grouping field of the buckets of every series, the total is the sum of the areas.
+BUCKETS = {
+    GROUP_TOTAL: (AreaVoteRateBucket, None),
+    GROUP_AREA: (AreaVoteRateBucket, 'area_id'),
+    GROUP_PARTY: (PartyVoteRateBucket, 'party_id'),
+}
+
+
+def quarter_start(time: datetime) -> datetime:
+    time = time.astimezone(dt_timezone.utc)
+    return time.replace(minute=time.minute - time.minute % QUARTER_MINUTES, second=0, microsecond=0)
+
+
+def hour_start(time: datetime) -> datetime:
+    return time.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def increment_bucket(model, **bucket):
+    if model.objects.filter(**bucket).update(count=F('count') + 1):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(count=1, **bucket)
+    except IntegrityError:
+        # Another vote of the same quarter created the bucket first.
+        model.objects.filter(**bucket).update(count=F('count') + 1)
+
+
+def record_vote_rate(election_id: int, area_id: int, party_id: int, time: datetime = None):
+    """
+    Count a ballot in the buckets of its area and of its party for its quarter, call it in the transaction of the vote.
+    """
+    bucket_start = quarter_start(time or timezone.now())
+    increment_bucket(AreaVoteRateBucket, election_id=election_id, area_id=area_id,
+                     resolution=VoteRateBucket.QUARTER, bucket_start=bucket_start)
+    increment_bucket(PartyVoteRateBucket, election_id=election_id, party_id=party_id,
+                     resolution=VoteRateBucket.QUARTER, bucket_start=bucket_start)
+
+
+def downsample_buckets(model, field: str, before: datetime) -> int:
+    quarters = model.objects.filter(resolution=VoteRateBucket.QUARTER, bucket_start__lt=hour_start(before))
+    hours = quarters.annotate(hour=TruncHour('bucket_start', tzinfo=dt_timezone.utc)) \
+        .values_list('election_id', field, 'hour').annotate(total=Sum('count'))
+    rows = {(election_id, key, hour): total for election_id, key, hour, total in hours}
+    if not rows:
+        return 0
+    # Add to the hourly buckets already folded, in case quarter buckets of a folded hour came in late.
+    for bucket in model.objects.filter(resolution=VoteRateBucket.HOUR, bucket_start__in={key[2] for key in rows}):
+        key = (bucket.election_id, getattr(bucket, field), bucket.bucket_start)
+        if key in rows:
+            rows[key] += bucket.count
+    model.objects.bulk_create(
+        [model(election_id=election_id, resolution=VoteRateBucket.HOUR, bucket_start=hour, count=total,
+               **{field: key})
+         for (election_id, key, hour), total in rows.items()],
+        update_conflicts=True, unique_fields=['election', 'resolution', 'bucket_start', field],
+        update_fields=['count'])
+    return quarters.delete()[0]
+
+
+def downsample(before: datetime) -> int:
+    """
+    Fold the quarter buckets of the hours that ended before a time into hourly buckets.
+
+    Only whole hours are folded, so an hour is never split between a quarter and an hour bucket.
+
+    :return: The number of quarter buckets folded.
+    :rtype: int
+    """
+    with transaction.atomic():
+        return downsample_buckets(AreaVoteRateBucket, 'area_id', before) + \
+            downsample_buckets(PartyVoteRateBucket, 'party_id', before)
+
+
+def vote_rate_series(election_id: int, start: datetime, end: datetime, resolution: str = VoteRateBucket.QUARTER,
+                     group_by: str = GROUP_TOTAL) -> dict:
+    """
+    Read the number of ballots per quarter of an hour or per hour of an election, from its buckets.
+
+    Hourly series also count the quarter buckets that are not folded yet. Quarters that were already folded into an
+    hour have no quarter points. The counts of a party below ``VOTE_RATE_MIN_COUNT`` are None.
+
+    :param start: Start of the range, inclusive.
+    :param end: End of the range, exclusive.
+    :param resolution: ``VoteRateBucket.QUARTER`` or ``VoteRateBucket.HOUR``.
+    :param group_by: One of ``GROUP_BY_CHOICES``, a series per area, per party or a single series (with key None).
+    :return: A dictionary of series key (area id, party id or None) to a list of (bucket start, count) by time.
+    :rtype: dict
+    """
+    model, field = BUCKETS[group_by]
+    group_fields = [field] if field else []
+    if resolution == VoteRateBucket.QUARTER:
+        buckets = model.objects.filter(election_id=election_id, bucket_start__gte=quarter_start(start),
+                                       bucket_start__lt=end)
+        querysets = [buckets.filter(resolution=VoteRateBucket.QUARTER).annotate(time=F('bucket_start'))]
+    else:
+        buckets = model.objects.filter(election_id=election_id, bucket_start__gte=hour_start(start),
+                                       bucket_start__lt=end)
+        querysets = [
+            buckets.filter(resolution=VoteRateBucket.HOUR).annotate(time=F('bucket_start')),
+            buckets.filter(resolution=VoteRateBucket.QUARTER).annotate(
+                time=TruncHour('bucket_start', tzinfo=dt_timezone.utc)),
+        ]
+    counts = {}
+    for queryset in querysets:
+        for row in queryset.values_list(*group_fields, 'time').annotate(total=Sum('count')):
+            key = (row[0] if group_fields else None, row[-2])
+            counts[key] = counts.get(key, 0) + row[-1]
+    series = {}
+    for (key, time), count in sorted(counts.items(), key=lambda item: item[0][1]):
+        if group_by == GROUP_PARTY and count < settings.VOTE_RATE_MIN_COUNT:
+            count = None
+        series.setdefault(key, []).append((time, count))
+    return series
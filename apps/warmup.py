@@ -0,0 +1,199 @@
+"""
+Warm a process up before it serves traffic.
+
+The first requests of a fresh worker pay for compiling the URL patterns, loading and parsing the templates and
+building the in-process caches. ``ayaka.wsgi`` and ``ayaka.asgi`` run the registered warm-up steps when the process
+loads the application (before the workers fork with ``gunicorn --preload``), and the ``readiness`` view only reports
+ready once they are done. A step that fails is logged and reported, the process still serves.
+"""
+import gc
+import logging
+import threading
+import time
+from collections import namedtuple
+from pathlib import Path
+from typing import Callable
+
+from django.conf import settings
+from django.db import connections
+from django.template import engines
+from django.template.backends.django import DjangoTemplates
+from django.urls import URLPattern, URLResolver, get_resolver
+from django.utils import timezone
+
+from apps import metrics
+from apps.leaderboard import get_leaderboard
+from apps.models import NewElection
+from apps.reference import get_reference_data
+
+logger = logging.getLogger(__name__)
+
+WarmUpStep = namedtuple('WarmUpStep', ['function', 'title'])
+
+# Name to the warm-up step, run in the order they are registered, see ``register_warmup``.
+WARM_UP_STEPS = {}
+
+_state = {'ready': False, 'seconds': None, 'steps': {}}
+_state_lock = threading.Lock()
+
+
+def register_warmup(name: str, title: str):
+    """
+    Register a function as a warm-up step.
+
+    The function takes no argument and returns the number of things it warmed (patterns, templates, ...).
+    """
+    def register(function: Callable[[], int]):
+        WARM_UP_STEPS[name] = WarmUpStep(function, title)
+        return function
+    return register
+
+
+def warm_up(steps: list = None) -> dict:
+    """
+    Run the warm-up steps in this thread, and mark the process ready.
+
+    :param steps: Names of the steps to run, every registered step by default.
+    :return: The report of the warm-up, see ``warm_up_report``.
+    :rtype: dict
+    """
+    started = time.perf_counter()
+    report = {}
+    for name in steps or list(WARM_UP_STEPS):
+        step = WARM_UP_STEPS[name]
+        step_started = time.perf_counter()
+        try:
+            report[name] = {'count': step.function(), 'error': None}
+        except Exception as e:
+            logger.exception('Warm-up step %s failed', name)
+            report[name] = {'count': 0, 'error': str(e)}
+        report[name]['seconds'] = time.perf_counter() - step_started
+        logger.info('Warm-up: %s (%s) in %.3f s', step.title, report[name]['count'], report[name]['seconds'])
+    seconds = time.perf_counter() - started
+    metrics.increment('warmup.seconds', seconds)
+    logger.info('Warmed up in %.3f s', seconds)
+    with _state_lock:
+        _state.update(ready=True, seconds=seconds, steps=report)
+    return warm_up_report()
+
+
+def warm_up_process():
+    """
+    Warm the process up as configured by ``WARM_UP`` and ``WARM_UP_IN_BACKGROUND``, call it once the application is
+    loaded.
+
+    The steps run in their own thread, which closes its database connections when it is done, so they never run in
+    the event loop of an ASGI server and no connection is shared with the workers forked by ``gunicorn --preload``.
+    """
+    if not settings.WARM_UP:
+        return
+
+    def run():
+        try:
+            warm_up()
+        finally:
+            connections.close_all()
+    thread = threading.Thread(target=run, name='warm-up', daemon=True)
+    thread.start()
+    if not settings.WARM_UP_IN_BACKGROUND:
+        thread.join()
+        # Keep the garbage collector off the warmed objects, so the workers forked by gunicorn --preload do not
+        # write to (and copy) the memory pages they share with the master.
+        gc.freeze()
+
+
+def is_ready() -> bool:
+    """
+    Return True if the process is warmed up, or does not warm up.
+    """
+    return _state['ready'] or not settings.WARM_UP
+
+
+def warm_up_report() -> dict:
+    """
+    Report the warm-up of this process.
+
+    :return: A dictionary with ``ready``, the total ``seconds`` of the warm-up and the ``count``, ``seconds`` and
+             ``error`` of every step.
+    :rtype: dict
+    """
+    with _state_lock:
+        return {'ready': is_ready(), 'seconds': _state['seconds'], 'steps': dict(_state['steps'])}
+
+
+def reset_warm_up():
+    """
+    Mark the process as not warmed up.
+    """
+    with _state_lock:
+        _state.update(ready=False, seconds=None, steps={})
+
+
+def _compile_patterns(resolver: URLResolver) -> int:
+    count = 0
+    for pattern in resolver.url_patterns:
+        # The regular expressions are compiled the first time they are matched.
+        pattern.pattern.regex
+        if isinstance(pattern, URLResolver):
+            count += _compile_patterns(pattern)
+        elif isinstance(pattern, URLPattern):
+            count += 1
+    return count
+
+
+@register_warmup('urls', 'Compile the URL patterns')
+def warm_urls() -> int:
+    resolver = get_resolver()
+    count = _compile_patterns(resolver)
+    # Builds the reverse lookups of every pattern, used by reverse and the url tag.
+    resolver.reverse_dict
+    return count
+
+
+@register_warmup('templates', 'Load the templates')
+def warm_templates() -> int:
+    count = 0
+    for engine in engines.all():
+        if not isinstance(engine, DjangoTemplates):
+            continue
+        # Only the templates of the project, the ones of the installed apps are only shown to staff.
+        for directory in engine.engine.dirs:
+            for path in sorted(Path(directory).rglob('*.html')):
+                # The cached loader keeps the parsed template for the life of the process.
+                engine.get_template(path.relative_to(directory).as_posix())
+                count += 1
+    return count
+
+
+@register_warmup('reference_data', 'Load the areas, parties and candidates')
+def warm_reference_data() -> int:
+    reference = get_reference_data()
+    return len(reference.areas) + len(reference.parties) + len(reference.candidates)
+
+
+@register_warmup('leaderboards', 'Build the leaderboards of the ongoing elections')
+def warm_leaderboards() -> int:
+    now = timezone.now()
+    elections = list(NewElection.objects.filter(start_date__lte=now, end_date__gte=now))
+    for election in elections:
+        get_leaderboard(election)
+    return len(elections)
+
+
+@register_warmup('ballots', 'Render the ballots of the ongoing elections')
+def warm_ballots() -> int:
+    from apis.ballot import prerender_ballots
+
+    now = timezone.now()
+    return sum(prerender_ballots(election)
+               for election in NewElection.objects.filter(start_date__lte=now, end_date__gte=now))
+
+
+@register_warmup('api_schema', 'Load the API schema')
+def warm_api_schema() -> int:
+    # apis depends on apps, not the other way around.
+    from apis.schema import FORMATS, get_schema
+
+    for format in FORMATS:
+        get_schema(format)
+    return len(FORMATS)
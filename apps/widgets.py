@@ -0,0 +1,39 @@
+from django import forms
+from django.core.exceptions import ValidationError
+from django.urls import reverse
+
+
+class AutocompleteSelect(forms.Select):
+    """
+    A select of a ``ModelChoiceField`` that only renders the selected option, the other options are searched with
+    the ``autocomplete`` view of its ``source`` by ``js/autocomplete.js``.
+
+    Rendering every choice of a field whose queryset is the whole voter roll would make the page as large as the roll.
+    """
+
+    class Media:
+        js = ('js/autocomplete.js',)
+
+    def __init__(self, source: str, attrs=None):
+        super().__init__(attrs)
+        self.source = source
+
+    def build_attrs(self, base_attrs, extra_attrs=None):
+        attrs = super().build_attrs(base_attrs, extra_attrs)
+        attrs['data-autocomplete-url'] = reverse('autocomplete', args=[self.source])
+        return attrs
+
+    def optgroups(self, name, value, attrs=None):
+        selected = [item for item in value if item not in ('', None)]
+        options = [self.create_option(name, '', '---------', not selected, 0)]
+        if selected:
+            field = self.choices.field
+            try:
+                instances = list(self.choices.queryset.filter(pk__in=selected))
+            except (ValueError, ValidationError):
+                # Not a valid id, the field shows the error.
+                instances = []
+            for index, instance in enumerate(instances, start=1):
+                options.append(self.create_option(name, field.prepare_value(instance),
+                                                  field.label_from_instance(instance), True, index))
+        return [(None, [option], index) for index, option in enumerate(options)]
@@ -0,0 +1,334 @@
+import base64
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse, JsonResponse
+from django.urls import Resolver404, resolve
+from knox.auth import TokenAuthentication
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
+
+from apps import metrics
+
+# Only the requests that do the work (casting a vote, checking a CVV) are limited, the forms are cheap to show.
+LIMITED_METHODS = ('POST',)
+
+ADMITTED = 'admitted'
+QUEUE_FULL = 'queue_full'
+TIMED_OUT = 'timed_out'
+
+# Forget the buckets of the clients that have not been seen for the longest time above this many clients.
+MAX_TRACKED_CLIENTS = 10000
+
+
+class ConcurrencyLimiter:
+    """
+    Let at most ``concurrency`` requests run at once, with a bounded queue of requests waiting for a slot.
+
+    A request that finds the queue full is rejected at once, and a queued request that does not get a slot within
+    ``queue_timeout`` seconds gives up, so a spike is answered with fast rejections instead of piling up until every
+    request times out.
+    """
+
+    def __init__(self, name: str, concurrency: int, queue_size: int, queue_timeout: float):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.queued = 0
+        self._condition = threading.Condition()
+
+    def _admit(self):
+        self.in_flight += 1
+        metrics.increment(f'admission.{self.name}.in_flight')
+        metrics.increment(f'admission.{self.name}.admitted')
+
+    def try_acquire(self) -> bool:
+        """
+        Take a free slot without waiting.
+
+        :return: True if the request was admitted.
+        :rtype: bool
+        """
+        with self._condition:
+            if self.in_flight < self.concurrency and not self.queued:
+                self._admit()
+                return True
+            return False
+
+    def acquire(self) -> str:
+        """
+        Take a slot, waiting in the queue if all of them are in use.
+
+        :return: ``ADMITTED``, or why the request was rejected (``QUEUE_FULL`` or ``TIMED_OUT``).
+        :rtype: str
+        """
+        with self._condition:
+            if self.in_flight < self.concurrency and not self.queued:
+                self._admit()
+                return ADMITTED
+            if self.queued >= self.queue_size:
+                metrics.increment(f'admission.{self.name}.rejected')
+                return QUEUE_FULL
+            self.queued += 1
+            metrics.increment(f'admission.{self.name}.queued')
+            started = time.monotonic()
+            deadline = started + self.queue_timeout
+            try:
+                while self.in_flight >= self.concurrency:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        metrics.increment(f'admission.{self.name}.rejected')
+                        return TIMED_OUT
+                    self._condition.wait(remaining)
+                self._admit()
+                return ADMITTED
+            finally:
+                self.queued -= 1
+                metrics.increment(f'admission.{self.name}.queued', -1)
+                metrics.increment(f'admission.{self.name}.wait_seconds', time.monotonic() - started)
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            metrics.increment(f'admission.{self.name}.in_flight', -1)
+            self._condition.notify()
+
+
+class TokenBuckets:
+    """
+    A token bucket per client, refilled with ``rate`` tokens per second up to ``burst`` tokens.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, client: str) -> float:
+        """
+        Take a token from the bucket of a client.
+
+        :param client: Key of the client, see ``client_keys``.
+        :return: 0 if the client had a token, else the seconds until it gets one.
+        :rtype: float
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+            if not wait:
+                tokens -= 1
+            self._buckets[client] = (tokens, now)
+            if len(self._buckets) > MAX_TRACKED_CLIENTS:
+                self._buckets.popitem(last=False)
+            return wait
+
+
+class Endpoint:
+    """
+    The limits of a group of URL names, configured by one entry of the ``ADMISSION_CONTROL`` setting.
+    """
+
+    def __init__(self, name: str, options: dict):
+        self.name = name
+        self.limiter = ConcurrencyLimiter(name, options['concurrency'], options['queue'], options['queue_timeout'])
+        self.buckets = TokenBuckets(options['rate'], options['burst']) if options.get('rate') else None
+        self.limit_by = options.get('limit_by', ('address',))
+
+    def rate_limit(self, request, authenticated: bool = False):
+        """
+        Return a 429 response if the client has used up the tokens of one of its keys, else None.
+
+        :param authenticated: Take the tokens of the keys known once the request is authenticated, see
+                              ``client_keys``.
+        """
+        if self.buckets is None:
+            return None
+        wait = max((self.buckets.take(key) for key in client_keys(request, self.limit_by, authenticated)), default=0)
+        if not wait:
+            return None
+        metrics.increment(f'admission.{self.name}.rate_limited')
+        return reject(request, status.HTTP_429_TOO_MANY_REQUESTS, 'Too many requests from this client.', wait)
+
+    def busy(self, request):
+        return reject(request, status.HTTP_503_SERVICE_UNAVAILABLE, 'The server is busy.',
+                      self.limiter.queue_timeout)
+
+
+def client_address(request) -> str:
+    """
+    Return the address of the client of a request.
+
+    Behind proxies, the address is read from the ``ADMISSION_CLIENT_IP_HEADER`` META key (``HTTP_X_FORWARDED_FOR``).
+    Every proxy appends the address it got the request from to that list, and the client can send any list it likes,
+    so the client is the address appended by the outermost of the ``ADMISSION_TRUSTED_PROXIES`` proxies, counted from
+    the right.
+    """
+    header = settings.ADMISSION_CLIENT_IP_HEADER
+    if header == 'REMOTE_ADDR':
+        return request.META.get('REMOTE_ADDR', '')
+    addresses = [address.strip() for address in request.META.get(header, '').split(',') if address.strip()]
+    proxies = max(1, settings.ADMISSION_TRUSTED_PROXIES)
+    if len(addresses) < proxies:
+        return request.META.get('REMOTE_ADDR', '')
+    return addresses[-proxies]
+
+
+def submitted_citizen_id(request) -> str | None:
+    """
+    Return the citizen ID (username) a login request tries, from the login form or the basic auth of the API login.
+    """
+    scheme, _, credentials = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    if scheme.lower() == 'basic':
+        try:
+            return base64.b64decode(credentials).decode().partition(':')[0] or None
+        except (ValueError, UnicodeDecodeError):
+            return None
+    return request.POST.get('username') or None
+
+
+def token_user(request):
+    """
+    Return the user of the knox token of a request, or None without a valid one.
+
+    The API clients authenticate in the DRF view, after the middlewares, so their token is checked here too.
+    """
+    try:
+        authenticated = TokenAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+    return authenticated[0] if authenticated is not None else None
+
+
+def client_keys(request, limit_by, authenticated: bool = False) -> list:
+    """
+    Identify the client of a request by the keys of ``limit_by``.
+
+    The credentials and the session cookie are chosen by the client, so a client is never told apart by them before
+    they are checked. Before authentication, a client is known by its ``address`` and, on a login, by the
+    ``citizen_id`` it tries, without touching the database. Once authenticated, by its session or by its knox token
+    (checked against the database), it is known by its ``user``, or by its address without a valid session or token.
+
+    :return: The keys of the token buckets of the client.
+    :rtype: list
+    """
+    keys = []
+    if not authenticated:
+        if 'address' in limit_by:
+            keys.append(f'address:{client_address(request)}')
+        citizen_id = submitted_citizen_id(request) if 'citizen_id' in limit_by else None
+        if citizen_id:
+            keys.append(f'citizen_id:{citizen_id}')
+    elif 'user' in limit_by:
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            user = token_user(request)
+        if user is not None:
+            keys.append(f'user:{user.pk}')
+        else:
+            keys.append(f'address:{client_address(request)}')
+    return keys
+
+
+def reject(request, status_code: int, error: str, retry_after: float) -> HttpResponse:
+    retry_after = max(1, math.ceil(retry_after))
+    message = f'{error} Please try again in {retry_after} seconds.'
+    if request.path_info.startswith('/api/'):
+        response = JsonResponse({'detail': 'Request rejected', 'errors': {'detail': message}}, status=status_code)
+    else:
+        response = HttpResponse(message, content_type='text/plain; charset=utf-8', status=status_code)
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def get_endpoints() -> dict:
+    """
+    Build the endpoints of the ``ADMISSION_CONTROL`` setting.
+
+    :return: A dictionary of URL name to its ``Endpoint``.
+    :rtype: dict
+    """
+    endpoints = {}
+    for name, options in settings.ADMISSION_CONTROL.items():
+        endpoint = Endpoint(name, options)
+        for url_name in options['url_names']:
+            endpoints[url_name] = endpoint
+    return endpoints
+
+
+class AdmissionControlMiddleware:
+    """
+    Shed load on the endpoints that spike when the polls open, before they reach the database or the CVV service.
+
+    Every endpoint of the ``ADMISSION_CONTROL`` setting has its own concurrency limit and wait queue, requests that
+    cannot be served soon get a 503 with ``Retry-After``, and clients that go over their rate get a 429. The rate of
+    the keys known before authentication is checked first, the one of the authenticated user in ``process_view``,
+    once the session middlewares have run. The counts are exported under ``admission.<endpoint>.`` in
+    ``apps.metrics``.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.endpoints = get_endpoints()
+        if not self.endpoints:
+            raise MiddlewareNotUsed
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def get_endpoint(self, request):
+        if request.method not in LIMITED_METHODS:
+            return None
+        try:
+            url_name = resolve(request.path_info).url_name
+        except Resolver404:
+            return None
+        return self.endpoints.get(url_name)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        endpoint = self.get_endpoint(request)
+        if endpoint is None:
+            return None
+        return endpoint.rate_limit(request, authenticated=True)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        endpoint = self.get_endpoint(request)
+        if endpoint is None:
+            return self.get_response(request)
+        response = endpoint.rate_limit(request)
+        if response is not None:
+            return response
+        if endpoint.limiter.acquire() != ADMITTED:
+            return endpoint.busy(request)
+        try:
+            return self.get_response(request)
+        finally:
+            endpoint.limiter.release()
+
+    async def __acall__(self, request):
+        endpoint = self.get_endpoint(request)
+        if endpoint is None:
+            return await self.get_response(request)
+        response = endpoint.rate_limit(request)
+        if response is not None:
+            return response
+        # Wait for a slot in a worker thread, never in the thread that runs the sync parts of the other requests.
+        if not endpoint.limiter.try_acquire() and \
+                await sync_to_async(endpoint.limiter.acquire, thread_sensitive=False)() != ADMITTED:
+            return endpoint.busy(request)
+        try:
+            return await self.get_response(request)
+        finally:
+            endpoint.limiter.release()
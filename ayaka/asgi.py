@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ayaka.settings')
 
 application = get_asgi_application()
+
+# Compile the URLs, load the templates and fill the caches before serving, see apps.warmup.
+from apps.warmup import warm_up_process
+
+warm_up_process()
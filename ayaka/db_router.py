@@ -0,0 +1,100 @@
+import contextlib
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.utils.deprecation import MiddlewareMixin
+
+REPLICA_ALIAS_PREFIX = 'replica'
+
+# Views that only read, their GET requests can be answered from a replica.
+READ_ONLY_URL_NAMES = frozenset({
+    'homepage', 'documentation', 'partylist_calculation_detail',
+    'area_list', 'legacy_area_list', 'area_detail_old', 'area_detail_new',
+    'candidate_list', 'legacy_candidate_list', 'candidate_detail_old', 'candidate_detail_new',
+    'election_list', 'legacy_election_list', 'election_detail_old', 'election_detail_new',
+    'election_result', 'detailed_election_result', 'new_election_result', 'new_election_result_by_area',
+    'new_election_result_by_party',
+    'party_list', 'legacy_party_list', 'party_detail_old', 'party_detail_new',
+    'api_area_list', 'api_area_detail', 'api_candidate_list', 'api_candidate_detail',
+    'api_election_list', 'api_election_current', 'api_election_detail', 'api_latest_election',
+    'api_party_list', 'api_party_detail',
+    'api_election_result_by_party', 'api_raw_election_result_by_party', 'api_election_result_by_area',
+    'api_latest_election_result_by_party', 'api_latest_raw_election_result_by_party',
+    'api_latest_election_result_by_area',
+    'schema-json', 'schema-swagger-ui', 'schema-redoc',
+})
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_read_from_replica = ContextVar('read_from_replica', default=False)
+
+
+def get_replica_aliases() -> list:
+    """
+    Return the aliases of the configured read replicas.
+    """
+    return [alias for alias in settings.DATABASES if alias.startswith(REPLICA_ALIAS_PREFIX)]
+
+
+@contextlib.contextmanager
+def use_replica():
+    """
+    Send the reads made inside this block to a replica.
+    """
+    token = _read_from_replica.set(True)
+    try:
+        yield
+    finally:
+        _read_from_replica.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Send the reads of read-only views to a random replica and everything else to the primary.
+
+    Reads only go to a replica inside ``use_replica``, which ``ReplicaRoutingMiddleware`` enters for the GET requests
+    of the views in ``READ_ONLY_URL_NAMES``. Writes, the vote path and everything outside a request always use the
+    primary (``default``).
+    """
+
+    def db_for_read(self, model, **hints):
+        if _read_from_replica.get():
+            replicas = get_replica_aliases()
+            if replicas:
+                return random.choice(replicas)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas hold the same data as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary through replication.
+        return not db.startswith(REPLICA_ALIAS_PREFIX)
+
+
+class ReplicaRoutingMiddleware(MiddlewareMixin):
+    """
+    Route the reads of read-only views to the replicas, with read-your-writes stickiness.
+
+    After a request that may have written (any unsafe method), the client gets a short lived cookie that keeps its
+    reads on the primary until the replicas have caught up with its write.
+    """
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method in SAFE_METHODS and request.resolver_match.url_name in READ_ONLY_URL_NAMES \
+                and settings.DATABASE_REPLICA_STICKY_COOKIE not in request.COOKIES:
+            _read_from_replica.set(True)
+        return None
+
+    def process_response(self, request, response):
+        # Not a reset with a token: under ASGI this runs in a different context copy than process_view.
+        _read_from_replica.set(False)
+        if request.method not in SAFE_METHODS and get_replica_aliases():
+            response.set_cookie(settings.DATABASE_REPLICA_STICKY_COOKIE, '1',
+                                max_age=settings.DATABASE_REPLICA_STICKY_SECONDS, httponly=True, samesite='Lax')
+        return response
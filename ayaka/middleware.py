@@ -0,0 +1,97 @@
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils.deprecation import MiddlewareMixin
+
+from ayaka.storage import load_encodings_index
+
+# Preferred encoding first, brotli is usually the smallest.
+ENCODING_PREFERENCE = ('br', 'gzip')
+
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Files collected under their original name (favicons, the web manifest, ...) can change without their URL
+# changing, so they are only cached for a short time.
+MUTABLE_CACHE_CONTROL = 'public, max-age=3600'
+
+_accept_encoding_re = re.compile(r'\s*([^\s;,]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?')
+
+
+def accepted_encodings(header: str) -> set:
+    """
+    Return the content codings accepted by an ``Accept-Encoding`` header, ignoring the ones with ``q=0``.
+    """
+    accepted = set()
+    for part in header.split(','):
+        match = _accept_encoding_re.match(part)
+        if not match or not match.group(1):
+            continue
+        try:
+            quality = float(match.group(2)) if match.group(2) else 1.0
+        except ValueError:
+            quality = 0.0
+        if quality > 0:
+            accepted.add(match.group(1).lower())
+    return accepted
+
+
+class StaticFilesMiddleware(MiddlewareMixin):
+    """
+    Serve the collected static files from the app process, for deployments without a front proxy.
+
+    The index written by ``collectstatic`` is loaded once when the server starts. Each request for a file in the index
+    gets the smallest encoding the client accepts, with ``Vary: Accept-Encoding`` and a far-future immutable
+    ``Cache-Control`` for the fingerprinted file names. Requests for anything else go through as usual.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.static_root = settings.STATIC_ROOT
+        self.static_url = settings.STATIC_URL if settings.STATIC_URL.startswith('/') else '/' + settings.STATIC_URL
+        self.files = load_encodings_index(self.static_root) if self.static_root else {}
+        if not self.files:
+            # collectstatic has not been run, leave static files to the development server.
+            raise MiddlewareNotUsed
+
+    def process_request(self, request):
+        if request.method in ('GET', 'HEAD') and request.path_info.startswith(self.static_url):
+            return self.serve(request, request.path_info[len(self.static_url):])
+        return None
+
+    def serve(self, request, name: str):
+        entry = self.files.get(name)
+        if entry is None:
+            return None
+        encodings = entry['encodings']
+        accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        encoding = next((encoding for encoding in ENCODING_PREFERENCE
+                         if encoding in encodings and encoding in accepted), 'identity')
+        etag = f'"{name}-{encoding}-{encodings[encoding]}"'
+        headers = {
+            'Cache-Control': IMMUTABLE_CACHE_CONTROL if entry['immutable'] else MUTABLE_CACHE_CONTROL,
+            'ETag': etag,
+        }
+        if len(encodings) > 1:
+            headers['Vary'] = 'Accept-Encoding'
+        if etag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+            response = HttpResponseNotModified()
+            for header, value in headers.items():
+                response[header] = value
+            return response
+        path = os.path.join(self.static_root, name + ENCODING_SUFFIXES.get(encoding, ''))
+        try:
+            static_file = open(path, 'rb')
+        except OSError:
+            return None
+        response = FileResponse(static_file, content_type=entry['content_type'])
+        response['Content-Length'] = encodings[encoding]
+        if encoding != 'identity':
+            response['Content-Encoding'] = encoding
+        for header, value in headers.items():
+            response[header] = value
+        return response
@@ -56,6 +56,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'ayaka.middleware.StaticFilesMiddleware',
+    'ayaka.admission.AdmissionControlMiddleware',
+    'ayaka.db_router.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -63,6 +66,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'apps.profiling.ProfilerMiddleware',
 ]
 
 # For silence the warning from django-admin-interface
@@ -113,6 +117,23 @@ else:
         }
     }
 
+# Read replicas, a comma separated list of SQLite files in development or of hosts sharing the primary's
+# credentials otherwise. Read-only views read from them, see ayaka.db_router.
+
+for index, replica in enumerate(config('DATABASE_REPLICAS', cast=Csv(), default=''), start=1):
+    if config('DATABASE_DEVELOPMENT', default=True, cast=bool):
+        replica_settings = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': replica}
+    else:
+        replica_settings = {**DATABASES['default'], 'HOST': replica}
+    # Tests run against the primary only.
+    DATABASES[f'replica{index}'] = {**replica_settings, 'TEST': {'MIRROR': 'default'}}
+
+DATABASE_ROUTERS = ['ayaka.db_router.ReplicaRouter']
+
+# Seconds a client keeps reading from the primary after it wrote something.
+DATABASE_REPLICA_STICKY_SECONDS = config('DATABASE_REPLICA_STICKY_SECONDS', default=5, cast=int)
+DATABASE_REPLICA_STICKY_COOKIE = 'read_primary'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
@@ -148,17 +169,157 @@ USE_TZ = True
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/4.0/howto/static-files/
 
-if DEBUG:
-    STATICFILES_DIRS = (
-        os.path.join(BASE_DIR, "static"),
-    )
-else:
-    STATIC_ROOT = os.path.join(BASE_DIR, 'static/')
+# The source files live in static/ and collectstatic puts the fingerprinted and compressed files in staticfiles/,
+# which ayaka.middleware.StaticFilesMiddleware serves when there is no front proxy.
+
+STATICFILES_DIRS = (
+    os.path.join(BASE_DIR, "static"),
+)
+STATIC_ROOT = config('STATIC_ROOT', default=os.path.join(BASE_DIR, 'staticfiles'))
 STATIC_URL = '/static/'
 
+if not DEBUG:
+    STATICFILES_STORAGE = 'ayaka.storage.CompressedManifestStaticFilesStorage'
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# The page cache, the generations of the models and of the reference data and the single-flight locks live in the
+# default cache, so it must be shared by every process of the site (Redis or Memcached). A LocMemCache (the default,
+# for development) is only seen by its own process, so a change made in one worker would not reach the others. For
+# example CACHE_BACKEND=django.core.cache.backends.redis.RedisCache and CACHE_LOCATION=redis://127.0.0.1:6379/1.
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default=''),
+        'KEY_PREFIX': config('CACHE_KEY_PREFIX', default='ayaka'),
+    }
+}
+
+# Seconds a process keeps its reference data before reading it again, even if no change was seen. See apps.reference.
+REFERENCE_DATA_MAX_AGE = config('REFERENCE_DATA_MAX_AGE', default=5 * 60, cast=int)
+
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
 
+# Number of threads that generate the resized image variants in the background.
+IMAGE_DERIVATIVE_WORKERS = config('IMAGE_DERIVATIVE_WORKERS', default=2, cast=int)
+
+# Seconds a page stays in the page cache when nothing it shows has changed, see apps.pagecache.
+PAGE_CACHE_TIMEOUT = config('PAGE_CACHE_TIMEOUT', default=600, cast=int)
+
+# Government CVV validation service used by the login API.
+CVV_SERVICE_URL = config('CVV_SERVICE_URL', default='https://catnip-api.herokuapp.com/api/v1/validate-cvv')
+CVV_SERVICE_TIMEOUT = config('CVV_SERVICE_TIMEOUT', default=10, cast=float)
+
+# Use the async login, profile and result API views in apis.async_views, serve with ayaka.asgi when this is on.
+ASYNC_VIEWS = config('ASYNC_VIEWS', default=False, cast=bool)
+
+# Admission control for the endpoints that spike when the polls open, see ayaka.admission.
+# Each endpoint runs at most `concurrency` POST requests at once, up to `queue` more wait `queue_timeout` seconds
+# for a slot and each client can send `rate` requests per second with bursts of `burst` (a rate of 0 turns it off).
+# A client has a bucket for every key of `limit_by`: its `address`, the `citizen_id` a login tries, or the
+# authenticated `user` (see ayaka.admission.client_keys).
+ADMISSION_CONTROL = {
+    'vote': {
+        'url_names': ('vote', 'api_election_vote'),
+        # Voters behind one address (a polling station, a mobile network) share nothing.
+        'limit_by': ('user',),
+        'concurrency': config('ADMISSION_VOTE_CONCURRENCY', default=32, cast=int),
+        'queue': config('ADMISSION_VOTE_QUEUE', default=128, cast=int),
+        'queue_timeout': config('ADMISSION_VOTE_QUEUE_TIMEOUT', default=2, cast=float),
+        'rate': config('ADMISSION_VOTE_RATE', default=1, cast=float),
+        'burst': config('ADMISSION_VOTE_BURST', default=5, cast=int),
+    },
+    'login': {
+        'url_names': ('login', 'knox_login_login_login'),
+        'limit_by': ('address', 'citizen_id'),
+        'concurrency': config('ADMISSION_LOGIN_CONCURRENCY', default=16, cast=int),
+        'queue': config('ADMISSION_LOGIN_QUEUE', default=64, cast=int),
+        'queue_timeout': config('ADMISSION_LOGIN_QUEUE_TIMEOUT', default=2, cast=float),
+        'rate': config('ADMISSION_LOGIN_RATE', default=1, cast=float),
+        'burst': config('ADMISSION_LOGIN_BURST', default=10, cast=int),
+    },
+}
+# The META key holding the client address, e.g. HTTP_X_FORWARDED_FOR behind a proxy, and the number of proxies in
+# front of the application appending to it. Only the address appended by the outermost of them is trusted.
+ADMISSION_CLIENT_IP_HEADER = config('ADMISSION_CLIENT_IP_HEADER', default='REMOTE_ADDR')
+ADMISSION_TRUSTED_PROXIES = config('ADMISSION_TRUSTED_PROXIES', default=1, cast=int)
+
+# Seats in the parliament, and how the seats every party is entitled to are allocated from the party-list votes:
+# largest_remainder (like the law), dhondt or sainte_lague. See apps.allocation.
+ELECTION_TOTAL_SEATS = config('ELECTION_TOTAL_SEATS', default=500, cast=int)
+PARTYLIST_ALLOCATION_METHOD = config('PARTYLIST_ALLOCATION_METHOD', default='largest_remainder')
+
+# Seconds before the leaderboard of an ongoing election is rebuilt from the tally tables, to pick up the votes
+# counted by the other processes. See apps.leaderboard.
+LEADERBOARD_RECONCILE_SECONDS = config('LEADERBOARD_RECONCILE_SECONDS', default=30, cast=int)
+
+# Seconds a vote sent with an Idempotency-Key is remembered, see apis.idempotency.
+IDEMPOTENCY_KEY_TTL = config('IDEMPOTENCY_KEY_TTL', default=24 * 60 * 60, cast=int)
+# Seconds after which a key claimed by a request that never answered (its process died) can be claimed again.
+IDEMPOTENCY_PENDING_SECONDS = config('IDEMPOTENCY_PENDING_SECONDS', default=60, cast=int)
+
+# Seconds the quarter hour vote rate buckets are kept before they are folded into hourly buckets by the
+# downsamplevoterates command, and the smallest count of a party the vote rate shows (smaller counts could be matched
+# with the time of a VoteCheck to tell how someone voted). See apps.voterate.
+VOTE_RATE_QUARTER_RETENTION = config('VOTE_RATE_QUARTER_RETENTION', default=24 * 60 * 60, cast=int)
+VOTE_RATE_MIN_COUNT = config('VOTE_RATE_MIN_COUNT', default=10, cast=int)
+
+# Background jobs of the utility menu, see users.jobs. Seconds an idle worker waits before looking for a new job,
+# between two heartbeats of a running job, before a running job without heartbeat is queued again, and between two
+# saves of the progress of a job.
+JOB_POLL_SECONDS = config('JOB_POLL_SECONDS', default=2, cast=float)
+JOB_HEARTBEAT_SECONDS = config('JOB_HEARTBEAT_SECONDS', default=10, cast=float)
+JOB_STALE_SECONDS = config('JOB_STALE_SECONDS', default=60, cast=float)
+JOB_PROGRESS_INTERVAL = config('JOB_PROGRESS_INTERVAL', default=1, cast=float)
+
+# The OpenAPI schema is generated once per code version into API_SCHEMA_ROOT, see apis.schema. Set CODE_VERSION (a
+# commit hash for example) to skip hashing the source files to find the version.
+API_SCHEMA_ROOT = config('API_SCHEMA_ROOT', default=os.path.join(BASE_DIR, 'schema'))
+CODE_VERSION = config('CODE_VERSION', default='')
+
+# The documentation pages load the precomputed schema.
+SWAGGER_SETTINGS = {
+    'SPEC_URL': ('schema-json', {'format': '.json'}),
+}
+REDOC_SETTINGS = {
+    'SPEC_URL': ('schema-json', {'format': '.json'}),
+}
+
+# Milliseconds a fresh process may spend in django.setup, and then importing each module, see the benchmarkimports
+# command. The URLs are imported by the first request of a worker and by the system checks.
+IMPORT_TIME_BUDGETS = {
+    'django.setup': 500,
+    'ayaka.urls': 400,
+}
+
+# Warm the process up (URLs, templates, caches) when the WSGI or ASGI application is loaded, see apps.warmup. In the
+# background, the process serves while it warms up and /ready answers 503 until it is done. Do not warm up in the
+# background with gunicorn --preload, the workers would be forked before the warm-up is done.
+WARM_UP = config('WARM_UP', default=True, cast=bool)
+WARM_UP_IN_BACKGROUND = config('WARM_UP_IN_BACKGROUND', default=False, cast=bool)
+
+# Expensive results are computed by one request at a time, see apps.singleflight. Seconds the other processes wait for
+# the one computing a value before computing it themselves, and before the lock of a process that died expires.
+SINGLE_FLIGHT_WAIT_SECONDS = config('SINGLE_FLIGHT_WAIT_SECONDS', default=10, cast=float)
+SINGLE_FLIGHT_LOCK_SECONDS = config('SINGLE_FLIGHT_LOCK_SECONDS', default=30, cast=int)
+
+# Seconds the party-list result of an election is served before it is computed again, and then served stale while a
+# single request computes it. See apps.utils.get_election_party_result.
+PARTY_RESULT_FRESH_SECONDS = config('PARTY_RESULT_FRESH_SECONDS', default=10, cast=float)
+PARTY_RESULT_STALE_SECONDS = config('PARTY_RESULT_STALE_SECONDS', default=300, cast=float)
+
+# Request profiler configuration
+# Staff can profile a request with ?profile=cprofile or ?profile=sample, set PROFILER_SAMPLE_RATE to N
+# to also profile one in N requests to the apps and apis views. Only the newest PROFILER_MAX_ARTIFACTS
+# artifacts are kept in PROFILER_ROOT.
+
+PROFILER_ROOT = config('PROFILER_ROOT', default=os.path.join(BASE_DIR, 'profiles'))
+PROFILER_SAMPLE_RATE = config('PROFILER_SAMPLE_RATE', default=0, cast=int)
+PROFILER_SAMPLE_INTERVAL = config('PROFILER_SAMPLE_INTERVAL', default=0.005, cast=float)
+PROFILER_MAX_ARTIFACTS = config('PROFILER_MAX_ARTIFACTS', default=200, cast=int)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
 
@@ -0,0 +1,87 @@
+import gzip
+import json
+import mimetypes
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+# Files that are already compressed gain nothing from gzip or brotli.
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.ttf', '.otf', '.json', '.xml', '.webmanifest', '.txt', '.ico',
+                           '.map', '.html')
+
+# Only keep a compressed variant if it is at least this much smaller than the original.
+MINIMUM_SAVING = 0.05
+
+ENCODINGS_INDEX_NAME = 'staticfiles.encodings.json'
+
+mimetypes.add_type('application/manifest+json', '.webmanifest')
+mimetypes.add_type('application/json', '.map')
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    A manifest static files storage that also writes gzip and brotli variants of every file.
+
+    After ``collectstatic`` post processes the files, each compressible file gets a ``.gz`` (and ``.br`` when the
+    brotli package is installed) file next to it, and an index of every file with its content type and the size of
+    each available encoding is written to ``staticfiles.encodings.json``. The index is what
+    ``ayaka.middleware.StaticFilesMiddleware`` loads at startup, so serving a file never needs to stat the disk.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        hashed_names = set(self.hashed_files.values())
+        index = {}
+        for name in list(paths) + sorted(hashed_names):
+            if name in index:
+                continue
+            index[name] = self.compress(name, immutable=name in hashed_names)
+        self._save(ENCODINGS_INDEX_NAME, ContentFile(json.dumps({'files': index}).encode()))
+
+    def compress(self, name: str, immutable: bool) -> dict:
+        """
+        Write the compressed variants of a file and return its entry in the encodings index.
+
+        :param name: The name of the file in the storage.
+        :param immutable: True if the name contains the content hash, so it can be cached forever.
+        :return: The content type, the cache policy and the size of each encoding of the file.
+        :rtype: dict
+        """
+        with self.open(name) as original:
+            content = original.read()
+        content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        encodings = {'identity': len(content)}
+        if name.lower().endswith(COMPRESSIBLE_EXTENSIONS):
+            compressors = [('gzip', '.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+            if brotli is not None:
+                compressors.append(('br', '.br', lambda data: brotli.compress(data, quality=11)))
+            for encoding, suffix, compressor in compressors:
+                compressed = compressor(content)
+                if len(compressed) <= len(content) * (1 - MINIMUM_SAVING):
+                    if self.exists(name + suffix):
+                        self.delete(name + suffix)
+                    self._save(name + suffix, ContentFile(compressed))
+                    encodings[encoding] = len(compressed)
+        return {'content_type': content_type, 'immutable': immutable, 'encodings': encodings}
+
+
+def load_encodings_index(static_root: str) -> dict:
+    """
+    Load the encodings index written by ``collectstatic``.
+
+    :return: The index of the static files, or an empty dictionary if ``collectstatic`` has not been run.
+    :rtype: dict
+    """
+    try:
+        with open(os.path.join(static_root, ENCODINGS_INDEX_NAME), encoding='utf-8') as index_file:
+            return json.load(index_file)['files']
+    except (OSError, ValueError, KeyError):
+        return {}
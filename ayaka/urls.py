@@ -25,22 +25,10 @@ from apis.views import LoginView
 from users import views as users_views
 from knox import views as knox_views
 
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
+from apis.schema import documentation_view, schema_view
 
-schema_view = get_schema_view(
-   openapi.Info(
-      title="Sankasaint EC API",
-      default_version='v2',
-      description="API for manage an election to select James Brucker as the next president of the United States of Sankasaint.",
-      terms_of_service="https://youtu.be/eN6jkWxxm2Y?t=24",
-      contact=openapi.Contact(email="me@helloyeew.dev"),
-      license=openapi.License(name="MIT License"),
-   ),
-   public=True,
-   permission_classes=[permissions.AllowAny],
-)
+if settings.ASYNC_VIEWS:
+    from apis.async_views import login_view as async_login_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -48,6 +36,7 @@ urlpatterns = [
     # path('signup/', users_views.signup, name='signup'),
     path('logout/', users_views.LogoutAndRedirect.as_view(), name='logout'),
     path('settings/', users_views.settings, name='settings'),
+    path('theme.css', users_views.theme_css, name='theme_css'),
     path('profile/', users_views.profile, name='profile'),
     path('profile/<int:user_id>/', users_views.profile_with_id, name='profile_with_id'),
     path('profile/edit', users_views.edit_profile, name='edit_profile'),
@@ -56,12 +45,14 @@ urlpatterns = [
     path('api/', include('apis.urls')),
     # Knox
     # path(r'api/auth/', include('knox.urls')),
-    path(r'api/auth/login/', LoginView.as_view(), name='knox_login_login_login'),
+    path(r'api/auth/login/', async_login_view if settings.ASYNC_VIEWS else LoginView.as_view(),
+         name='knox_login_login_login'),
     path(r'api/auth/logout/', knox_views.LogoutView.as_view(), name='knox_logout' ),
     # Swagger path
-    re_path(r'^docs/swagger(?P<format>\.json|\.yaml)$', schema_view.without_ui(cache_timeout=0), name='schema-json'),
-    re_path(r'^docs/swagger/$', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    re_path(r'^docs/redoc/$', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+    # The schema is precomputed (see apis.schema), the UI pages only render the page that loads it.
+    re_path(r'^docs/swagger(?P<format>\.json|\.yaml)$', schema_view, name='schema-json'),
+    re_path(r'^docs/swagger/$', documentation_view('swagger'), name='schema-swagger-ui'),
+    re_path(r'^docs/redoc/$', documentation_view('redoc'), name='schema-redoc'),
 ]
 
 if settings.DEBUG:
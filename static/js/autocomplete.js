@@ -0,0 +1,80 @@
+// Search the options of the selects rendered by apps.widgets.AutocompleteSelect.
+//
+// A search box is added above every select with a data-autocomplete-url. Typing in it replaces the options of the
+// select with the page of matches from the autocomplete view, and "More results" appends the next page.
+(function () {
+    const DELAY = 250;
+
+    function option(value, text) {
+        const element = document.createElement('option');
+        element.value = value;
+        element.textContent = text;
+        return element;
+    }
+
+    function setup(select) {
+        const search = document.createElement('input');
+        search.type = 'search';
+        search.className = 'form-control';
+        search.placeholder = 'Type to search...';
+        search.setAttribute('aria-label', 'Search ' + (select.name || 'options'));
+        search.style.marginBottom = '0.5rem';
+        const more = document.createElement('button');
+        more.type = 'button';
+        more.className = 'btn btn-ayaka btn-sm';
+        more.textContent = 'More results';
+        more.hidden = true;
+        select.parentNode.insertBefore(search, select);
+        select.parentNode.insertBefore(more, select.nextSibling);
+
+        let timer = null;
+        let next = null;
+        let request = 0;
+
+        function load(append) {
+            const current = ++request;
+            const url = new URL(select.dataset.autocompleteUrl, window.location.origin);
+            url.searchParams.set('q', search.value.trim());
+            if (append && next !== null) {
+                url.searchParams.set('after', next);
+            }
+            fetch(url, {credentials: 'same-origin', headers: {'Accept': 'application/json'}})
+                .then(function (response) { return response.json(); })
+                .then(function (data) {
+                    // A newer search was sent while this one was running.
+                    if (current !== request) {
+                        return;
+                    }
+                    if (!append) {
+                        const selected = select.selectedOptions[0];
+                        select.replaceChildren(option('', '---------'));
+                        if (selected && selected.value) {
+                            select.appendChild(selected);
+                        }
+                    }
+                    for (const result of data.results) {
+                        if (!select.querySelector('option[value="' + result.id + '"]')) {
+                            select.appendChild(option(result.id, result.text));
+                        }
+                    }
+                    next = data.next;
+                    more.hidden = next === null;
+                });
+        }
+
+        search.addEventListener('input', function () {
+            clearTimeout(timer);
+            timer = setTimeout(function () { load(false); }, DELAY);
+        });
+        select.addEventListener('focus', function () {
+            if (select.options.length <= 2 && next === null && request === 0) {
+                load(false);
+            }
+        });
+        more.addEventListener('click', function () { load(true); });
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        document.querySelectorAll('select[data-autocomplete-url]').forEach(setup);
+    });
+})();
@@ -6,3 +6,4 @@ admin.site.register(ColourSettings)
 admin.site.register(LegacyProfile)
 admin.site.register(NewProfile)
 admin.site.register(UtilityMissionLog)
+admin.site.register(LegacyImportKey)
@@ -0,0 +1,244 @@
+"""
+A job queue for the heavy utility missions, stored in ``UtilityMissionLog``.
+
+Staff enqueue a job from the utility menu and a ``runjobs`` worker process claims and runs it. While it runs, a job
+reports its progress and a checkpoint through ``Job.progress``, which is also where a cancelled job stops. The worker
+keeps a heartbeat on the job, and a running job whose heartbeat stops for ``JOB_STALE_SECONDS`` (its worker died) is
+queued again and resumes from its last checkpoint.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from collections import namedtuple
+from typing import Callable
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from users.models import UtilityMissionLog
+from users.seed import AREA_API_URL, DUMP_PATH, POPULATION_API_URL, import_areas, import_population, seed_data
+
+logger = logging.getLogger(__name__)
+
+JobType = namedtuple('JobType', ['function', 'title'])
+
+# Areas, elections, parties and candidates, see users.seed.seed_data.
+LEGACY_IMPORT_STEPS = 4
+
+# Name (the field of the log) to the job type, see ``register_job``.
+JOBS = {}
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def register_job(name: str, title: str):
+    """
+    Register a function as a job.
+
+    The function receives the ``Job`` and the arguments of ``enqueue``, and returns the description of its outcome.
+    """
+    def register(function: Callable[..., str]):
+        JOBS[name] = JobType(function, title)
+        return function
+    return register
+
+
+class Job:
+    """
+    The handle of a running job.
+    """
+
+    def __init__(self, log: UtilityMissionLog):
+        self.log = log
+        self._saved_at = 0.0
+
+    @property
+    def checkpoint(self) -> dict:
+        """
+        The checkpoint saved by the last run of the job, empty on the first run.
+        """
+        return self.log.checkpoint
+
+    def progress(self, processed: int, total: int, checkpoint: dict = None, force: bool = False):
+        """
+        Report the progress of the job, and where to resume it from.
+
+        The progress is saved at most every ``JOB_PROGRESS_INTERVAL`` seconds, unless forced.
+
+        :raises JobCancelled: If a staff cancelled the job, the job should let it propagate.
+        """
+        self.log.processed = processed
+        self.log.total = total
+        if checkpoint is not None:
+            self.log.checkpoint = checkpoint
+        now = time.monotonic()
+        if not force and now - self._saved_at < settings.JOB_PROGRESS_INTERVAL:
+            return
+        self._saved_at = now
+        saved = UtilityMissionLog.objects.filter(id=self.log.id, cancel_requested=False).update(
+            processed=processed, total=total, checkpoint=self.log.checkpoint, heartbeat_at=timezone.now())
+        if not saved:
+            raise JobCancelled
+
+
+def worker_name() -> str:
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def enqueue(name: str, user_id: int, **arguments) -> UtilityMissionLog | None:
+    """
+    Queue a job.
+
+    :return: The log of the job, or None if a job of the same name is already queued or running.
+    """
+    if name not in JOBS:
+        raise ValueError(f'Unknown job {name!r}')
+    if UtilityMissionLog.objects.filter(field=name, status__in=UtilityMissionLog.ACTIVE_STATUSES).exists():
+        return None
+    return UtilityMissionLog.objects.create(field=name, user_id=user_id, status=UtilityMissionLog.QUEUED,
+                                            arguments=arguments, description=f'{JOBS[name].title} is queued.')
+
+
+def request_cancel(log_id: int) -> bool:
+    """
+    Cancel a job, at once if it is still queued, else at its next progress report.
+
+    :return: False if the job is not queued or running.
+    :rtype: bool
+    """
+    if UtilityMissionLog.objects.filter(id=log_id, status=UtilityMissionLog.QUEUED).update(
+            status=UtilityMissionLog.CANCELLED, cancel_requested=True, finished_at=timezone.now(),
+            description='Cancelled before it started.'):
+        return True
+    return bool(UtilityMissionLog.objects.filter(id=log_id, status=UtilityMissionLog.RUNNING)
+                .update(cancel_requested=True))
+
+
+def claim_next(worker: str) -> UtilityMissionLog | None:
+    """
+    Claim the oldest queued job for a worker.
+
+    A job is claimed with a conditional update, so two workers never run the same job.
+    """
+    queued = UtilityMissionLog.objects.filter(status=UtilityMissionLog.QUEUED, field__in=JOBS).order_by('id')
+    for log_id in queued.values_list('id', flat=True)[:10]:
+        now = timezone.now()
+        # A resumed job keeps the time it first started.
+        if UtilityMissionLog.objects.filter(id=log_id, status=UtilityMissionLog.QUEUED).update(
+                status=UtilityMissionLog.RUNNING, worker=worker, heartbeat_at=now,
+                started_at=Coalesce('started_at', Value(now))):
+            return UtilityMissionLog.objects.get(id=log_id)
+    return None
+
+
+def requeue_stale() -> int:
+    """
+    Queue again the running jobs whose worker stopped sending heartbeats.
+
+    :return: The number of jobs queued again.
+    :rtype: int
+    """
+    stale_before = timezone.now() - timezone.timedelta(seconds=settings.JOB_STALE_SECONDS)
+    return UtilityMissionLog.objects.filter(status=UtilityMissionLog.RUNNING, heartbeat_at__lt=stale_before) \
+        .update(status=UtilityMissionLog.QUEUED, worker='')
+
+
+def _heartbeat(log_id: int, stop: threading.Event):
+    beat = False
+    try:
+        while not stop.wait(settings.JOB_HEARTBEAT_SECONDS):
+            beat = True
+            UtilityMissionLog.objects.filter(id=log_id).update(heartbeat_at=timezone.now())
+    finally:
+        if beat:
+            connection.close()
+
+
+def run(log: UtilityMissionLog):
+    """
+    Run a claimed job and record its outcome.
+    """
+    job_type = JOBS[log.field]
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat, args=(log.id, stop), name=f'job-{log.id}-heartbeat', daemon=True)
+    heartbeat.start()
+    outcome = {}
+    try:
+        description = job_type.function(Job(log), **log.arguments)
+        outcome = {'status': UtilityMissionLog.SUCCEEDED, 'done': True, 'description': description}
+    except JobCancelled:
+        outcome = {'status': UtilityMissionLog.CANCELLED, 'description': f'{job_type.title} was cancelled.'}
+    except Exception as e:
+        logger.exception('Job %s failed', log.id)
+        outcome = {'status': UtilityMissionLog.FAILED, 'error': traceback.format_exc(),
+                   'description': f'{job_type.title} failed : {e}'}
+    finally:
+        stop.set()
+        heartbeat.join()
+        # Interrupted with the worker (no outcome), the job is queued again once its heartbeat is stale.
+        if outcome:
+            UtilityMissionLog.objects.filter(id=log.id).update(finished_at=timezone.now(), processed=log.processed,
+                                                                total=log.total, checkpoint=log.checkpoint, **outcome)
+
+
+def work(worker: str = None, once: bool = False, stop: threading.Event = None):
+    """
+    Run the queued jobs one after the other until stopped, or until the queue is empty with ``once``.
+    """
+    worker = worker or worker_name()
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        requeued = requeue_stale()
+        if requeued:
+            logger.warning('Queued %s stale jobs again', requeued)
+        log = claim_next(worker)
+        if log is not None:
+            logger.info('Running job %s (%s)', log.id, log.field)
+            run(log)
+        elif once:
+            return
+        else:
+            stop.wait(settings.JOB_POLL_SECONDS)
+
+
+@register_job('import_legacy_data', 'Import legacy data')
+def import_legacy_data_job(job: Job, path: str = DUMP_PATH) -> str:
+    # Every step of the import skips what is already imported, so a resumed job simply runs it again.
+    steps = []
+
+    def report(message):
+        steps.append(message)
+        job.progress(len(steps), LEGACY_IMPORT_STEPS, force=True)
+
+    seed_data(path, progress=report)
+    return 'Import legacy data successfully. ' + ', '.join(steps) + '.'
+
+
+def _import_from_api(job: Job, url: str, import_data: Callable[..., dict], title: str) -> str:
+    import requests
+
+    data = requests.get(url, timeout=60).json()
+    start = job.checkpoint.get('position', 0)
+    counts = import_data(data, start=start, progress=lambda processed, total: job.progress(
+        processed, total, checkpoint={'position': processed}))
+    job.progress(len(data), len(data), checkpoint={'position': len(data)}, force=True)
+    summary = ', '.join(f'{count} {outcome}' for outcome, count in sorted(counts.items()))
+    return f'{title} successfully ({summary or "nothing to do"}).'
+
+
+@register_job('import_area', 'Import election areas')
+def import_area_job(job: Job) -> str:
+    return _import_from_api(job, AREA_API_URL, import_areas, 'Import election areas')
+
+
+@register_job('import_population', 'Import population')
+def import_population_job(job: Job) -> str:
+    return _import_from_api(job, POPULATION_API_URL, import_population, 'Import population')
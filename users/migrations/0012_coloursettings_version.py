@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0011_alter_newprofile_sex_alter_newprofile_title'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coloursettings',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+NAME_FIELDS = ('first_name', 'last_name')
+
+
+def index_name(field: str) -> str:
+    return f'users_auth_user_{field}_prefix'
+
+
+def create_name_indexes(apps, schema_editor):
+    # PostgreSQL only uses an index for LIKE 'prefix%' with the pattern operator class, the username already has one.
+    opclass = ' varchar_pattern_ops' if schema_editor.connection.vendor == 'postgresql' else ''
+    for field in NAME_FIELDS:
+        schema_editor.execute(f'CREATE INDEX {index_name(field)} ON auth_user ({field}{opclass})')
+
+
+def drop_name_indexes(apps, schema_editor):
+    table = ' ON auth_user' if schema_editor.connection.vendor == 'mysql' else ''
+    for field in NAME_FIELDS:
+        schema_editor.execute(f'DROP INDEX {index_name(field)}{table}')
+
+
+class Migration(migrations.Migration):
+    """
+    Index the names of the users for the prefix search of the user directory, see apps.utils.search_users.
+
+    The User model belongs to django.contrib.auth, so the indexes are created with SQL instead of in its state.
+    """
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0012_coloursettings_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_name_indexes, drop_name_indexes),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 4.2.30 on 2026-10-19 16:08
+
+from django.db import migrations, models
+
+
+def set_failed_status(apps, schema_editor):
+    # The logs written before the job queue only recorded whether the mission succeeded.
+    UtilityMissionLog = apps.get_model('users', 'UtilityMissionLog')
+    UtilityMissionLog.objects.filter(done=False).update(status='failed')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0013_user_directory_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='utilitymissionlog',
+            name='arguments',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='utilitymissionlog',
+            name='cancel_requested',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='utilitymissionlog',
+            name='checkpoint',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='utilitymissionlog',
+            name='error',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='utilitymissionlog',
+            name='finished_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='utilitymissionlog',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='utilitymissionlog',
+            name='processed',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='utilitymissionlog',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='utilitymissionlog',
+            name='status',
+            field=models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed'), ('cancelled', 'Cancelled')], db_index=True, default='succeeded', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='utilitymissionlog',
+            name='total',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='utilitymissionlog',
+            name='worker',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.RunPython(set_failed_status, migrations.RunPython.noop),
+    ]
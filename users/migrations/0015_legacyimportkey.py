@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0014_utilitymissionlog_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LegacyImportKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=100)),
+                ('legacy_id', models.IntegerField()),
+                ('object_id', models.IntegerField()),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='legacyimportkey',
+            constraint=models.UniqueConstraint(fields=('model', 'legacy_id'), name='unique_legacy_import_key'),
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
+from django.db.models import F
 from colorfield.fields import ColorField
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 from apps.models import LegacyArea, NewArea
 
@@ -11,10 +13,24 @@ class ColourSettings(models.Model):
     color_accent = ColorField(default='#DBC2D1')
     color_background = ColorField(default='#0A0A0A')
     mask_opacity = models.FloatField(default=0.5, max_length=1)
+    # Bumped every time the settings are saved, used as the ETag of the user's theme stylesheet.
+    version = models.PositiveIntegerField(default=1)
 
     def __str__(self):
         return self.user.username + '\'s colour settings'
 
+    def save(self, *args, **kwargs):
+        # Bump the version on every write (the settings page, the admin or the shell), in the database so that two
+        # concurrent saves both count.
+        bumped = not self._state.adding
+        if bumped:
+            self.version = F('version') + 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+        super().save(*args, **kwargs)
+        if bumped:
+            self.refresh_from_db(fields=['version'])
+
 
 class LegacyProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -39,11 +55,76 @@ class NewProfile(models.Model):
 
 
 class UtilityMissionLog(models.Model):
+    """
+    A utility mission and its outcome, also the job that runs it in the background, see ``users.jobs``.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+        (CANCELLED, 'Cancelled'),
+    )
+    ACTIVE_STATUSES = (QUEUED, RUNNING)
+
     field = models.CharField(max_length=100)
     done = models.BooleanField(default=False)
     time = models.DateTimeField(auto_now_add=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     description = models.TextField(default='')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=SUCCEEDED, db_index=True)
+    arguments = models.JSONField(default=dict, blank=True)
+    # Items processed out of the total, 0 when the total is not known yet.
+    processed = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    # Where a job that was interrupted resumes from.
+    checkpoint = models.JSONField(default=dict, blank=True)
+    error = models.TextField(default='', blank=True)
+    cancel_requested = models.BooleanField(default=False)
+    worker = models.CharField(max_length=255, default='', blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Updated by the worker while the job runs, a running job without heartbeat for a while lost its worker.
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return self.field
+
+    @property
+    def percentage(self) -> float:
+        if self.status == self.SUCCEEDED:
+            return 100.0
+        return round(100 * self.processed / self.total, 1) if self.total else 0.0
+
+    @property
+    def throughput(self) -> float:
+        """
+        Items processed per second since the job started.
+        """
+        if self.started_at is None:
+            return 0.0
+        elapsed = ((self.finished_at or timezone.now()) - self.started_at).total_seconds()
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+
+class LegacyImportKey(models.Model):
+    """
+    The object imported from a legacy row of the dump, so the legacy import resumes by the legacy primary key, see
+    ``users.seed.seed_data``.
+    """
+    model = models.CharField(max_length=100)
+    legacy_id = models.IntegerField()
+    object_id = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['model', 'legacy_id'], name='unique_legacy_import_key'),
+        ]
+
+    def __str__(self):
+        return f'{self.model} {self.legacy_id} -> {self.object_id}'
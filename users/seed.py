@@ -1,91 +1,305 @@
 import json
+import logging
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterator, List
+
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+
+from apps.models import NewArea, NewElection, NewParty, NewCandidate
+from apps.pagecache import bump_generation
+from users.models import ColourSettings, LegacyImportKey, NewProfile, LegacyProfile
+
+logger = logging.getLogger(__name__)
+
+DUMP_PATH = 'seed/apps.json'
+
+# Hashing a password is expensive, so only spin up the process pool when there are enough of them.
+PASSWORD_POOL_THRESHOLD = 64
+
+LEGACY_MODELS = ('apps.legacyarea', 'apps.legacyelection', 'apps.legacyparty', 'apps.legacycandidate')
+
+# TODO: Change to production API
+AREA_API_URL = 'https://catnip-api.herokuapp.com/api/v1/locations'
+POPULATION_API_URL = 'https://catnip-api.herokuapp.com/api/v1/populations'
+
+
+def iter_dump_objects(path: str = DUMP_PATH, chunk_size: int = 64 * 1024) -> Iterator[dict]:
+    """
+    Stream the objects out of a ``dumpdata`` JSON array without loading the whole file.
+
+    :param path: Path to the dump file.
+    :param chunk_size: Number of characters read from the file at a time.
+    :return: An iterator over the dumped objects.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, encoding='utf-8') as dump_file:
+        buffer = ''
+        position = 0
+        while True:
+            chunk = dump_file.read(chunk_size)
+            buffer = buffer[position:] + chunk
+            position = 0
+            while True:
+                # Every item of the array is an object, so the brackets and separators can simply be skipped.
+                while position < len(buffer) and buffer[position] in ' \t\r\n,[':
+                    position += 1
+                if position < len(buffer) and buffer[position] == ']':
+                    return
+                try:
+                    item, position = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    # The object is not complete yet, read more from the file.
+                    break
+                yield item
+            if not chunk:
+                if buffer[position:].strip():
+                    raise ValueError(f'The dump file {path} is malformed or truncated.')
+                return
+
+
+def hash_passwords(raw_passwords: List[str]) -> List[str]:
+    """
+    Hash a list of passwords, using a process pool when there are a lot of them.
+
+    The pool spawns fresh interpreters instead of forking: the import runs in processes with other threads (the job
+    heartbeat, the warm-up and the image variants), and a forked child can deadlock on a lock one of them was holding.
+
+    :param raw_passwords: The passwords to hash.
+    :return: The hashed passwords in the same order.
+    :rtype: list
+    """
+    if len(raw_passwords) < PASSWORD_POOL_THRESHOLD:
+        return [make_password(raw_password) for raw_password in raw_passwords]
+    with ProcessPoolExecutor(mp_context=multiprocessing.get_context('spawn')) as executor:
+        return list(executor.map(make_password, raw_passwords, chunksize=16))
+
+
+def _imported_ids(model, rows: List[dict]) -> Dict[int, int]:
+    """
+    Map the legacy primary key of the rows that are already imported to the primary key of their object.
+    """
+    return dict(LegacyImportKey.objects.filter(model=model._meta.label_lower, legacy_id__in=[row['pk'] for row in rows])
+                .values_list('legacy_id', 'object_id'))
+
+
+def _create_imported(model, rows: List[dict], objects: list) -> Dict[int, int]:
+    """
+    Create the objects of legacy rows and remember which row each one comes from.
+
+    :return: The legacy primary key of every row mapped to the primary key of its object.
+    :rtype: dict
+    """
+    if connection.features.can_return_rows_from_bulk_insert:
+        model.objects.bulk_create(objects)
+    else:
+        for instance in objects:
+            instance.save()
+    LegacyImportKey.objects.bulk_create([
+        LegacyImportKey(model=model._meta.label_lower, legacy_id=row['pk'], object_id=instance.pk)
+        for row, instance in zip(rows, objects)
+    ])
+    return {row['pk']: instance.pk for row, instance in zip(rows, objects)}
+
+
+def _import_rows(model, rows: List[dict], build: Callable[[dict], object]) -> Dict[int, int]:
+    """
+    Create the rows that are not imported yet and map the legacy primary key to the new one.
+
+    The legacy primary key is the key of the resume, so a row is never merged into an object that only has its name.
+    """
+    imported = _imported_ids(model, rows)
+    missing_rows = [row for row in rows if row['pk'] not in imported]
+    return {**imported, **_create_imported(model, missing_rows, [build(row) for row in missing_rows])}
+
+
+def _import_candidates(rows: List[dict], area_ids: Dict[int, int]):
+    """
+    Import the legacy candidates as users, profiles and candidates in bulk.
 
-from apps.models import NewArea, NewElection, NewParty, NewCandidate, LegacyArea
-from users.models import NewProfile, LegacyProfile
+    A candidate whose name is already the username of a user that was not imported from it is not imported, rather
+    than taking over that account.
 
+    :return: The number of candidates imported.
+    :rtype: int
+    """
+    imported = _imported_ids(User, rows)
+    missing_rows = [row for row in rows if row['pk'] not in imported]
+    taken = set(User.objects.filter(username__in=[row['fields']['name'] for row in missing_rows])
+                .values_list('username', flat=True))
+    if taken:
+        logger.warning('Not importing the legacy candidates %s, their username is already taken', sorted(taken))
+        missing_rows = [row for row in missing_rows if row['fields']['name'] not in taken]
+    passwords = hash_passwords([row['fields']['name'] for row in missing_rows])
+    user_ids = _create_imported(User, missing_rows, [
+        User(username=row['fields']['name'], email=row['fields']['name'] + '@genshin.com',
+             first_name=row['fields']['name'], last_name='Irido', password=password)
+        for row, password in zip(missing_rows, passwords)
+    ])
+
+    # bulk_create does not send post_save, so create what users.signals.create_profile would have created,
+    # with the area already set instead of updating every profile afterwards. The users and their candidates are
+    # created in the same transaction, so an imported user always has them.
+    ColourSettings.objects.bulk_create([ColourSettings(user_id=user_ids[row['pk']]) for row in missing_rows])
+    LegacyProfile.objects.bulk_create([LegacyProfile(user_id=user_ids[row['pk']], area_id=row['fields']['area'])
+                                       for row in missing_rows])
+    NewProfile.objects.bulk_create([NewProfile(user_id=user_ids[row['pk']],
+                                               area_id=area_ids.get(row['fields']['area']))
+                                    for row in missing_rows])
+    NewCandidate.objects.bulk_create([
+        NewCandidate(user_id=user_ids[row['pk']], image=row['fields']['image'],
+                     description=row['fields']['description'], area_id=area_ids.get(row['fields']['area']))
+        for row in missing_rows
+    ])
+    return len(missing_rows)
 
-def seed_data():
+
+def seed_data(path: str = DUMP_PATH, progress: Callable[[str], None] = None):
     """
     Seed the old dump data into the new database.
+
+    The dump is streamed and the legacy objects are imported in bulk in dependency order (areas, elections, parties
+    and then candidates). Each step runs in its own transaction and skips the rows that are already imported (by their
+    legacy primary key, see ``LegacyImportKey``), so running it again after a failure resumes the import.
+
+    :param path: Path to the dump file.
+    :param progress: An optional callable that receives a message after each step.
+    """
+    rows = defaultdict(list)
+    for item in iter_dump_objects(path):
+        if item['model'] in LEGACY_MODELS:
+            rows[item['model']].append(item)
+
+    def report(message):
+        logger.info(message)
+        if progress is not None:
+            progress(message)
+
+    with transaction.atomic():
+        area_ids = _import_rows(NewArea, rows['apps.legacyarea'], lambda row: NewArea(
+            name=row['fields']['name']
+        ))
+    report(f"Imported {len(area_ids)} areas")
+    with transaction.atomic():
+        election_ids = _import_rows(NewElection, rows['apps.legacyelection'], lambda row: NewElection(
+            name=row['fields']['name'],
+            description=row['fields']['description'],
+            front_image=row['fields']['front_image'],
+            start_date=parse_datetime(row['fields']['start_date']),
+            end_date=parse_datetime(row['fields']['end_date'])
+        ))
+    report(f"Imported {len(election_ids)} elections")
+    with transaction.atomic():
+        # import everything except candidates
+        party_ids = _import_rows(NewParty, rows['apps.legacyparty'], lambda row: NewParty(
+            name=row['fields']['name'],
+            description=row['fields']['description'],
+            image=row['fields']['image']
+        ))
+    report(f"Imported {len(party_ids)} parties")
+    with transaction.atomic():
+        imported = _import_candidates(rows['apps.legacycandidate'], area_ids)
+    report(f"Imported {imported} candidates")
+    # Bulk operations do not send the signals that invalidate the cached pages. The legacy results read before or during
+    # the import are forgotten too, in every process, see apps.utils.get_sorted_election_result.
+    bump_generation('apps.newarea', 'apps.newelection', 'apps.newparty', 'apps.newcandidate', 'users.newprofile',
+                    'auth.user', 'apps.legacycandidate', 'apps.legacyelection', 'apps.legacyvote')
+
+
+def _import_in_batches(rows: list, import_row: Callable[[dict], str], start: int, batch_size: int,
+                       progress: Callable[[int, int], None] = None) -> Dict[str, int]:
+    """
+    Import rows one by one from a position, committing every batch.
+
+    :param import_row: Import a row and return what was done with it, a row that raises is counted as failed.
+    :param progress: An optional callable that receives the number of rows done and the total after each batch.
+    :return: How many rows got every outcome.
+    :rtype: dict
+    """
+    counts = defaultdict(int)
+    for batch_start in range(start, len(rows), batch_size):
+        with transaction.atomic():
+            for row in rows[batch_start:batch_start + batch_size]:
+                try:
+                    with transaction.atomic():
+                        counts[import_row(row)] += 1
+                except Exception:
+                    logger.exception('Cannot import %s', row)
+                    counts['failed'] += 1
+        if progress is not None:
+            progress(min(batch_start + batch_size, len(rows)), len(rows))
+    return dict(counts)
+
+
+def _import_area(area: dict) -> str:
+    updated = NewArea.objects.filter(id=area['locationID']).update(
+        name=area['location'], population=area['population'], number_of_voters=area['numberOfVoters'])
+    if updated:
+        return 'updated'
+    NewArea.objects.create(id=area['locationID'], name=area['location'], population=area['population'],
+                           number_of_voters=area['numberOfVoters'])
+    return 'imported'
+
+
+def import_areas(data: list, start: int = 0, batch_size: int = 100,
+                 progress: Callable[[int, int], None] = None) -> Dict[str, int]:
+    """
+    Import the election areas from the government API data, creating or updating every area by its id.
+
+    :param data: The locations returned by ``AREA_API_URL``.
+    :param start: Index of the first location to import, to resume an import.
+    :return: How many areas were imported, updated or failed.
+    :rtype: dict
+    """
+    counts = _import_in_batches(data, _import_area, start, batch_size, progress)
+    bump_generation('apps.newarea')
+    return counts
+
+
+def _import_citizen(population: dict) -> str:
+    # We use citizen ID as the username for the user so user can log in with their citizen ID
+    user = User.objects.filter(username=str(population['citizenID'])).first()
+    if user is None:
+        if not population['rightToVote']:
+            return 'skipped'
+        user = User.objects.create(username=population['citizenID'], first_name=population['firstName'],
+                                   last_name=population['lastName'])
+        outcome = 'imported'
+    else:
+        # If cannot vote, remove from the database.
+        if not population['rightToVote']:
+            user.delete()
+            return 'removed'
+        user.first_name = population['firstName']
+        user.last_name = population['lastName']
+        user.save()
+        outcome = 'updated'
+    profile, _ = NewProfile.objects.get_or_create(user=user)
+    profile.title = population['title']
+    profile.sex = population['sex']
+    profile.area = NewArea.objects.get(id=population['locationID'])
+    profile.right_to_vote = population['rightToVote']
+    profile.blacklist = population['blacklist']
+    profile.save()
+    return outcome
+
+
+def import_population(data: list, start: int = 0, batch_size: int = 500,
+                      progress: Callable[[int, int], None] = None) -> Dict[str, int]:
+    """
+    Import the citizens from the government API data as users with their profile.
+
+    Citizens without the right to vote are not imported, and removed if they were.
+
+    :param data: The citizens returned by ``POPULATION_API_URL``.
+    :param start: Index of the first citizen to import, to resume an import.
+    :return: How many citizens were imported, updated, removed, skipped or failed.
+    :rtype: dict
     """
-    file = []
-    with open('seed/apps.json', encoding='utf-8') as json_file:
-        data = json.load(json_file)
-        for p in data:
-            file.append(p)
-    candidate_for_import = []
-    area_for_import = []
-    election_for_import = []
-    party_for_import = []
-    for i in file:
-        if i['model'] == 'apps.legacycandidate':
-            candidate_for_import.append(i)
-        elif i['model'] == 'apps.legacyarea':
-            area_for_import.append(i)
-        elif i['model'] == 'apps.legacyelection':
-            election_for_import.append(i)
-        elif i['model'] == 'apps.legacyparty':
-            party_for_import.append(i)
-    for i in range(len(area_for_import)):
-        area_for_import[i] = {
-            'name': area_for_import[i]['fields']['name']
-        }
-    for i in range(len(election_for_import)):
-        election_for_import[i] = {
-            'name': election_for_import[i]['fields']['name'],
-            'description': election_for_import[i]['fields']['description'],
-            'front_image': election_for_import[i]['fields']['front_image'],
-            'start_date': election_for_import[i]['fields']['start_date'],
-            'end_date': election_for_import[i]['fields']['end_date']
-        }
-    for i in range(len(party_for_import)):
-        party_for_import[i] = {
-            'name': party_for_import[i]['fields']['name'],
-            'description': party_for_import[i]['fields']['description'],
-            'image': party_for_import[i]['fields']['image'],
-            'candidates': party_for_import[i]['fields']['candidates']
-        }
-    print(candidate_for_import)
-    for i in range(len(candidate_for_import)):
-        candidate_for_import[i] = {
-            'username': candidate_for_import[i]['fields']['name'],
-            'email': candidate_for_import[i]['fields']['name'] + '@genshin.com',
-            'first_name': candidate_for_import[i]['fields']['name'],
-            'last_name': "Irido",
-            'password': make_password(candidate_for_import[i]['fields']['name'], salt=None, hasher='default'),
-            'description': candidate_for_import[i]['fields']['description'],
-            'area': candidate_for_import[i]['fields']['area'],
-            'image': candidate_for_import[i]['fields']['image']
-        }
-
-    for i in area_for_import:
-        NewArea.objects.create(**i)
-    for i in election_for_import:
-        NewElection.objects.create(**i)
-    for i in party_for_import:
-        NewParty.objects.create(
-            # import everything except candidates
-            **{k: v for k, v in i.items() if k != 'candidates'}
-        )
-    for i in candidate_for_import:
-        User.objects.create(
-            # import everything except description and area
-            **{k: v for k, v in i.items() if k != 'description' and k != 'area' and k != 'image'}
-        )
-        NewCandidate.objects.create(
-            user=User.objects.get(username=i['username']),
-            image=i['image'],
-            description=i['description'],
-            area=NewArea.objects.get(id=i['area'])
-        )
-        # Update the user's area in the old and new profile
-        user = User.objects.get(username=i['username'])
-        new_profile = NewProfile.objects.get(user=user)
-        legacy_profile = LegacyProfile.objects.get(user=user)
-        new_profile.area = NewArea.objects.get(id=i['area'])
-        legacy_profile.area = LegacyArea.objects.get(id=i['area'])
-        new_profile.save()
-        legacy_profile.save()
-    
\ No newline at end of file
+    counts = _import_in_batches(data, _import_citizen, start, batch_size, progress)
+    bump_generation('auth.user', 'users.newprofile')
+    return counts
@@ -1,7 +1,9 @@
 from django.contrib.auth.models import User
+from django.db import transaction
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
+from apps.images import schedule_variants
 from users.models import ColourSettings, LegacyProfile, NewProfile
 
 
@@ -11,3 +13,8 @@ def create_profile(sender, instance, created, **kwargs):
         ColourSettings.objects.create(user=instance)
         LegacyProfile.objects.create(user=instance)
         NewProfile.objects.create(user=instance)
+
+
+@receiver(post_save, sender=NewProfile)
+def generate_profile_image_variants(sender, instance, **kwargs):
+    transaction.on_commit(lambda: schedule_variants(instance.image))
@@ -1,10 +1,20 @@
+import json
+import multiprocessing
+import os
+import tempfile
+from unittest import mock
+
+from django.contrib.auth.hashers import check_password
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from django.utils import timezone
 
-from apps.models import LegacyArea, LegacyCandidate, LegacyVote, LegacyElection
-from users.models import LegacyProfile
+from apps.models import LegacyArea, LegacyCandidate, LegacyVote, LegacyElection, NewArea, NewCandidate, NewElection, \
+    NewParty
+from users import jobs
+from users.models import ColourSettings, LegacyProfile, NewProfile, UtilityMissionLog
+from users.seed import hash_passwords, import_population, iter_dump_objects, seed_data
 
 
 class ProfileViewTest(TestCase):
@@ -68,4 +78,247 @@ class ProfileViewTest(TestCase):
         # Check that the profile is rendered correctly
         self.assertContains(response, 'testuser')
         self.assertContains(response, 'testuser@test.com')
-        self.assertContains(response, 'testarea')
\ No newline at end of file
+        self.assertContains(response, 'testarea')
+
+
+class ThemeStylesheetTest(TestCase):
+    """Test case for the per-user theme stylesheet."""
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.other_user = User.objects.create_user(username='testuser2', password='12345')
+        ColourSettings.objects.filter(user=self.user).update(color_primary='#123456')
+        self.url = reverse('theme_css')
+
+    def test_theme_is_not_inlined_in_pages(self):
+        """Pages must be identical for every logged in user and link the theme stylesheet instead."""
+        self.client.login(username='testuser', password='12345')
+        first = self.client.get(reverse('homepage')).content
+        self.client.login(username='testuser2', password='12345')
+        second = self.client.get(reverse('homepage')).content
+        self.assertEqual(first.replace(b'testuser', b''), second.replace(b'testuser2', b''))
+        self.assertNotIn(b'#123456', first)
+        self.assertIn(self.url.encode(), first)
+
+    def test_theme_stylesheet_revalidation(self):
+        """The theme must answer 304 until the settings are saved again."""
+        self.client.login(username='testuser', password='12345')
+        response = self.client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertContains(response, '--color-primary: #123456;')
+        etag = response['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.client.post(reverse('settings'), {'color_primary': '#654321', 'color_accent': '#DBC2D1',
+                                               'color_background': '#0A0A0A', 'mask_opacity': 0.5})
+        self.assertEqual(ColourSettings.objects.get(user=self.user).version, 2)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '--color-primary: #654321;')
+
+    def test_theme_changed_outside_settings_page(self):
+        """Saving the settings anywhere else (the admin or the shell) must change the ETag too."""
+        self.client.login(username='testuser', password='12345')
+        etag = self.client.get(self.url)['ETag']
+        colour_settings = ColourSettings.objects.get(user=self.user)
+        colour_settings.color_primary = '#654321'
+        colour_settings.save()
+        self.assertEqual(colour_settings.version, 2)
+        colour_settings.save(update_fields=['mask_opacity'])
+        self.assertEqual(colour_settings.version, 3)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '--color-primary: #654321;')
+
+
+class SeedDataTest(TestCase):
+    """Test case for importing the legacy dump into the new tables."""
+    def setUp(self):
+        """Write a small dump file and load the legacy areas it refers to."""
+        self.legacy_area = LegacyArea.objects.create(name='Mondstadt', description='The land of freedom')
+        dump = [
+            {'model': 'apps.legacyarea', 'pk': self.legacy_area.id,
+             'fields': {'name': 'Mondstadt', 'description': 'The land of freedom'}},
+            {'model': 'apps.legacyelection', 'pk': 1,
+             'fields': {'name': 'Teyvat election', 'front_image': 'elections/teyvat-1st-election.jpg',
+                        'description': 'An election', 'start_date': '2022-10-02T17:19:46Z',
+                        'end_date': '2024-10-02T17:19:48Z'}},
+            {'model': 'apps.legacyparty', 'pk': 1,
+             'fields': {'name': 'We love Lumine', 'description': 'Party', 'image': 'parties/lumine-party.png',
+                        'candidates': [1]}},
+            {'model': 'apps.legacycandidate', 'pk': 1,
+             'fields': {'name': 'Barbara', 'image': 'candidates/barbara.png', 'description': "I'm an idol",
+                        'area': self.legacy_area.id}},
+            {'model': 'apps.legacycandidate', 'pk': 2,
+             'fields': {'name': 'Klee', 'image': 'candidates/klee.jpg', 'description': 'Boom',
+                        'area': self.legacy_area.id}},
+        ]
+        handle, self.path = tempfile.mkstemp(suffix='.json')
+        with os.fdopen(handle, 'w', encoding='utf-8') as dump_file:
+            json.dump(dump, dump_file, indent=4)
+        self.addCleanup(os.remove, self.path)
+
+    def test_stream_dump(self):
+        """The streaming reader must return every object even when reading in tiny chunks."""
+        self.assertEqual([item['model'] for item in iter_dump_objects(self.path, chunk_size=7)],
+                         ['apps.legacyarea', 'apps.legacyelection', 'apps.legacyparty', 'apps.legacycandidate',
+                          'apps.legacycandidate'])
+
+    def test_seed_data(self):
+        """All legacy objects must be imported with profiles pointing to the imported area."""
+        seed_data(self.path)
+        area = NewArea.objects.get(name='Mondstadt')
+        self.assertTrue(NewElection.objects.filter(name='Teyvat election').exists())
+        self.assertTrue(NewParty.objects.filter(name='We love Lumine').exists())
+        candidate = NewCandidate.objects.get(user__username='Barbara')
+        self.assertEqual(candidate.area, area)
+        self.assertEqual(NewProfile.objects.get(user=candidate.user).area, area)
+        self.assertEqual(LegacyProfile.objects.get(user=candidate.user).area, self.legacy_area)
+        self.assertTrue(candidate.user.check_password('Barbara'))
+
+    def test_seed_data_resume(self):
+        """Running the import again must not duplicate anything."""
+        seed_data(self.path)
+        seed_data(self.path)
+        self.assertEqual(NewArea.objects.filter(name='Mondstadt').count(), 1)
+        self.assertEqual(NewCandidate.objects.count(), 2)
+        self.assertEqual(User.objects.filter(username='Klee').count(), 1)
+
+    def test_seed_data_keyed_by_legacy_id(self):
+        """Rows must not be merged into objects that only share their name, and resume by their legacy id."""
+        area = NewArea.objects.create(name='Mondstadt')
+        klee = User.objects.create_user(username='Klee', password='password')
+        with self.assertLogs('users.seed', 'WARNING'):
+            seed_data(self.path)
+            seed_data(self.path)
+        self.assertEqual(NewArea.objects.filter(name='Mondstadt').count(), 2)
+        self.assertEqual(NewCandidate.objects.get(user__username='Barbara').area.name, 'Mondstadt')
+        self.assertNotEqual(NewCandidate.objects.get(user__username='Barbara').area, area)
+        self.assertFalse(NewCandidate.objects.filter(user=klee).exists())
+        self.assertTrue(User.objects.get(username='Klee').check_password('password'))
+
+    def test_hash_passwords_pool(self):
+        """Many passwords must be hashed by spawned processes, never forked from this threaded one."""
+        with mock.patch('users.seed.PASSWORD_POOL_THRESHOLD', 2), \
+                mock.patch('users.seed.multiprocessing.get_context', wraps=multiprocessing.get_context) as context:
+            hashed = hash_passwords(['Barbara', 'Klee'])
+        context.assert_called_once_with('spawn')
+        self.assertTrue(check_password('Barbara', hashed[0]))
+        self.assertTrue(check_password('Klee', hashed[1]))
+
+    def test_legacy_import_job(self):
+        """The legacy import runs as a job that reports every step."""
+        staff = User.objects.create_superuser(username='staff', password='password')
+        log = jobs.enqueue('import_legacy_data', staff.id, path=self.path)
+        jobs.work(once=True)
+        log.refresh_from_db()
+        self.assertEqual(log.status, UtilityMissionLog.SUCCEEDED)
+        self.assertTrue(log.done)
+        self.assertEqual((log.processed, log.total), (4, 4))
+        self.assertTrue(NewCandidate.objects.filter(user__username='Klee').exists())
+
+
+class ImportPopulationTest(TestCase):
+    """Test case for importing the citizens from the government API data."""
+    def setUp(self):
+        self.area = NewArea.objects.create(id=7, name='Inazuma')
+        self.data = [
+            {'citizenID': '1001', 'firstName': 'Ayaka', 'lastName': 'Kamisato', 'title': 'Ms.', 'sex': 'Female',
+             'locationID': 7, 'rightToVote': True, 'blacklist': False},
+            {'citizenID': '1002', 'firstName': 'Scara', 'lastName': 'Mouche', 'title': 'Mr.', 'sex': 'Male',
+             'locationID': 7, 'rightToVote': False, 'blacklist': False},
+            {'citizenID': '1003', 'firstName': 'Nowhere', 'lastName': 'Man', 'title': 'Mr.', 'sex': 'Male',
+             'locationID': 99, 'rightToVote': True, 'blacklist': False},
+        ]
+
+    def test_import_population(self):
+        """Citizens are imported with their profile, from a position, and the failures are counted."""
+        progress = []
+        counts = import_population(self.data, batch_size=2,
+                                   progress=lambda processed, total: progress.append((processed, total)))
+        self.assertEqual(counts, {'imported': 1, 'skipped': 1, 'failed': 1})
+        self.assertEqual(progress, [(2, 3), (3, 3)])
+        self.assertEqual(User.objects.get(username='1001').newprofile.area, self.area)
+        self.assertFalse(User.objects.filter(username='1003').exists())
+        self.data[0]['rightToVote'] = False
+        self.assertEqual(import_population(self.data, start=1), {'skipped': 1, 'failed': 1})
+        self.assertEqual(import_population(self.data), {'removed': 1, 'skipped': 1, 'failed': 1})
+
+
+class JobQueueTest(TestCase):
+    """Test case for the background jobs of the utility menu."""
+    def setUp(self):
+        self.staff = User.objects.create_superuser(username='staff', password='password')
+        self.calls = []
+        patcher = mock.patch.dict(jobs.JOBS, {'count': jobs.JobType(self.count_job, 'Count')})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def count_job(self, job, until=3, fail_at=None, cancel_at=None):
+        start = job.checkpoint.get('position', 0)
+        self.calls.append(start)
+        for position in range(start, until):
+            if position == fail_at:
+                raise ValueError('Boom')
+            if position == cancel_at:
+                jobs.request_cancel(job.log.id)
+            job.progress(position + 1, until, checkpoint={'position': position + 1}, force=True)
+        return f'Counted to {until}.'
+
+    def test_run_job(self):
+        """A queued job is claimed once, runs and records its outcome."""
+        log = jobs.enqueue('count', self.staff.id, until=5)
+        self.assertIsNone(jobs.enqueue('count', self.staff.id))
+        jobs.work(once=True)
+        log.refresh_from_db()
+        self.assertEqual((log.status, log.done, log.description), (UtilityMissionLog.SUCCEEDED, True, 'Counted to 5.'))
+        self.assertEqual((log.processed, log.total, log.percentage), (5, 5, 100.0))
+        self.assertIsNotNone(log.finished_at)
+        self.assertIsNone(jobs.claim_next('worker'))
+
+    def test_failed_job(self):
+        """A job that raises is failed with its error."""
+        log = jobs.enqueue('count', self.staff.id, fail_at=1)
+        jobs.work(once=True)
+        log.refresh_from_db()
+        self.assertEqual(log.status, UtilityMissionLog.FAILED)
+        self.assertIn('ValueError: Boom', log.error)
+        self.assertEqual(log.processed, 1)
+
+    def test_cancel_job(self):
+        """A queued job is cancelled at once, a running one at its next progress report."""
+        log = jobs.enqueue('count', self.staff.id)
+        self.assertTrue(jobs.request_cancel(log.id))
+        log.refresh_from_db()
+        self.assertEqual(log.status, UtilityMissionLog.CANCELLED)
+        log = jobs.enqueue('count', self.staff.id, cancel_at=1)
+        jobs.work(once=True)
+        log.refresh_from_db()
+        self.assertEqual((log.status, log.processed), (UtilityMissionLog.CANCELLED, 2))
+        self.assertFalse(jobs.request_cancel(log.id))
+
+    @override_settings(JOB_STALE_SECONDS=60)
+    def test_resume_stale_job(self):
+        """A running job whose worker died is queued again and resumes from its checkpoint."""
+        log = jobs.enqueue('count', self.staff.id)
+        self.assertEqual(jobs.claim_next('dead-worker').id, log.id)
+        UtilityMissionLog.objects.filter(id=log.id).update(
+            checkpoint={'position': 2}, heartbeat_at=timezone.now() - timezone.timedelta(minutes=5))
+        jobs.work(once=True)
+        log.refresh_from_db()
+        self.assertEqual(self.calls, [2])
+        self.assertEqual((log.status, log.processed), (UtilityMissionLog.SUCCEEDED, 3))
+
+    def test_job_views(self):
+        """Staff queue, poll and cancel jobs from the utility menu."""
+        self.client.login(username='staff', password='password')
+        self.client.post(reverse('start_job', args=['count']))
+        log = UtilityMissionLog.objects.get(field='count')
+        self.assertEqual(log.status, UtilityMissionLog.QUEUED)
+        response = self.client.get(reverse('job_status'), {'ids': f'{log.id},x'})
+        self.assertEqual(response.json(), {'jobs': []})
+        response = self.client.get(reverse('job_status'), {'ids': str(log.id)})
+        self.assertEqual(response.json()['jobs'][0]['status'], UtilityMissionLog.QUEUED)
+        self.assertContains(self.client.get(reverse('utils')), 'data-job-active')
+        self.client.post(reverse('cancel_job', args=[log.id]))
+        log.refresh_from_db()
+        self.assertEqual(log.status, UtilityMissionLog.CANCELLED)
+        self.assertEqual(self.client.post(reverse('start_job', args=['nothing'])).status_code, 404)
@@ -3,6 +3,7 @@ from django.contrib.auth import views as auth_views
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.shortcuts import render, redirect
+from django.views.decorators.http import condition
 
 from apps.models import LegacyVote, VoteCheck
 from users.forms import UserCreationForms, UserSettingsForm, ProfileForm
@@ -34,6 +35,8 @@ def signup(request):
 def settings(request):
     """
     An ayaka's settings page.
+
+    Saving the settings bumps their version, which changes the ETag of the user's theme stylesheet at /theme.css.
     """
     colour_settings = ColourSettings.objects.filter(user=request.user).first()
     if request.method == 'POST':
@@ -45,11 +48,39 @@ def settings(request):
     else:
         form = UserSettingsForm(instance=colour_settings)
     return render(request, 'users/settings.html', {
-        'colour_settings': colour_settings,
         'form': form
     })
 
 
+def theme_etag(request):
+    """
+    Return the ETag of the current user's theme stylesheet, which changes every time the settings are saved.
+    """
+    if not request.user.is_authenticated:
+        return 'default'
+    version = ColourSettings.objects.filter(user=request.user).values_list('version', flat=True).first()
+    return f'{request.user.id}-{version or 0}'
+
+
+@condition(etag_func=theme_etag)
+def theme_css(request):
+    """
+    The current user's colour settings as a stylesheet.
+
+    Every page links to the same URL so the page HTML does not depend on who is looking at it. The browser keeps the
+    stylesheet and only revalidates it, which costs a single version lookup and returns 304 until the settings change.
+    """
+    colour_settings = None
+    if request.user.is_authenticated:
+        colour_settings = ColourSettings.objects.filter(user=request.user).first()
+    response = render(request, 'users/theme.css', {
+        'colour_settings': colour_settings or ColourSettings()
+    }, content_type='text/css')
+    response['Cache-Control'] = 'private, no-cache'
+    response['Vary'] = 'Cookie'
+    return response
+
+
 @login_required
 def profile(request):
     """
@@ -62,11 +93,9 @@ def profile(request):
         messages.error(request, 'This user does not exist.')
         return redirect('homepage')
     if request.user.is_authenticated:
-        colour_settings = ColourSettings.objects.filter(user=request.user).first()
         votes_legacy = LegacyVote.objects.filter(user__id=request.user.id).order_by('id')
         votes_new = VoteCheck.objects.filter(user__id=request.user.id).order_by('id')
         return render(request, 'users/profile.html', {
-            'colour_settings': colour_settings,
             'profile': user,
             'user': user_object,
             'vote_history': votes_new,
@@ -90,11 +119,9 @@ def profile_with_id(request, user_id):
         messages.error(request, 'This user does not exist.')
         return redirect('homepage')
     if request.user.is_superuser or request.user.is_staff:
-        colour_settings = ColourSettings.objects.filter(user=request.user).first()
         votes_legacy = LegacyVote.objects.filter(user__id=user_id).order_by('id')
         votes_new = VoteCheck.objects.filter(user__id=user_id).order_by('id')
         return render(request, 'users/profile.html', {
-            'colour_settings': colour_settings,
             'profile': user,
             'user': user_object,
             'vote_history': votes_new,
@@ -110,7 +137,6 @@ def edit_profile(request):
     Edit current logged in user's profile.
     """
     user = NewProfile.objects.get(user=request.user)
-    colour_settings = ColourSettings.objects.filter(user=request.user).first()
     if request.method == 'POST':
         form = ProfileForm(request.POST, request.FILES, instance=user)
         if form.is_valid():
@@ -121,7 +147,6 @@ def edit_profile(request):
         form = ProfileForm(instance=user)
     return render(request, 'users/edit_profile.html', {
         'form': form,
-        'colour_settings': colour_settings
     })
 
 
@@ -132,7 +157,6 @@ def create_user_utility(request):
 
     This menu can be only accessed by staff and superuser for some testing purposes.
     """
-    colour_settings = ColourSettings.objects.filter(user=request.user).first()
     if request.user.is_superuser or request.user.is_staff:
         if request.method == 'POST':
             form = UserCreationForms(request.POST)
@@ -143,7 +167,7 @@ def create_user_utility(request):
                 return redirect('utils')
         else:
             form = UserCreationForms()
-        return render(request, 'apps/utils/create_user.html', {'form': form, 'colour_settings': colour_settings})
+        return render(request, 'apps/utils/create_user.html', {'form': form})
     else:
         messages.error(request, 'You do not have permission to access this page.')
         return redirect('homepage')